@@ -13,7 +13,7 @@ class BitacoraAccionAdmin(admin.ModelAdmin):
         'usuario',
         'accion',
         'descripcion_corta',
-        'modelo',
+        'modelo_afectado',
         'ip_address'
     ]
     list_filter = [
@@ -23,6 +23,8 @@ class BitacoraAccionAdmin(admin.ModelAdmin):
     ]
     search_fields = [
         'descripcion',
+        'usuario_nombre',
+        'usuario_email',
         'usuario__first_name',
         'usuario__last_name',
         'usuario__email',
@@ -38,7 +40,13 @@ class BitacoraAccionAdmin(admin.ModelAdmin):
         'detalles',
         'fecha_hora',
         'ip_address',
-        'user_agent'
+        'user_agent',
+        'usuario_nombre',
+        'usuario_email',
+        'usuario_tipo',
+        'modelo',
+        'hash_anterior',
+        'hash_registro'
     ]
     date_hierarchy = 'fecha_hora'
     ordering = ['-fecha_hora']
@@ -48,10 +56,12 @@ class BitacoraAccionAdmin(admin.ModelAdmin):
         return obj.descripcion[:50] + '...' if len(obj.descripcion) > 50 else obj.descripcion
     descripcion_corta.short_description = 'Descripción'
     
-    def modelo(self, obj):
-        """Muestra el nombre del modelo"""
+    def modelo_afectado(self, obj):
+        """Muestra el nombre del modelo (snapshot)"""
+        if obj.modelo:
+            return obj.modelo
         return obj.content_type.model if obj.content_type else 'N/A'
-    modelo.short_description = 'Modelo'
+    modelo_afectado.short_description = 'Modelo'
     
     def has_add_permission(self, request):
         """No permitir crear registros manualmente"""
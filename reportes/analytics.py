@@ -0,0 +1,268 @@
+"""
+Motor analítico vectorizado para reportes de rangos de fechas largos.
+
+Extrae una sola vez por request un conjunto columnar estrecho
+(``values_list`` -> arrays de NumPy) de ``Cita``/``Pago``/``Factura`` (y de
+los ajustes de stock registrados en la bitácora) y calcula agrupaciones,
+percentiles, ventanas móviles y pronósticos en memoria.
+
+NumPy es una dependencia opcional: si no está instalada, ``disponible()``
+devuelve False y los endpoints analíticos responden 501.
+"""
+from django.db.models.functions import TruncDate
+
+from agenda.models import Cita
+from facturacion.models import Factura, Pago
+
+from .models import BitacoraAccion
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependencia opcional
+    np = None
+
+
+def disponible():
+    """Indica si el motor analítico puede usarse (NumPy instalado)."""
+    return np is not None
+
+
+# ============================================================================
+# EXTRACCIÓN COLUMNAR
+# ============================================================================
+
+def _a_dias(fechas):
+    """Lista de ``date`` -> array ``datetime64[D]``."""
+    return np.array(fechas, dtype='datetime64[D]')
+
+
+def _a_centavos(montos):
+    """Lista de ``Decimal`` -> array ``int64`` en centavos."""
+    return np.rint(np.array(montos, dtype=np.float64) * 100).astype(np.int64)
+
+
+def extraer_pagos(desde, hasta):
+    """Pagos completados del rango: ``(dias, centavos)``."""
+    filas = list(
+        Pago.objects
+        .filter(estado_pago='COMPLETADO', fecha_pago__date__gte=desde, fecha_pago__date__lte=hasta)
+        .annotate(dia=TruncDate('fecha_pago'))
+        .values_list('dia', 'monto_pagado')
+    )
+    if not filas:
+        return _a_dias([]), np.zeros(0, dtype=np.int64)
+    dias, montos = zip(*filas)
+    return _a_dias(dias), _a_centavos(montos)
+
+
+def extraer_facturas(desde, hasta):
+    """Montos de facturas emitidas en el rango (centavos)."""
+    montos = list(
+        Factura.objects
+        .filter(fecha_emision__date__gte=desde, fecha_emision__date__lte=hasta)
+        .values_list('monto_total', flat=True)
+    )
+    return _a_centavos(montos) if montos else np.zeros(0, dtype=np.int64)
+
+
+def extraer_citas(hasta, desde=None, estados=None):
+    """Citas hasta ``hasta``: ``(paciente_ids, odontologo_ids, dias, estados)``."""
+    queryset = Cita.objects.filter(fecha_hora__date__lte=hasta)
+    if desde:
+        queryset = queryset.filter(fecha_hora__date__gte=desde)
+    if estados:
+        queryset = queryset.filter(estado__in=estados)
+    filas = list(
+        queryset
+        .annotate(dia=TruncDate('fecha_hora'))
+        .values_list('paciente_id', 'odontologo_id', 'dia', 'estado')
+    )
+    if not filas:
+        vacio = np.zeros(0, dtype=np.int64)
+        return vacio, vacio, _a_dias([]), np.zeros(0, dtype=object)
+    pacientes, odontologos, dias, estados_cita = zip(*filas)
+    return (
+        np.array([p or 0 for p in pacientes], dtype=np.int64),
+        np.array([o or 0 for o in odontologos], dtype=np.int64),
+        _a_dias(dias),
+        np.array(estados_cita, dtype=object),
+    )
+
+
+def _consumo_desde_detalles(detalles):
+    """Unidades que salieron del stock en un ajuste de la bitácora (0 si fue entrada)."""
+    if not isinstance(detalles, dict):
+        return 0.0
+    try:
+        if detalles.get('ajuste') is not None:
+            return max(-float(detalles['ajuste']), 0.0)
+        if detalles.get('stock_anterior') is not None and detalles.get('stock_actual') is not None:
+            return max(float(detalles['stock_anterior']) - float(detalles['stock_actual']), 0.0)
+    except (TypeError, ValueError):
+        pass
+    return 0.0
+
+
+def extraer_consumos(desde, hasta):
+    """
+    Salidas de stock de insumos en el rango: ``(insumo_ids, cantidades)``.
+
+    No hay tabla de movimientos de inventario; los ajustes de stock quedan en
+    la bitácora con ``detalles['ajuste']`` (o ``stock_anterior``/``stock_actual``).
+    """
+    filas = list(
+        BitacoraAccion.objects
+        .filter(
+            modelo='insumo',
+            object_id__isnull=False,
+            detalles__isnull=False,
+            fecha_hora__date__gte=desde,
+            fecha_hora__date__lte=hasta,
+        )
+        .values_list('object_id', 'detalles')
+    )
+    if not filas:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    insumos, detalles = zip(*filas)
+    cantidades = np.array([_consumo_desde_detalles(d) for d in detalles], dtype=np.float64)
+    insumos = np.array(insumos, dtype=np.int64)
+    salidas = cantidades > 0
+    return insumos[salidas], cantidades[salidas]
+
+
+# ============================================================================
+# CÁLCULOS VECTORIZADOS
+# ============================================================================
+
+def serie_diaria(dias, valores, desde, hasta):
+    """Suma ``valores`` por día para todo el rango (incluye días sin datos)."""
+    inicio = np.datetime64(desde, 'D')
+    n_dias = int((np.datetime64(hasta, 'D') - inicio).astype(int)) + 1
+    indices = (dias - inicio).astype(np.int64)
+    totales = np.bincount(indices, weights=valores, minlength=n_dias)[:n_dias]
+    conteos = np.bincount(indices, minlength=n_dias)[:n_dias]
+    fechas = inicio + np.arange(n_dias)
+    return fechas, totales, conteos
+
+
+def media_movil(serie, ventana):
+    """Media móvil hacia atrás; los primeros días usan la ventana parcial."""
+    acumulado = np.cumsum(np.concatenate(([0.0], serie)))
+    n = len(serie)
+    fin = np.arange(1, n + 1)
+    inicio = np.maximum(fin - ventana, 0)
+    return (acumulado[fin] - acumulado[inicio]) / (fin - inicio)
+
+
+def percentiles(valores, puntos=(50, 90)):
+    """Percentiles de ``valores``; ceros si no hay datos."""
+    if len(valores) == 0:
+        return {f'p{p}': 0.0 for p in puntos}
+    resultado = np.percentile(valores, puntos)
+    return {f'p{p}': float(v) for p, v in zip(puntos, resultado)}
+
+
+def agrupar_por_mes(dias, valores):
+    """Suma ``valores`` por mes calendario: ``(meses, totales, conteos)``."""
+    meses = dias.astype('datetime64[M]')
+    unicos, inverso = np.unique(meses, return_inverse=True)
+    totales = np.bincount(inverso, weights=valores, minlength=len(unicos))
+    conteos = np.bincount(inverso, minlength=len(unicos))
+    return unicos, totales, conteos
+
+
+def retencion_por_cohorte(pacientes, dias, max_meses=6):
+    """
+    Retención mensual por cohorte de primera visita.
+
+    Devuelve ``(cohortes, tamaños, matriz)`` donde ``matriz[i, k]`` es la
+    cantidad de pacientes de la cohorte ``i`` que volvieron ``k`` meses después.
+    """
+    meses = dias.astype('datetime64[M]').astype(np.int64)
+    ids, inverso = np.unique(pacientes, return_inverse=True)
+
+    primer_mes = np.full(len(ids), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(primer_mes, inverso, meses)
+    desfase = meses - primer_mes[inverso]
+
+    # Cada paciente cuenta una sola vez por (cohorte, desfase)
+    visibles = desfase <= max_meses
+    pares = np.unique(np.stack([inverso[visibles], desfase[visibles]], axis=1), axis=0)
+
+    cohortes, cohorte_idx = np.unique(primer_mes[pares[:, 0]], return_inverse=True)
+    matriz = np.zeros((len(cohortes), max_meses + 1), dtype=np.int64)
+    np.add.at(matriz, (cohorte_idx, pares[:, 1]), 1)
+    return cohortes.astype('datetime64[M]'), matriz[:, 0], matriz
+
+
+def productividad_por_odontologo(odontologos, pacientes, dias, estados):
+    """Totales por odontólogo y percentiles de citas atendidas por día trabajado."""
+    ids, inverso = np.unique(odontologos, return_inverse=True)
+    atendidas = estados == 'ATENDIDA'
+    canceladas = estados == 'CANCELADA'
+
+    total = np.bincount(inverso, minlength=len(ids))
+    total_atendidas = np.bincount(inverso, weights=atendidas, minlength=len(ids)).astype(np.int64)
+    total_canceladas = np.bincount(inverso, weights=canceladas, minlength=len(ids)).astype(np.int64)
+
+    # Pacientes únicos atendidos por odontólogo
+    pares = np.unique(np.stack([inverso[atendidas], pacientes[atendidas]], axis=1), axis=0)
+    pacientes_unicos = np.bincount(pares[:, 0], minlength=len(ids)) if len(pares) else np.zeros(len(ids), dtype=np.int64)
+
+    # Citas atendidas por (odontólogo, día) para percentiles diarios
+    dias_int = dias.astype(np.int64)
+    claves, conteo_dia = np.unique(
+        np.stack([inverso[atendidas], dias_int[atendidas]], axis=1), axis=0, return_counts=True
+    ) if atendidas.any() else (np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    resultado = []
+    for i, odontologo_id in enumerate(ids):
+        por_dia = conteo_dia[claves[:, 0] == i]
+        resultado.append({
+            'odontologo_id': int(odontologo_id),
+            'total_citas': int(total[i]),
+            'citas_atendidas': int(total_atendidas[i]),
+            'citas_canceladas': int(total_canceladas[i]),
+            'pacientes_unicos': int(pacientes_unicos[i]),
+            'dias_trabajados': int(len(por_dia)),
+            'tasa_atencion': round(float(total_atendidas[i]) / float(total[i]) * 100, 2) if total[i] else 0.0,
+            'atendidas_por_dia': percentiles(por_dia),
+        })
+    return resultado
+
+
+def pronostico_stock(insumo_ids, stock, stock_minimo, consumo_ids, consumos, ventana, dias_entrega):
+    """
+    Días de stock restante y punto de reorden para todos los insumos a la vez.
+
+    - ``tasa_diaria``: consumo de la ventana / días de la ventana.
+    - ``punto_reorden``: ``stock_minimo + tasa_diaria * dias_entrega``.
+    - ``en_riesgo``: el stock ya está en o bajo el punto de reorden.
+    - ``cantidad_sugerida``: lo necesario para volver al punto de reorden más
+      una ventana de consumo (solo para insumos en riesgo).
+
+    ``insumo_ids`` debe estar ordenado. ``dias_restantes`` es ``inf`` para
+    insumos sin consumo en la ventana.
+    """
+    n = len(insumo_ids)
+    posiciones = np.searchsorted(insumo_ids, consumo_ids)
+    validos = posiciones < n
+    validos[validos] = insumo_ids[posiciones[validos]] == consumo_ids[validos]
+    consumo = np.bincount(posiciones[validos], weights=consumos[validos], minlength=n)[:n]
+
+    tasa = consumo / float(ventana)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dias_restantes = np.where(tasa > 0, stock / tasa, np.inf)
+    punto_reorden = stock_minimo + tasa * dias_entrega
+    en_riesgo = stock <= punto_reorden
+    cantidad_sugerida = np.where(
+        en_riesgo, np.ceil(np.maximum(punto_reorden + tasa * ventana - stock, 0)), 0
+    )
+    return {
+        'consumo': consumo,
+        'tasa_diaria': tasa,
+        'dias_restantes': dias_restantes,
+        'punto_reorden': punto_reorden,
+        'en_riesgo': en_riesgo,
+        'cantidad_sugerida': cantidad_sugerida,
+    }
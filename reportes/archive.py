@@ -0,0 +1,415 @@
+"""
+Archivo columnar comprimido para registros antiguos de la bitácora.
+
+La bitácora no permite eliminar registros desde el admin, por lo que la tabla
+solo crece. Los registros más antiguos que la ventana activa se mueven a
+archivos de solo-anexado en disco local, agrupados por mes:
+
+    <REPORTES_BITACORA_ARCHIVO_DIR>/<schema>/<YYYY-MM>/part-<marca>.parquet
+    <REPORTES_BITACORA_ARCHIVO_DIR>/<schema>/<YYYY-MM>/part-<marca>.ndjson.gz  (sin pyarrow)
+    <REPORTES_BITACORA_ARCHIVO_DIR>/<schema>/indice.json
+
+``indice.json`` guarda por mes el mínimo/máximo de fecha e id, la cantidad de
+filas y los archivos, para que la lectura solo abra los meses necesarios.
+
+Cada lote se registra en ``pendientes.json`` (con fsync) antes de eliminarse
+de la tabla. Si el proceso se interrumpe entre ambos pasos, la próxima
+lectura o archivado resuelve los pendientes: si sus ids ya no están en la
+tabla se incorporan al índice, y si siguen ahí se descarta el archivo.
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, time, timezone as dt_timezone
+from itertools import chain
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import BitacoraAccion
+
+logger = logging.getLogger(__name__)
+
+
+def _pyarrow():
+    """``(pa, pq)`` si pyarrow está instalado; se importa recién al escribir o leer Parquet."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:  # pragma: no cover - dependencia opcional
+        return None, None
+    return pa, pq
+
+
+def parquet_disponible():
+    return _pyarrow()[0] is not None
+
+ARCHIVO_DIR = getattr(
+    settings,
+    'REPORTES_BITACORA_ARCHIVO_DIR',
+    os.path.join(str(getattr(settings, 'BASE_DIR', '.')), 'archivo_bitacora')
+)
+DIAS_ACTIVOS = getattr(settings, 'REPORTES_BITACORA_DIAS_ACTIVOS', 365)
+
+COLUMNAS = [
+    'id', 'usuario_id', 'usuario_nombre', 'usuario_email', 'usuario_tipo',
+    'accion', 'modelo', 'object_id', 'descripcion', 'detalles',
+    'fecha_hora', 'ip_address', 'user_agent', 'hash_anterior', 'hash_registro',
+]
+
+
+def _directorio_tenant():
+    return os.path.join(ARCHIVO_DIR, getattr(connection, 'schema_name', None) or 'public')
+
+
+def _ruta_indice():
+    return os.path.join(_directorio_tenant(), 'indice.json')
+
+
+def _ruta_pendientes():
+    return os.path.join(_directorio_tenant(), 'pendientes.json')
+
+
+def _leer_json(ruta, vacio):
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return vacio
+
+
+def _sincronizar(ruta):
+    """fsync del archivo (o directorio) para que sobreviva a una caída."""
+    descriptor = os.open(ruta, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def _guardar_json(ruta, datos):
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, indent=2, sort_keys=True)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+    _sincronizar(os.path.dirname(ruta))
+
+
+def leer_indice():
+    """Devuelve el índice ``{mes: {...}}`` del tenant actual."""
+    return _leer_json(_ruta_indice(), {})
+
+
+def _guardar_indice(indice):
+    _guardar_json(_ruta_indice(), indice)
+
+
+def _agregar_al_indice(indice, parte):
+    """Incorpora al índice una parte ``{mes, ruta, min/max fecha e id, filas, hash_final}``."""
+    entrada = indice.setdefault(parte['mes'], {
+        'min_fecha': parte['min_fecha'], 'max_fecha': parte['max_fecha'],
+        'min_id': parte['min_id'], 'max_id': parte['max_id'],
+        'filas': 0, 'archivos': [],
+    })
+    if parte['max_id'] >= entrada['max_id']:
+        # hash_registro del último id archivado: ancla de la cadena activa
+        entrada['hash_final'] = parte['hash_final']
+    entrada['min_fecha'] = min(entrada['min_fecha'], parte['min_fecha'])
+    entrada['max_fecha'] = max(entrada['max_fecha'], parte['max_fecha'])
+    entrada['min_id'] = min(entrada['min_id'], parte['min_id'])
+    entrada['max_id'] = max(entrada['max_id'], parte['max_id'])
+    entrada['filas'] += parte['filas']
+    entrada['archivos'].append(parte['ruta'])
+
+
+def resolver_pendientes():
+    """
+    Completa o descarta los lotes de un archivado interrumpido.
+
+    La eliminación de cada lote es atómica: si ninguno de sus ids sigue en la
+    tabla el lote se eliminó y sus archivos pasan al índice; si siguen, la
+    eliminación no ocurrió y los archivos se borran.
+    """
+    pendientes = _leer_json(_ruta_pendientes(), [])
+    if not pendientes:
+        return
+    indice = leer_indice()
+    for parte in pendientes:
+        if BitacoraAccion.objects.filter(id__in=parte['ids']).exists():
+            ruta = os.path.join(_directorio_tenant(), parte['ruta'])
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            logger.warning(f"🗄️ Bitácora: se descartó el archivo no confirmado {parte['ruta']}")
+        else:
+            _agregar_al_indice(indice, parte)
+            logger.warning(f"🗄️ Bitácora: se incorporó al índice el archivo {parte['ruta']}")
+    _guardar_indice(indice)
+    _guardar_json(_ruta_pendientes(), [])
+
+
+def ultimo_archivado():
+    """``(id, hash_registro)`` del último registro archivado, o None si no hay archivo."""
+    resolver_pendientes()
+    entradas = [entrada for entrada in leer_indice().values() if entrada.get('hash_final')]
+    if not entradas:
+        return None
+    entrada = max(entradas, key=lambda e: e['max_id'])
+    return entrada['max_id'], entrada['hash_final']
+
+
+def ultima_fecha_archivada():
+    """
+    Día local (YYYY-MM-DD) del registro archivado más reciente, o None si no
+    hay archivo. Es el límite real del archivo, cualquiera sea el ``--dias``
+    con el que se ejecutó archivar_bitacora.
+    """
+    resolver_pendientes()
+    fechas = [entrada['max_fecha'] for entrada in leer_indice().values()]
+    if not fechas:
+        return None
+    return timezone.localtime(datetime.fromisoformat(max(fechas))).date().isoformat()
+
+
+def _a_registro(bitacora):
+    """Registro plano (columnas de COLUMNAS) de una entrada de bitácora."""
+    if not bitacora.usuario_nombre:
+        bitacora.tomar_snapshot()
+    return {
+        'id': bitacora.id,
+        'usuario_id': bitacora.usuario_id,
+        'usuario_nombre': bitacora.usuario_nombre,
+        'usuario_email': bitacora.usuario_email or None,
+        'usuario_tipo': bitacora.usuario_tipo,
+        'accion': bitacora.accion,
+        'modelo': bitacora.modelo or None,
+        'object_id': bitacora.object_id,
+        'descripcion': bitacora.descripcion,
+        'detalles': json.dumps(bitacora.detalles) if bitacora.detalles is not None else None,
+        'fecha_hora': bitacora.fecha_hora.astimezone(dt_timezone.utc).isoformat(),
+        'ip_address': bitacora.ip_address,
+        'user_agent': bitacora.user_agent,
+        'hash_anterior': bitacora.hash_anterior or None,
+        'hash_registro': bitacora.hash_registro or None,
+    }
+
+
+def _escribir_parte(mes, registros):
+    """Escribe un archivo nuevo (solo-anexado) con los registros de un mes."""
+    directorio = os.path.join(_directorio_tenant(), mes)
+    os.makedirs(directorio, exist_ok=True)
+    marca = f"{timezone.now().strftime('%Y%m%d%H%M%S%f')}-{registros[0]['id']}"
+
+    pa, pq = _pyarrow()
+    if pa is not None:
+        ruta = os.path.join(directorio, f"part-{marca}.parquet")
+        tabla = pa.Table.from_pylist(registros)
+        pq.write_table(tabla, ruta, compression='zstd')
+    else:
+        ruta = os.path.join(directorio, f"part-{marca}.ndjson.gz")
+        with gzip.open(ruta, 'wt', encoding='utf-8') as archivo:
+            for registro in registros:
+                archivo.write(json.dumps(registro, ensure_ascii=False))
+                archivo.write('\n')
+    _sincronizar(ruta)
+    return ruta
+
+
+def _leer_parte(ruta):
+    if ruta.endswith('.parquet'):
+        _, pq = _pyarrow()
+        if pq is None:
+            raise RuntimeError(f"Se requiere pyarrow para leer {ruta}")
+        return pq.read_table(ruta, columns=COLUMNAS).to_pylist()
+    with gzip.open(ruta, 'rt', encoding='utf-8') as archivo:
+        return [json.loads(linea) for linea in archivo if linea.strip()]
+
+
+def archivar(antes_de, lote=5000):
+    """
+    Mueve al archivo los registros del tenant actual anteriores a ``antes_de``.
+
+    Cada lote se escribe primero a disco y se registra en ``pendientes.json``;
+    recién entonces se elimina de la tabla en una transacción y pasa al
+    índice. Si la eliminación falla, los archivos del lote se descartan.
+    El último registro de la tabla nunca se archiva, porque los nuevos
+    registros toman de él su ``hash_anterior``.
+    Devuelve la cantidad de registros archivados.
+    """
+    resolver_pendientes()
+    indice = leer_indice()
+    total = 0
+    ultimo_id = BitacoraAccion.objects.order_by('-id').values_list('id', flat=True).first()
+
+    while True:
+        bitacoras = list(
+            BitacoraAccion.objects
+            .filter(fecha_hora__lt=antes_de)
+            .exclude(id=ultimo_id)
+            .defer('busqueda')
+            .order_by('id')[:lote]
+        )
+        if not bitacoras:
+            break
+
+        por_mes = {}
+        for bitacora in bitacoras:
+            registro = _a_registro(bitacora)
+            por_mes.setdefault(registro['fecha_hora'][:7], []).append(registro)
+
+        partes = []
+        try:
+            for mes, registros in por_mes.items():
+                ruta = _escribir_parte(mes, registros)
+                partes.append({
+                    'mes': mes,
+                    'ruta': os.path.relpath(ruta, _directorio_tenant()),
+                    'min_fecha': min(r['fecha_hora'] for r in registros),
+                    'max_fecha': max(r['fecha_hora'] for r in registros),
+                    'min_id': registros[0]['id'],
+                    'max_id': registros[-1]['id'],
+                    'filas': len(registros),
+                    'hash_final': registros[-1]['hash_registro'],
+                    'ids': [r['id'] for r in registros],
+                })
+            _guardar_json(_ruta_pendientes(), partes)
+            with transaction.atomic():
+                BitacoraAccion.objects.filter(id__in=[b.id for b in bitacoras]).delete()
+        except Exception:
+            for parte in partes:
+                ruta = os.path.join(_directorio_tenant(), parte['ruta'])
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            _guardar_json(_ruta_pendientes(), [])
+            raise
+
+        for parte in partes:
+            _agregar_al_indice(indice, parte)
+        _guardar_indice(indice)
+        _guardar_json(_ruta_pendientes(), [])
+
+        total += len(bitacoras)
+        logger.info(f"🗄️ Bitácora: {total} registros archivados")
+
+    return total
+
+
+def _limite_iso(fecha, fin=False):
+    """Fecha (YYYY-MM-DD) -> ISO UTC comparable con las columnas archivadas."""
+    dia = datetime.strptime(fecha, '%Y-%m-%d').date() if isinstance(fecha, str) else fecha
+    momento = timezone.make_aware(datetime.combine(dia, time.max if fin else time.min))
+    return momento.astimezone(dt_timezone.utc).isoformat()
+
+
+def _meses(desde_iso, hasta_iso):
+    """Entradas del índice que se solapan con [desde, hasta], del mes más reciente al más antiguo."""
+    resolver_pendientes()
+    for mes, entrada in sorted(leer_indice().items(), reverse=True):
+        if desde_iso and entrada['max_fecha'] < desde_iso:
+            continue
+        if hasta_iso and entrada['min_fecha'] > hasta_iso:
+            continue
+        yield mes, entrada
+
+
+def _filtro(desde_iso, hasta_iso, usuario, accion, modelo, ip, descripcion, texto=None):
+    terminos = [termino.lower() for termino in (texto or '').replace(',', ' ').split()]
+
+    def coincide(registro):
+        if desde_iso and registro['fecha_hora'] < desde_iso:
+            return False
+        if hasta_iso and registro['fecha_hora'] > hasta_iso:
+            return False
+        if usuario and str(registro['usuario_id']) != str(usuario):
+            return False
+        if accion and registro['accion'] != accion:
+            return False
+        if modelo and registro['modelo'] != modelo.lower():
+            return False
+        if ip and registro['ip_address'] != ip:
+            return False
+        if descripcion and descripcion.lower() not in (registro['descripcion'] or '').lower():
+            return False
+        if terminos:
+            # Como SearchFilter de DRF: cada término en descripción o IP
+            campos = f"{registro['descripcion'] or ''} {registro['ip_address'] or ''}".lower()
+            if not all(termino in campos for termino in terminos):
+                return False
+        return True
+    return coincide
+
+
+def _registros_del_mes(entrada, coincide):
+    partes = (_leer_parte(os.path.join(_directorio_tenant(), ruta)) for ruta in entrada['archivos'])
+    return (registro for registro in chain.from_iterable(partes) if coincide(registro))
+
+
+def buscar(desde=None, hasta=None, usuario=None, accion=None, modelo=None, ip=None, descripcion=None, texto=None):
+    """
+    Generador de los registros archivados que cumplen los filtros, del más
+    reciente al más antiguo.
+
+    Solo abre los meses cuyo rango [min_fecha, max_fecha] del índice se solapa
+    con [desde, hasta], y de a un mes por vez (los meses no se solapan, así
+    que basta ordenar dentro de cada uno). Devuelve dicts con el formato de
+    BitacoraSerializer.
+    """
+    desde_iso = _limite_iso(desde) if desde else None
+    hasta_iso = _limite_iso(hasta, fin=True) if hasta else None
+    coincide = _filtro(desde_iso, hasta_iso, usuario, accion, modelo, ip, descripcion, texto)
+
+    for _, entrada in _meses(desde_iso, hasta_iso):
+        registros = sorted(_registros_del_mes(entrada, coincide), key=lambda r: r['fecha_hora'], reverse=True)
+        for registro in registros:
+            yield _a_salida(registro)
+
+
+def contar(desde=None, hasta=None, usuario=None, accion=None, modelo=None, ip=None, descripcion=None, texto=None):
+    """
+    Cantidad de registros archivados que cumplen los filtros. Los meses que
+    quedan completos dentro del rango y sin otros filtros se cuentan con el
+    índice, sin abrir sus archivos.
+    """
+    desde_iso = _limite_iso(desde) if desde else None
+    hasta_iso = _limite_iso(hasta, fin=True) if hasta else None
+    coincide = _filtro(desde_iso, hasta_iso, usuario, accion, modelo, ip, descripcion, texto)
+    sin_filtros = not any([usuario, accion, modelo, ip, descripcion, texto])
+
+    total = 0
+    for _, entrada in _meses(desde_iso, hasta_iso):
+        completo = (
+            (not desde_iso or entrada['min_fecha'] >= desde_iso)
+            and (not hasta_iso or entrada['max_fecha'] <= hasta_iso)
+        )
+        if sin_filtros and completo:
+            total += entrada['filas']
+        else:
+            total += sum(1 for _ in _registros_del_mes(entrada, coincide))
+    return total
+
+
+def _a_salida(registro):
+    """Registro archivado -> formato de salida de BitacoraSerializer."""
+    acciones = dict(BitacoraAccion.ACCION_CHOICES)
+    return {
+        'id': registro['id'],
+        'usuario': {
+            'id': registro['usuario_id'],
+            'nombre_completo': registro['usuario_nombre'],
+            'email': registro['usuario_email'] or 'sistema@clinica-demo.com',
+            'tipo_usuario': registro['usuario_tipo'],
+        },
+        'accion': registro['accion'],
+        'accion_display': acciones.get(registro['accion'], registro['accion']),
+        'modelo': registro['modelo'],
+        'object_id': registro['object_id'],
+        'descripcion': registro['descripcion'],
+        'detalles': json.loads(registro['detalles']) if registro['detalles'] else None,
+        'fecha_hora': registro['fecha_hora'],
+        'ip_address': registro['ip_address'],
+        'user_agent': registro['user_agent'],
+        'archivado': True,
+    }
@@ -0,0 +1,282 @@
+"""
+Captura automática de auditoría (CU39) con muestreo y escritura asíncrona.
+
+- ``BitacoraMiddleware`` (reportes/middleware.py) guarda el request actual y
+  registra VER/EXPORTAR al terminar cada request de la API.
+- signals.py registra CREAR/EDITAR/ELIMINAR de los modelos configurados.
+- Las entradas se encolan y un hilo de fondo las escribe, fuera del hilo del
+  request. El muestreo por acción acota la amplificación de escrituras de VER;
+  las entradas muestreadas guardan su tasa en ``detalles['_muestreo']`` (clave
+  reservada) y los contadores las escalan por 1/tasa. Al terminar el proceso
+  se vacía la cola (ver ``DespachadorBitacora.vaciar``).
+
+Está desactivada por defecto. Al activarla, listar en REPORTES_AUDITORIA_MODELOS
+solo modelos cuyas vistas no llamen ya a ``BitacoraAccion.registrar``, para no
+registrar dos veces el mismo cambio.
+
+Configuración (settings.py):
+    REPORTES_AUDITORIA_AUTOMATICA = False
+    REPORTES_AUDITORIA_ASINCRONA = True
+    REPORTES_AUDITORIA_MUESTREO = {'VER': 0.1}   # fracción registrada por acción, 0 < tasa <= 1
+    REPORTES_AUDITORIA_ESPERA_SALIDA = 10        # segundos para vaciar la cola al salir
+    REPORTES_AUDITORIA_MODELOS = []              # p. ej. ['inventario.Insumo']
+    REPORTES_AUDITORIA_RUTAS = ['/api/']
+"""
+import atexit
+import logging
+import queue
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from django_tenants.utils import schema_context
+
+from .models import CLAVE_MUESTREO, BitacoraAccion
+
+logger = logging.getLogger(__name__)
+
+AUDITORIA_AUTOMATICA = getattr(settings, 'REPORTES_AUDITORIA_AUTOMATICA', False)
+AUDITORIA_ASINCRONA = getattr(settings, 'REPORTES_AUDITORIA_ASINCRONA', True)
+MUESTREO = getattr(settings, 'REPORTES_AUDITORIA_MUESTREO', {'VER': 0.1})
+MODELOS_AUDITADOS = getattr(settings, 'REPORTES_AUDITORIA_MODELOS', [])
+RUTAS_AUDITADAS = getattr(settings, 'REPORTES_AUDITORIA_RUTAS', ['/api/'])
+TAMANO_COLA = getattr(settings, 'REPORTES_AUDITORIA_COLA', 10000)
+ESPERA_SALIDA = getattr(settings, 'REPORTES_AUDITORIA_ESPERA_SALIDA', 10)
+
+
+def _validar_muestreo(muestreo):
+    for accion, tasa in muestreo.items():
+        if not 0 < float(tasa) <= 1:
+            raise ImproperlyConfigured(
+                f"REPORTES_AUDITORIA_MUESTREO['{accion}'] debe estar en (0, 1]; para no registrar "
+                f"una acción desactive la auditoría automática"
+            )
+    return muestreo
+
+
+_validar_muestreo(MUESTREO)
+
+
+# ============================================================================
+# CONTEXTO DEL REQUEST
+# ============================================================================
+
+_contexto = threading.local()
+
+
+def establecer_request(request):
+    _contexto.request = request
+
+
+def limpiar_request():
+    _contexto.request = None
+
+
+def request_actual():
+    return getattr(_contexto, 'request', None)
+
+
+# ============================================================================
+# MUESTREO
+# ============================================================================
+
+def tasa_muestreo(accion):
+    return float(MUESTREO.get(accion, 1.0))
+
+
+def debe_registrar(accion):
+    """Decide por muestreo si se registra una acción de este tipo."""
+    tasa = tasa_muestreo(accion)
+    return tasa >= 1.0 or random.random() < tasa
+
+
+# ============================================================================
+# DESPACHO ASÍNCRONO
+# ============================================================================
+
+class DespachadorBitacora:
+    """
+    Cola acotada + hilo de fondo que escribe entradas de bitácora.
+
+    Si la cola está llena la entrada se escribe en el hilo del request: ese
+    request se demora, pero no se pierde ninguna entrada. ``desbordes`` cuenta
+    cuántas veces ocurrió, para dimensionar REPORTES_AUDITORIA_COLA.
+    El hilo es daemon, así que al salir del proceso (reciclado del worker,
+    deploy) ``vaciar`` espera a la cola y escribe lo que quede.
+    """
+
+    def __init__(self, maxsize=TAMANO_COLA):
+        self.cola = queue.Queue(maxsize=maxsize)
+        self.desbordes = 0
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(
+                    target=self._procesar, name='bitacora-despachador', daemon=True
+                )
+                self._hilo.start()
+
+    def enviar(self, datos):
+        self._iniciar()
+        try:
+            self.cola.put_nowait(datos)
+        except queue.Full:
+            with self._lock:
+                self.desbordes += 1
+                desbordes = self.desbordes
+            logger.warning(
+                f"⚠️ Cola de bitácora llena ({desbordes} desbordes), se escribe en línea: {datos.get('descripcion')}"
+            )
+            escribir(datos)
+
+    def vaciar(self, espera=ESPERA_SALIDA):
+        """
+        Espera hasta ``espera`` segundos a que el hilo termine la cola y
+        escribe en línea las entradas que sigan pendientes.
+        """
+        limite = time.monotonic() + espera
+        while self.cola.unfinished_tasks and time.monotonic() < limite:
+            time.sleep(0.05)
+
+        pendientes = 0
+        while True:
+            try:
+                datos = self.cola.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                escribir(datos)
+                pendientes += 1
+            except Exception as e:
+                logger.error(f"Error escribiendo bitácora automática al salir: {str(e)}")
+            finally:
+                self.cola.task_done()
+        if pendientes:
+            logger.warning(f"⚠️ Bitácora: {pendientes} entradas escritas en línea al terminar el proceso")
+
+    def _procesar(self):
+        while True:
+            datos = self.cola.get()
+            try:
+                escribir(datos)
+            except Exception as e:
+                logger.error(f"Error escribiendo bitácora automática: {str(e)}")
+            finally:
+                close_old_connections()
+                self.cola.task_done()
+
+
+despachador = DespachadorBitacora()
+atexit.register(despachador.vaciar)
+
+
+def escribir(datos):
+    """Escribe una entrada preparada por ``preparar_entrada`` en su tenant."""
+    datos = dict(datos)
+    schema_name = datos.pop('schema_name', None)
+    if schema_name:
+        with schema_context(schema_name):
+            BitacoraAccion(**datos).save()
+    else:
+        BitacoraAccion(**datos).save()
+
+
+def despachar(datos):
+    """Envía la entrada al hilo de fondo (o la escribe en línea si está desactivado)."""
+    if AUDITORIA_ASINCRONA:
+        despachador.enviar(datos)
+    else:
+        escribir(datos)
+
+
+def preparar_entrada(accion, descripcion, request=None, content_type=None, object_id=None, detalles=None):
+    """
+    Construye los campos de la entrada en el hilo del request.
+
+    Incluye el snapshot del usuario (sin consultas: ``request.user`` ya está
+    cargado) y el esquema del tenant para escribir en el lugar correcto.
+    """
+    from .signals import get_client_ip
+
+    usuario = getattr(request, 'user', None) if request else None
+    autenticado = bool(usuario and usuario.is_authenticated)
+
+    datos = {
+        'accion': accion,
+        'descripcion': descripcion,
+        'detalles': detalles,
+        'fecha_hora': timezone.now(),
+        'usuario_id': usuario.pk if autenticado else None,
+        'usuario_nombre': usuario.full_name if autenticado else 'Sistema',
+        'usuario_email': (usuario.email or '') if autenticado else 'sistema@clinica-demo.com',
+        'usuario_tipo': (usuario.tipo_usuario or '') if autenticado else 'SISTEMA',
+        'ip_address': get_client_ip(request) if request else None,
+        'user_agent': request.META.get('HTTP_USER_AGENT') if request else None,
+        'schema_name': getattr(connection, 'schema_name', None),
+    }
+    if content_type is not None:
+        datos['content_type_id'] = content_type.id
+        datos['modelo'] = content_type.model
+        datos['object_id'] = object_id
+    return datos
+
+
+def registrar_cambio_modelo(instance, accion, verbo):
+    """Registra CREAR/EDITAR/ELIMINAR de un modelo auditado tras el commit."""
+    from django.contrib.contenttypes.models import ContentType
+
+    request = request_actual()
+    if request is None or not debe_registrar(accion):
+        return
+
+    content_type = ContentType.objects.get_for_model(instance)
+    datos = preparar_entrada(
+        accion,
+        f"{verbo} {instance._meta.verbose_name} #{instance.pk}",
+        request=request,
+        content_type=content_type,
+        object_id=instance.pk if isinstance(instance.pk, int) else None,
+        detalles=_detalles_muestreo(accion, {'automatico': True}),
+    )
+    transaction.on_commit(lambda: despachar(datos))
+
+
+def registrar_request(request, response):
+    """Registra VER/EXPORTAR al final de un request de la API."""
+    if request.method != 'GET' or response.status_code >= 400:
+        return
+    if not any(request.path.startswith(ruta) for ruta in RUTAS_AUDITADAS):
+        return
+    if not (getattr(request, 'user', None) and request.user.is_authenticated):
+        return
+
+    formato = request.GET.get('formato', '').lower()
+    exportacion = formato in ('pdf', 'excel', 'csv') or request.path.rstrip('/').endswith('exportar')
+    accion = 'EXPORTAR' if exportacion else 'VER'
+    if not debe_registrar(accion):
+        return
+
+    detalles = {'ruta': request.path, 'automatico': True}
+    if request.GET:
+        detalles['parametros'] = request.GET.dict()
+    despachar(preparar_entrada(
+        accion,
+        f"{'Exportó' if exportacion else 'Consultó'} {request.path}",
+        request=request,
+        detalles=_detalles_muestreo(accion, detalles),
+    ))
+
+
+def _detalles_muestreo(accion, detalles):
+    """Anota la tasa de muestreo para poder escalar los conteos de VER."""
+    tasa = tasa_muestreo(accion)
+    if tasa < 1.0:
+        detalles[CLAVE_MUESTREO] = tasa
+    return detalles
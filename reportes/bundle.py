@@ -0,0 +1,421 @@
+"""
+Paquetes de reportes con planificación de consultas compartida.
+
+Un paquete agrupa varios reportes sobre un mismo rango de fechas. Cada reporte
+declara de qué resultados intermedios depende (p. ej. el agregado de citas del
+rango por día, odontólogo y estado) y se arma en Python a partir de ellos; los
+intermedios requeridos se calculan una sola vez y en paralelo, así que seis
+reportes no recorren seis veces la tabla de citas.
+
+Ejemplo:
+    paquete = ejecutar(['tendencia-citas', 'ocupacion-odontologos'], desde, hasta)
+    paquete['reportes']['tendencia-citas']  # {'titulo', 'datos', 'metricas'}
+    paquete['consultas']                    # {'solicitadas': 3, 'ejecutadas': 2}
+
+Salidas: un Excel con una hoja por reporte (``a_excel``) o un ZIP de PDFs que
+se transmite a medida que se renderiza cada documento (``pdfs_en_zip``).
+"""
+import zipfile
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+
+from agenda.models import Cita
+from facturacion.models import Factura, Pago
+from tratamientos.models import ItemPlanTratamiento
+from usuarios.models import PerfilOdontologo
+
+from .projection import Columna, Proyeccion, nombre_completo
+from .query_batch import ejecutar_en_paralelo
+from . import exporters
+from .utils import MoneyAccumulator, format_currency, format_date
+
+Reporte = namedtuple('Reporte', ['titulo', 'intermedios', 'construir'])
+
+PROYECCION_ODONTOLOGOS = Proyeccion(
+    Columna('id'),
+    Columna('usuario_id'),
+    Columna('nombre', 'usuario__first_name', 'usuario__last_name', calcular=nombre_completo),
+    Columna('especialidad', calcular=lambda especialidad: especialidad or 'General'),
+)
+
+
+# ============================================================================
+# RESULTADOS INTERMEDIOS (una consulta cada uno, compartidos entre reportes)
+# ============================================================================
+
+def _citas(desde, hasta):
+    """Citas del rango agrupadas por día, odontólogo y estado."""
+    return list(
+        Cita.objects
+        .filter(fecha_hora__date__gte=desde, fecha_hora__date__lte=hasta)
+        .values('fecha_hora__date', 'odontologo_id', 'estado')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+
+
+def _pacientes_atendidos(desde, hasta):
+    """Pacientes distintos atendidos en el rango por odontólogo."""
+    return {
+        fila['odontologo_id']: fila['pacientes']
+        for fila in (
+            Cita.objects
+            .filter(fecha_hora__date__gte=desde, fecha_hora__date__lte=hasta, estado='ATENDIDA')
+            .values('odontologo_id')
+            .annotate(pacientes=Count('paciente', distinct=True))
+            .order_by()
+        )
+    }
+
+
+def _odontologos(desde, hasta):
+    return PROYECCION_ODONTOLOGOS.filas(PerfilOdontologo.objects.filter(usuario__is_active=True))
+
+
+def _pagos(desde, hasta):
+    """Pagos completados del rango agrupados por día."""
+    return {
+        fila['fecha_pago__date']: fila
+        for fila in (
+            Pago.objects
+            .filter(fecha_pago__date__gte=desde, fecha_pago__date__lte=hasta, estado_pago='COMPLETADO')
+            .values('fecha_pago__date')
+            .annotate(total=Sum('monto_pagado'), num_pagos=Count('id'))
+            .order_by()
+        )
+    }
+
+
+def _facturas(desde, hasta):
+    return Factura.objects.filter(
+        fecha_emision__date__gte=desde, fecha_emision__date__lte=hasta
+    ).aggregate(
+        total_facturado=Sum('monto_total'),
+        total_pagado=Sum('monto_pagado'),
+        numero_facturas=Count('id'),
+    )
+
+
+def _servicios(desde, hasta):
+    """Ítems de los planes creados en el rango agrupados por servicio."""
+    return list(
+        ItemPlanTratamiento.objects
+        .filter(
+            plan_tratamiento__fecha_creacion__date__gte=desde,
+            plan_tratamiento__fecha_creacion__date__lte=hasta,
+        )
+        .values('servicio_id', 'servicio__nombre', 'servicio__categoria', 'servicio__precio_base')
+        .annotate(
+            total_veces=Count('id'),
+            completados=Count('id', filter=Q(estado='COMPLETADO')),
+            ingreso_total=Sum('costo'),
+        )
+        .order_by('-total_veces')
+    )
+
+
+INTERMEDIOS = {
+    'citas': _citas,
+    'pacientes_atendidos': _pacientes_atendidos,
+    'odontologos': _odontologos,
+    'pagos': _pagos,
+    'facturas': _facturas,
+    'servicios': _servicios,
+}
+
+
+# ============================================================================
+# REPORTES (se arman en Python a partir de los intermedios)
+# ============================================================================
+
+def _dias(desde, hasta):
+    dia = desde
+    while dia <= hasta:
+        yield dia
+        dia += timedelta(days=1)
+
+
+def _citas_por_odontologo(citas):
+    conteos = defaultdict(lambda: defaultdict(int))
+    for fila in citas:
+        conteos[fila['odontologo_id']][fila['estado']] += fila['total']
+    return conteos
+
+
+def _tendencia_citas(datos, desde, hasta):
+    por_dia = defaultdict(lambda: defaultdict(int))
+    for fila in datos['citas']:
+        por_dia[fila['fecha_hora__date']][fila['estado']] += fila['total']
+
+    filas = []
+    for dia in _dias(desde, hasta):
+        estados = por_dia.get(dia, {})
+        filas.append({
+            'Fecha': format_date(dia),
+            'Total Citas': sum(estados.values()),
+            'Completadas': estados.get('ATENDIDA', 0),
+            'Canceladas': estados.get('CANCELADA', 0),
+        })
+    metricas = {
+        'Total de Días': len(filas),
+        'Total Citas': sum(fila['Total Citas'] for fila in filas),
+        'Completadas': sum(fila['Completadas'] for fila in filas),
+        'Canceladas': sum(fila['Canceladas'] for fila in filas),
+    }
+    return filas, metricas
+
+
+def _citas_odontologo(datos, desde, hasta):
+    conteos = _citas_por_odontologo(datos['citas'])
+    filas = []
+    for odontologo in datos['odontologos']:
+        estados = conteos.get(odontologo['id'], {})
+        total = sum(estados.values())
+        completadas = estados.get('ATENDIDA', 0)
+        filas.append({
+            'odontologo': odontologo['nombre'],
+            'especialidad': odontologo['especialidad'],
+            'total_citas': total,
+            'confirmadas': estados.get('CONFIRMADA', 0),
+            'completadas': completadas,
+            'canceladas': estados.get('CANCELADA', 0),
+            'tasa_completado': f"{(completadas / total * 100):.1f}%" if total > 0 else "0%",
+        })
+    return filas, None
+
+
+def _ocupacion_odontologos(datos, desde, hasta):
+    conteos = _citas_por_odontologo(datos['citas'])
+    filas = []
+    for odontologo in datos['odontologos']:
+        estados = conteos.get(odontologo['id'], {})
+        total = sum(estados.values())
+        completadas = estados.get('ATENDIDA', 0)
+        filas.append({
+            'usuario_id': odontologo['usuario_id'],
+            'nombre_completo': odontologo['nombre'],
+            'total_citas': total,
+            'citas_completadas': completadas,
+            'citas_canceladas': estados.get('CANCELADA', 0),
+            # Se asumen 2 horas por cita completada (igual que ocupacion-odontologos)
+            'horas_ocupadas': completadas * 2,
+            'tasa_ocupacion': str(round(completadas / total * 100, 2) if total > 0 else 0.0),
+            'pacientes_atendidos': datos['pacientes_atendidos'].get(odontologo['id'], 0),
+        })
+    filas.sort(key=lambda fila: float(fila['tasa_ocupacion']), reverse=True)
+    return filas, None
+
+
+def _ingresos_diarios(datos, desde, hasta):
+    filas = []
+    total = MoneyAccumulator()
+    for dia in _dias(desde, hasta):
+        pago = datos['pagos'].get(dia, {'total': Decimal('0.00'), 'num_pagos': 0})
+        total += pago['total']
+        filas.append({
+            'fecha': format_date(dia),
+            'ingresos': format_currency(pago['total']),
+            'num_pagos': pago['num_pagos'],
+        })
+    return filas, {'Ingresos del Rango': total}
+
+
+def _financiero(datos, desde, hasta):
+    facturas = datos['facturas']
+    total_facturado = MoneyAccumulator(facturas['total_facturado'])
+    total_pagado = MoneyAccumulator(facturas['total_pagado'])
+    filas = [
+        {'Métrica': 'Período', 'Valor': f"{format_date(desde)} - {format_date(hasta)}"},
+        {'Métrica': 'Total Facturado', 'Valor': total_facturado},
+        {'Métrica': 'Total Pagado', 'Valor': total_pagado},
+        {'Métrica': 'Saldo Pendiente', 'Valor': total_facturado - total_pagado},
+        {'Métrica': 'Número de Facturas', 'Valor': facturas['numero_facturas']},
+    ]
+    return filas, None
+
+
+def _top_procedimientos(datos, desde, hasta, limite=5):
+    filas = [
+        {
+            'Procedimiento': servicio['servicio__nombre'] or 'Sin nombre',
+            'Cantidad Realizada': servicio['total_veces'],
+        }
+        for servicio in datos['servicios'][:limite]
+    ]
+    metricas = {
+        'Total Procedimientos': sum(fila['Cantidad Realizada'] for fila in filas),
+        'Procedimientos Únicos': len(filas),
+    }
+    return filas, metricas
+
+
+def _servicios_populares(datos, desde, hasta, limite=10):
+    filas = []
+    for servicio in datos['servicios'][:limite]:
+        total_veces = servicio['total_veces']
+        ingreso_total = servicio['ingreso_total'] or Decimal('0.00')
+        filas.append({
+            'servicio': servicio['servicio__nombre'],
+            'categoria': servicio['servicio__categoria'],
+            'total_veces': total_veces,
+            'completados': servicio['completados'],
+            'tasa_completado': f"{(servicio['completados'] / total_veces * 100):.1f}%",
+            'precio_base': format_currency(servicio['servicio__precio_base']),
+            'ingreso_total': format_currency(ingreso_total),
+            'ingreso_promedio': format_currency(ingreso_total / total_veces),
+        })
+    return filas, None
+
+
+REPORTES = {
+    'tendencia-citas': Reporte('Tendencia de Citas', ('citas',), _tendencia_citas),
+    'reporte-citas-odontologo': Reporte(
+        'Citas por Odontólogo', ('citas', 'odontologos'), _citas_odontologo
+    ),
+    'ocupacion-odontologos': Reporte(
+        'Ocupación de Odontólogos', ('citas', 'odontologos', 'pacientes_atendidos'), _ocupacion_odontologos
+    ),
+    'reporte-ingresos-diarios': Reporte('Ingresos Diarios', ('pagos',), _ingresos_diarios),
+    'reporte-financiero': Reporte('Resumen Financiero', ('facturas',), _financiero),
+    'top-procedimientos': Reporte('Top Procedimientos', ('servicios',), _top_procedimientos),
+    'reporte-servicios-populares': Reporte(
+        'Servicios Más Populares', ('servicios',), _servicios_populares
+    ),
+}
+
+
+# ============================================================================
+# PLANIFICACIÓN Y EJECUCIÓN
+# ============================================================================
+
+def planificar(nombres):
+    """Intermedios necesarios (sin repetir, en orden estable) para ``nombres``."""
+    requeridos = []
+    for nombre in nombres:
+        for intermedio in REPORTES[nombre].intermedios:
+            if intermedio not in requeridos:
+                requeridos.append(intermedio)
+    return requeridos
+
+
+def ejecutar(nombres, desde, hasta):
+    """
+    Calcula los reportes ``nombres`` sobre el rango ``[desde, hasta]``.
+
+    Devuelve ``{'reportes': {nombre: {'titulo', 'datos', 'metricas'}},
+    'consultas': {'solicitadas', 'ejecutadas'}}``; los reportes conservan el
+    orden pedido.
+    """
+    requeridos = planificar(nombres)
+    datos = ejecutar_en_paralelo({
+        intermedio: (lambda funcion=INTERMEDIOS[intermedio]: funcion(desde, hasta))
+        for intermedio in requeridos
+    })
+
+    reportes = {}
+    for nombre in nombres:
+        reporte = REPORTES[nombre]
+        filas, metricas = reporte.construir(datos, desde, hasta)
+        reportes[nombre] = {'titulo': reporte.titulo, 'datos': filas, 'metricas': metricas}
+
+    return {
+        'reportes': reportes,
+        'consultas': {
+            'solicitadas': sum(len(REPORTES[nombre].intermedios) for nombre in nombres),
+            'ejecutadas': len(requeridos),
+        },
+    }
+
+
+# ============================================================================
+# SALIDAS
+# ============================================================================
+
+TITULO_PAQUETE = 'Paquete de Reportes'
+
+
+def _tabla(filas, texto=False):
+    """Lista de dicts -> encabezados + filas (como ``_export_report``)."""
+    if not filas:
+        return []
+    encabezados = list(filas[0].keys())
+    convertir = str if texto else (lambda valor: valor)
+    return [encabezados] + [[convertir(fila.get(clave, '')) for clave in encabezados] for fila in filas]
+
+
+def _a_json(valor):
+    return valor.to_json() if isinstance(valor, MoneyAccumulator) else valor
+
+
+def a_json(paquete):
+    """Paquete con los montos acumulados convertidos a números."""
+    return {
+        'reportes': {
+            nombre: {
+                'titulo': reporte['titulo'],
+                'datos': [
+                    {clave: _a_json(valor) for clave, valor in fila.items()}
+                    for fila in reporte['datos']
+                ],
+                'metricas': {
+                    clave: _a_json(valor) for clave, valor in (reporte['metricas'] or {}).items()
+                },
+            }
+            for nombre, reporte in paquete['reportes'].items()
+        },
+        'consultas': paquete['consultas'],
+    }
+
+
+def a_excel(paquete, tenant_name):
+    """Libro con una hoja por reporte; devuelve el HttpResponse del generador."""
+    excel = exporters.obtener('excel')(TITULO_PAQUETE, tenant_name)
+    for reporte in paquete['reportes'].values():
+        excel.add_sheet(reporte['titulo'])
+        excel.add_header()
+        if reporte['metricas']:
+            excel.add_key_metrics(reporte['metricas'])
+        if reporte['datos']:
+            excel.add_table(_tabla(reporte['datos']), title=reporte['titulo'])
+        else:
+            excel.add_table([])
+    return excel.generate()
+
+
+class _SalidaZip:
+    """Destino no posicionable para ``ZipFile``: guarda lo escrito hasta consumirlo."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def consumir(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def pdfs_en_zip(paquete, tenant_name):
+    """Generador de los bytes de un ZIP con un PDF por reporte, uno a la vez."""
+    from .pdf_renderer import renderizar_pdf
+
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as archivo:
+        for nombre, reporte in paquete['reportes'].items():
+            pdf = exporters.obtener('pdf')(reporte['titulo'], tenant_name)
+            pdf.add_header()
+            if reporte['metricas']:
+                pdf.add_key_metrics(reporte['metricas'])
+            pdf.add_table(_tabla(reporte['datos'], texto=True), title="Datos del Reporte")
+            archivo.writestr(f"{nombre}.pdf", renderizar_pdf(pdf.to_spec()))
+            yield salida.consumir()
+    yield salida.consumir()
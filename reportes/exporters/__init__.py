@@ -0,0 +1,74 @@
+"""
+Registro de exportadores de reportes.
+
+ReportLab y openpyxl tardan en importarse y la mayoría de los requests son
+JSON, así que cada backend se importa recién la primera vez que se pide su
+formato y queda en caché para el resto del proceso:
+
+    generador = exporters.obtener('pdf')(title, tenant_name)
+
+Un backend nuevo solo necesita una clase con la interfaz de los generadores
+(add_header, add_table, add_key_metrics, generate):
+
+    exporters.registrar('csv', 'reportes.exporters.csv', 'CSVReportGenerator')
+
+Para exportar sin límite de filas hay un segundo registro (``filas=True``)
+con backends que además tienen ``add_rows(encabezados, filas, title=None)``:
+``filas`` es un iterador (p. ej. ``Proyeccion.iterar``) y se escribe a medida
+que se consume. CSV y Excel (openpyxl write_only) no acumulan las filas en
+memoria; PDF sí, porque ReportLab necesita el documento completo para
+paginar, y se corta en ``REPORTES_EXPORTACION_MAX_FILAS_PDF``.
+
+    generador = exporters.obtener('excel', filas=True)(title, tenant_name)
+    generador.add_rows(proyeccion.encabezados, proyeccion.iterar(queryset))
+    return generador.generate()
+"""
+import importlib
+import threading
+
+EXPORTADORES = {
+    'pdf': ('reportes.exporters.pdf', 'PDFReportGenerator'),
+    'excel': ('reportes.exporters.excel', 'ExcelReportGenerator'),
+    'csv': ('reportes.exporters.csv', 'CSVReportGenerator'),
+}
+
+EXPORTADORES_FILAS = {
+    'pdf': ('reportes.exporters.pdf', 'PDFReportGenerator'),
+    'excel': ('reportes.exporters.excel', 'ExcelStreamingGenerator'),
+    'csv': ('reportes.exporters.csv', 'CSVReportGenerator'),
+}
+
+_cargados = {}
+_lock = threading.Lock()
+
+
+def _registro(filas):
+    return EXPORTADORES_FILAS if filas else EXPORTADORES
+
+
+def registrar(formato, modulo, clase, filas=False):
+    """Registra (o reemplaza) el backend de ``formato`` sin importarlo."""
+    with _lock:
+        _registro(filas)[formato] = (modulo, clase)
+        _cargados.pop((formato, filas), None)
+
+
+def formatos(filas=False):
+    return list(_registro(filas))
+
+
+def obtener(formato, filas=False):
+    """Clase generadora de ``formato``; importa su backend en el primer uso."""
+    clave = (formato, filas)
+    clase = _cargados.get(clave)
+    if clase is not None:
+        return clase
+    registro = _registro(filas)
+    if formato not in registro:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+
+    with _lock:
+        if clave not in _cargados:
+            modulo, nombre = registro[formato]
+            _cargados[clave] = getattr(importlib.import_module(modulo), nombre)
+        return _cargados[clave]
@@ -0,0 +1,101 @@
+"""
+Exportador CSV.
+
+Las tablas se escriben recién al enviar la respuesta y fila por fila: con
+``add_rows`` y un iterador (p. ej. ``Proyeccion.iterar``) el archivo sale en
+streaming sin tener el reporte completo en memoria.
+
+El archivo lleva solo las tablas (sin encabezado de la clínica ni métricas)
+para que se pueda importar directamente en otras herramientas.
+"""
+import csv
+from datetime import datetime
+from itertools import chain
+
+from django.http import StreamingHttpResponse
+
+from ..utils import MoneyAccumulator
+
+
+class _Eco:
+    """Pseudo-archivo para ``csv.writer``: devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def _celda(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, MoneyAccumulator):
+        return valor.to_decimal()
+    return valor
+
+
+class CSVReportGenerator:
+    """Generador de reportes CSV (UTF-8 con BOM, para que Excel respete las tildes)"""
+
+    def __init__(self, title, tenant_name="Clínica Dental", tema=None):
+        self.title = title
+        self.tenant_name = tenant_name
+        self.tablas = []
+
+    def add_header(self):
+        """Sin encabezado: el CSV contiene solo datos."""
+
+    def add_key_metrics(self, metrics):
+        """Sin métricas: el CSV contiene solo datos."""
+
+    def add_table(self, data, title=None):
+        """
+        Añade una tabla al reporte
+
+        Args:
+            data: Lista de listas (primera fila = encabezados)
+            title: Ignorado; se acepta por compatibilidad con los demás generadores
+        """
+        if data:
+            self.tablas.append(data)
+
+    def add_rows(self, headers, filas, title=None):
+        """
+        Añade una tabla cuyas filas se leen al generar la respuesta
+
+        Args:
+            headers: Lista de encabezados
+            filas: Iterable de listas (se consume una sola vez, en streaming)
+            title: Ignorado; se acepta por compatibilidad con los demás generadores
+        """
+        self.tablas.append(chain([headers], filas))
+
+    def _lineas(self):
+        writer = csv.writer(_Eco())
+        yield '\ufeff'
+        for indice, tabla in enumerate(self.tablas):
+            if indice:
+                yield writer.writerow([])
+            for fila in tabla:
+                yield writer.writerow([_celda(valor) for valor in fila])
+
+    def _bloques(self, tamano=64 * 1024):
+        """Las líneas agrupadas en bloques de ~``tamano`` bytes para el streaming."""
+        bloque, largo = [], 0
+        for linea in self._lineas():
+            bloque.append(linea)
+            largo += len(linea)
+            if largo >= tamano:
+                yield ''.join(bloque).encode('utf-8')
+                bloque, largo = [], 0
+        if bloque:
+            yield ''.join(bloque).encode('utf-8')
+
+    def generate(self):
+        """Genera el CSV y retorna StreamingHttpResponse"""
+        response = StreamingHttpResponse(
+            self._bloques(),
+            content_type='text/csv; charset=utf-8'
+        )
+        filename = f"{self.title.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+        return response
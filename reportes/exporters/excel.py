@@ -0,0 +1,351 @@
+"""
+Exportador Excel (openpyxl).
+
+Se importa recién la primera vez que se pide ``formato=excel`` (ver
+``exporters.obtener``). ``ExcelReportGenerator`` arma el libro en memoria;
+``ExcelStreamingGenerator`` escribe las filas de un iterador en modo
+write_only para exportaciones sin límite de filas.
+"""
+import functools
+import tempfile
+from collections import namedtuple
+from datetime import datetime
+from io import BytesIO
+
+from django.http import FileResponse, HttpResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from ..themes import Tema, obtener_tema
+from ..utils import MoneyAccumulator
+
+
+EstilosExcel = namedtuple('EstilosExcel', [
+    'header_font', 'header_fill', 'title_font', 'subtitle_font', 'normal_font', 'fecha_font',
+    'center_alignment', 'left_alignment', 'right_alignment', 'border', 'fila_alterna_fill',
+])
+
+
+@functools.lru_cache(maxsize=32)
+def estilos_excel(tema):
+    """Fuentes, rellenos y bordes del tema; se crean una vez por proceso y tema."""
+    primario = Tema.excel(tema.color_primario)
+    secundario = Tema.excel(tema.color_secundario)
+    alterna = Tema.excel(tema.color_fila_alterna)
+    fuente = tema.fuente_excel
+    lado = Side(style='thin')
+    return EstilosExcel(
+        header_font=Font(name=fuente, size=14, bold=True, color='FFFFFF'),
+        header_fill=PatternFill(start_color=primario, end_color=primario, fill_type='solid'),
+        title_font=Font(name=fuente, size=16, bold=True, color=primario),
+        subtitle_font=Font(name=fuente, size=12, bold=True, color=secundario),
+        normal_font=Font(name=fuente, size=10),
+        fecha_font=Font(name=fuente, size=9, italic=True),
+        center_alignment=Alignment(horizontal='center', vertical='center'),
+        left_alignment=Alignment(horizontal='left', vertical='center'),
+        right_alignment=Alignment(horizontal='right', vertical='center'),
+        border=Border(left=lado, right=lado, top=lado, bottom=lado),
+        fila_alterna_fill=PatternFill(start_color=alterna, end_color=alterna, fill_type='solid'),
+    )
+
+
+class ExcelReportGenerator:
+    """Generador de reportes Excel con formato profesional"""
+    
+    currency_format = '"$"#,##0.00'
+    
+    def __init__(self, title, tenant_name="Clínica Dental", tema=None):
+        self.workbook = Workbook()
+        self.worksheet = self.workbook.active
+        self.title = title
+        self.tenant_name = tenant_name
+        self.tema = tema or obtener_tema()
+        self.current_row = 1
+        self._setup_styles()
+    
+    def _setup_styles(self):
+        """Toma los estilos compartidos del tema (ver estilos_excel)"""
+        estilos = estilos_excel(self.tema)
+        self.estilos = estilos
+        self.header_font = estilos.header_font
+        self.header_fill = estilos.header_fill
+        self.title_font = estilos.title_font
+        self.subtitle_font = estilos.subtitle_font
+        self.normal_font = estilos.normal_font
+        self.center_alignment = estilos.center_alignment
+        self.left_alignment = estilos.left_alignment
+        self.right_alignment = estilos.right_alignment
+        self.border = estilos.border
+    
+    def add_sheet(self, title):
+        """
+        Continúa en una hoja nueva del libro (la hoja inicial se reutiliza
+        mientras esté vacía).
+        """
+        nombre = ''.join(' ' if c in '[]:*?/\\' else c for c in title)[:31] or 'Hoja'
+        if self.current_row == 1 and self.worksheet is self.workbook.active:
+            self.worksheet.title = nombre
+        else:
+            self.worksheet = self.workbook.create_sheet(nombre)
+        self.current_row = 1
+    
+    def add_header(self):
+        """Añade encabezado al reporte"""
+        # Título de la clínica
+        self.worksheet.merge_cells(f'A{self.current_row}:F{self.current_row}')
+        cell = self.worksheet[f'A{self.current_row}']
+        cell.value = self.tenant_name
+        cell.font = self.title_font
+        cell.alignment = self.center_alignment
+        self.current_row += 1
+        
+        # Título del reporte
+        self.worksheet.merge_cells(f'A{self.current_row}:F{self.current_row}')
+        cell = self.worksheet[f'A{self.current_row}']
+        cell.value = self.title
+        cell.font = self.subtitle_font
+        cell.alignment = self.center_alignment
+        self.current_row += 1
+        
+        # Fecha
+        self.worksheet.merge_cells(f'A{self.current_row}:F{self.current_row}')
+        cell = self.worksheet[f'A{self.current_row}']
+        cell.value = f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+        cell.font = self.estilos.fecha_font
+        cell.alignment = self.center_alignment
+        self.current_row += 2
+    
+    def add_table(self, data, title=None):
+        """
+        Añade una tabla al reporte
+        
+        Args:
+            data: Lista de listas (primera fila = encabezados)
+            title: Título de la tabla (opcional)
+        """
+        if title:
+            self.worksheet.merge_cells(
+                f'A{self.current_row}:{get_column_letter(len(data[0]))}{self.current_row}'
+            )
+            cell = self.worksheet[f'A{self.current_row}']
+            cell.value = title
+            cell.font = self.subtitle_font
+            cell.alignment = self.left_alignment
+            self.current_row += 1
+        
+        if not data or len(data) == 0:
+            cell = self.worksheet[f'A{self.current_row}']
+            cell.value = "No hay datos disponibles"
+            cell.font = self.normal_font
+            self.current_row += 2
+            return
+        
+        # Encabezados
+        for col_idx, header in enumerate(data[0], start=1):
+            cell = self.worksheet.cell(row=self.current_row, column=col_idx)
+            cell.value = header
+            cell.font = self.header_font
+            cell.fill = self.header_fill
+            cell.alignment = self.center_alignment
+            cell.border = self.border
+        
+        self.current_row += 1
+        
+        # Ancho máximo por columna, calculado mientras se escriben las celdas
+        anchos = [len(str(header or '')) for header in data[0]]
+        fila_alterna_fill = self.estilos.fila_alterna_fill
+        
+        # Datos
+        for row_data in data[1:]:
+            alterna = self.current_row % 2 == 0
+            for col_idx, value in enumerate(row_data, start=1):
+                cell = self.worksheet.cell(row=self.current_row, column=col_idx)
+                if isinstance(value, MoneyAccumulator):
+                    cell.value = value.to_decimal()
+                    cell.number_format = self.currency_format
+                else:
+                    cell.value = value
+                cell.font = self.normal_font
+                cell.alignment = self.left_alignment
+                cell.border = self.border
+                
+                # Alternar color de fondo
+                if alterna:
+                    cell.fill = fila_alterna_fill
+                
+                if col_idx <= len(anchos):
+                    largo = len(str(cell.value or ''))
+                    if largo > anchos[col_idx - 1]:
+                        anchos[col_idx - 1] = largo
+            
+            self.current_row += 1
+        
+        # Ajustar ancho de columnas
+        for col_idx, max_length in enumerate(anchos, start=1):
+            self.worksheet.column_dimensions[get_column_letter(col_idx)].width = min(max_length + 2, 50)
+        
+        self.current_row += 1
+    
+    def add_key_metrics(self, metrics):
+        """
+        Añade métricas clave en formato destacado
+        
+        Args:
+            metrics: Diccionario con nombre_metrica: valor
+        """
+        data = [['Métrica', 'Valor']]
+        for key, value in metrics.items():
+            data.append([key, value])
+        
+        self.add_table(data, title="Métricas Principales")
+    
+    def generate(self):
+        """Genera el Excel y retorna HttpResponse"""
+        buffer = BytesIO()
+        self.workbook.save(buffer)
+        buffer.seek(0)
+        
+        response = HttpResponse(
+            buffer.getvalue(),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        filename = f"{self.title.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        
+        return response
+
+
+class ExcelStreamingGenerator:
+    """
+    Generador Excel en modo write_only: cada fila se escribe a un archivo
+    temporal apenas se lee del iterador y la respuesta se envía desde disco,
+    así que la memoria no depende de la cantidad de filas.
+
+    El modo write_only no permite combinar celdas ni volver sobre filas ya
+    escritas: el encabezado va en columna A y los anchos de columna salen de
+    los encabezados de la primera tabla.
+    """
+    
+    currency_format = ExcelReportGenerator.currency_format
+    
+    def __init__(self, title, tenant_name="Clínica Dental", tema=None):
+        self.workbook = Workbook(write_only=True)
+        self.worksheet = self.workbook.create_sheet(
+            ''.join(' ' if c in '[]:*?/\\' else c for c in title)[:31] or 'Hoja'
+        )
+        self.title = title
+        self.tenant_name = tenant_name
+        self.tema = tema or obtener_tema()
+        self.estilos = estilos_excel(self.tema)
+        self._pendientes = []
+        self._con_anchos = False
+    
+    def _celda(self, valor, font=None, fill=None, border=None):
+        cell = WriteOnlyCell(self.worksheet)
+        if isinstance(valor, MoneyAccumulator):
+            cell.value = valor.to_decimal()
+            cell.number_format = self.currency_format
+        else:
+            cell.value = valor
+        cell.font = font or self.estilos.normal_font
+        if fill is not None:
+            cell.fill = fill
+        if border is not None:
+            cell.border = border
+        return cell
+    
+    def _agregar(self, fila):
+        """Las filas anteriores a la primera tabla esperan para poder fijar los anchos."""
+        if self._con_anchos:
+            self.worksheet.append(fila)
+        else:
+            self._pendientes.append(fila)
+    
+    def _fijar_anchos(self, headers):
+        if not self._con_anchos:
+            for col_idx, header in enumerate(headers, start=1):
+                self.worksheet.column_dimensions[get_column_letter(col_idx)].width = (
+                    min(max(len(str(header or '')) + 2, 14), 50)
+                )
+            self._con_anchos = True
+        for fila in self._pendientes:
+            self.worksheet.append(fila)
+        self._pendientes = []
+    
+    def add_header(self):
+        """Añade encabezado al reporte (clínica, título y fecha de generación)"""
+        self._agregar([self._celda(self.tenant_name, font=self.estilos.title_font)])
+        self._agregar([self._celda(self.title, font=self.estilos.subtitle_font)])
+        self._agregar([self._celda(
+            f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}", font=self.estilos.fecha_font
+        )])
+        self._agregar([])
+    
+    def add_key_metrics(self, metrics):
+        """
+        Añade métricas clave en formato destacado
+        
+        Args:
+            metrics: Diccionario con nombre_metrica: valor
+        """
+        estilos = self.estilos
+        self._agregar([self._celda("Métricas Principales", font=estilos.subtitle_font)])
+        self._agregar([
+            self._celda(header, font=estilos.header_font, fill=estilos.header_fill, border=estilos.border)
+            for header in ('Métrica', 'Valor')
+        ])
+        for key, value in metrics.items():
+            self._agregar([self._celda(key, border=estilos.border), self._celda(value, border=estilos.border)])
+        self._agregar([])
+    
+    def add_table(self, data, title=None):
+        """
+        Añade una tabla al reporte
+        
+        Args:
+            data: Lista de listas (primera fila = encabezados)
+            title: Título de la tabla (opcional)
+        """
+        if data:
+            self.add_rows(data[0], data[1:], title=title)
+    
+    def add_rows(self, headers, filas, title=None):
+        """
+        Añade una tabla escribiendo las filas a medida que se leen
+        
+        Args:
+            headers: Lista de encabezados
+            filas: Iterable de listas (se consume una sola vez)
+            title: Título de la tabla (opcional)
+        """
+        self._fijar_anchos(headers)
+        estilos = self.estilos
+        if title:
+            self.worksheet.append([self._celda(title, font=estilos.subtitle_font)])
+        self.worksheet.append([
+            self._celda(header, font=estilos.header_font, fill=estilos.header_fill, border=estilos.border)
+            for header in headers
+        ])
+        for indice, fila in enumerate(filas):
+            relleno = estilos.fila_alterna_fill if indice % 2 else None
+            self.worksheet.append([
+                self._celda(valor, fill=relleno, border=estilos.border) for valor in fila
+            ])
+        self.worksheet.append([])
+    
+    def generate(self):
+        """Guarda el libro en un archivo temporal y retorna FileResponse (se envía por bloques)"""
+        self._fijar_anchos([])
+        archivo = tempfile.TemporaryFile()
+        self.workbook.save(archivo)
+        archivo.seek(0)
+        
+        filename = f"{self.title.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        return FileResponse(
+            archivo,
+            as_attachment=True,
+            filename=filename,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
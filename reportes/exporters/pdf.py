@@ -0,0 +1,107 @@
+"""
+Exportador PDF.
+
+Se importa recién la primera vez que se pide ``formato=pdf`` (ver
+``exporters.obtener``); el renderizado con ReportLab lo hace pdf_renderer.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.http import HttpResponse
+from reportlab.lib.units import inch
+
+from ..pdf_renderer import renderizar_pdf
+from ..themes import obtener_tema
+
+# ReportLab necesita el documento completo para paginar: sin tope un listado
+# grande se leería entero a memoria (CSV y Excel no tienen este límite)
+MAX_FILAS = getattr(settings, 'REPORTES_EXPORTACION_MAX_FILAS_PDF', 20000)
+
+
+class PDFReportGenerator:
+    """
+    Generador de reportes PDF con formato profesional.
+    
+    Arma una especificación serializable del documento; el renderizado con
+    ReportLab lo hace pdf_renderer (pool de procesos o en el proceso).
+    """
+    
+    def __init__(self, title, tenant_name="Clínica Dental", tema=None):
+        self.title = title
+        self.tenant_name = tenant_name
+        self.tema = tema or obtener_tema()
+        self.bloques = []
+    
+    def add_header(self):
+        """Añade encabezado al reporte (clínica, título y fecha de generación)"""
+        self.bloques.append({'tipo': 'header', 'fecha': datetime.now().strftime("%d/%m/%Y %H:%M")})
+    
+    def add_table(self, data, col_widths=None, title=None):
+        """
+        Añade una tabla al reporte
+        
+        Args:
+            data: Lista de listas con los datos (primera fila = encabezados)
+            col_widths: Lista con anchos de columnas (opcional)
+            title: Título de la tabla (opcional)
+        """
+        filas = [
+            [celda if isinstance(celda, (str, int, float)) else str(celda) for celda in fila]
+            for fila in (data or [])
+        ]
+        self.bloques.append({'tipo': 'table', 'data': filas, 'col_widths': col_widths, 'title': title})
+    
+    def add_rows(self, headers, filas, title=None):
+        """
+        Añade una tabla desde un iterable de filas, hasta MAX_FILAS
+        
+        Args:
+            headers: Lista de encabezados
+            filas: Iterable de listas (se deja de leer al llegar al tope)
+            title: Título de la tabla (opcional)
+        """
+        data = [headers]
+        for fila in filas:
+            if len(data) > MAX_FILAS:
+                self.add_table(data, title=title)
+                self.add_paragraph(
+                    f"Se muestran las primeras {MAX_FILAS} filas. "
+                    f"Exporte en Excel o CSV para obtener el listado completo."
+                )
+                return
+            data.append(fila)
+        self.add_table(data, title=title)
+    
+    def add_key_metrics(self, metrics):
+        """
+        Añade métricas clave en formato destacado
+        
+        Args:
+            metrics: Diccionario con nombre_metrica: valor
+        """
+        data = [['Métrica', 'Valor']]
+        for key, value in metrics.items():
+            data.append([key, str(value)])
+        
+        self.add_table(data, col_widths=[4*inch, 2*inch], title="Métricas Principales")
+    
+    def add_paragraph(self, text, style='CustomNormal'):
+        """Añade un párrafo de texto"""
+        self.bloques.append({'tipo': 'paragraph', 'text': text, 'style': style})
+    
+    def to_spec(self):
+        """Especificación serializable del documento (ver pdf_renderer)."""
+        return {
+            'title': self.title,
+            'tenant_name': self.tenant_name,
+            'tema': self.tema.a_dict(),
+            'bloques': self.bloques,
+        }
+    
+    def generate(self):
+        """Genera el PDF y retorna HttpResponse"""
+        response = HttpResponse(renderizar_pdf(self.to_spec()), content_type='application/pdf')
+        filename = f"{self.title.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        
+        return response
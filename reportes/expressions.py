@@ -0,0 +1,41 @@
+"""
+Expresiones de base de datos reutilizables en los reportes.
+"""
+from django.db.models import Case, CharField, DecimalField, ExpressionWrapper, F, Value, When
+
+
+def saldo_factura():
+    """
+    Saldo pendiente de una factura calculado en la base de datos.
+
+    Equivale a la propiedad ``Factura.saldo_pendiente`` pero puede usarse en
+    ``annotate()``/``aggregate()`` sin cargar cada factura en Python:
+        Factura.objects.annotate(saldo=saldo_factura()).filter(saldo__gt=0)
+        Factura.objects.aggregate(total=Sum(saldo_factura()))
+    """
+    return ExpressionWrapper(
+        F('monto_total') - F('monto_pagado'),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+def valor_inventario():
+    """
+    Valor de un insumo en inventario (``stock_actual * precio_costo``).
+
+        Insumo.objects.annotate(valor_total=valor_inventario()).order_by('-valor_total')
+    """
+    return ExpressionWrapper(
+        F('stock_actual') * F('precio_costo'),
+        output_field=DecimalField(max_digits=18, decimal_places=2)
+    )
+
+
+def estado_stock():
+    """Clasificación AGOTADO/BAJO/NORMAL de un insumo según su stock mínimo."""
+    return Case(
+        When(stock_actual=0, then=Value('AGOTADO')),
+        When(stock_actual__lte=F('stock_minimo'), then=Value('BAJO')),
+        default=Value('NORMAL'),
+        output_field=CharField()
+    )
@@ -0,0 +1,98 @@
+"""
+Índices adaptados a los patrones de consulta de ``reportes``.
+
+Los modelos consultados viven en otras apps (agenda, facturacion, tratamientos),
+por lo que sus índices de reportes se declaran aquí y se aplican por tenant con:
+    python manage.py crear_indices_reportes [--schema clinica_demo] [--concurrently]
+    python manage.py crear_indices_reportes --revertir   # los elimina
+
+No son una migración: una AddIndex en ``reportes`` sobre modelos de otra app
+no es válida, y agregarla en esas apps mezclaría índices de reportes en su
+historial. Además ``CREATE INDEX CONCURRENTLY`` no puede correr dentro de la
+transacción de una migración. El comando es idempotente, se puede repetir en
+cada despliegue y ``--revertir`` cumple el papel del ``reverse_sql``.
+
+Los índices de los modelos propios (``BitacoraAccion.Meta`` y los demás de
+``reportes/models.py``) sí van por migraciones de la app.
+"""
+from django.apps import apps
+from django.db import connection, models
+
+
+INDICES_REPORTES = [
+    # ocupacion-odontologos / reporte-citas-odontologo: odontólogo + mes + estado
+    ('agenda.Cita', models.Index(
+        fields=['odontologo', 'fecha_hora', 'estado'],
+        name='rep_cita_odo_fecha_est_idx',
+    )),
+    # Ingresos: pagos completados por fecha, cubriendo el monto (index-only scan)
+    ('facturacion.Pago', models.Index(
+        fields=['estado_pago', 'fecha_pago'],
+        include=['monto_pagado'],
+        name='rep_pago_estado_fecha_idx',
+    )),
+    # Saldos y facturas vencidas: solo facturas pendientes
+    ('facturacion.Factura', models.Index(
+        fields=['fecha_emision'],
+        condition=models.Q(estado='PENDIENTE'),
+        name='rep_factura_pend_fecha_idx',
+    )),
+    # top-procedimientos / servicios-populares: ítems por servicio y estado
+    ('tratamientos.ItemPlanTratamiento', models.Index(
+        fields=['servicio', 'estado'],
+        name='rep_item_serv_estado_idx',
+    )),
+]
+
+
+def aplicar_indices(concurrently=False):
+    """
+    Crea en el esquema actual los índices que aún no existen.
+
+    Devuelve la lista de nombres de índices creados.
+    """
+    creados = []
+    usar_concurrently = concurrently and connection.vendor == 'postgresql'
+    
+    for label, index in INDICES_REPORTES:
+        model = apps.get_model(label)
+        with connection.cursor() as cursor:
+            existentes = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        if index.name in existentes:
+            continue
+        
+        # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+        with connection.schema_editor(atomic=not usar_concurrently) as editor:
+            if usar_concurrently:
+                editor.add_index(model, index, concurrently=True)
+            else:
+                editor.add_index(model, index)
+        creados.append(index.name)
+    
+    return creados
+
+
+def quitar_indices(concurrently=False):
+    """
+    Elimina del esquema actual los índices de INDICES_REPORTES que existan.
+
+    Devuelve la lista de nombres de índices eliminados.
+    """
+    eliminados = []
+    usar_concurrently = concurrently and connection.vendor == 'postgresql'
+    
+    for label, index in INDICES_REPORTES:
+        model = apps.get_model(label)
+        with connection.cursor() as cursor:
+            existentes = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        if index.name not in existentes:
+            continue
+        
+        with connection.schema_editor(atomic=not usar_concurrently) as editor:
+            if usar_concurrently:
+                editor.remove_index(model, index, concurrently=True)
+            else:
+                editor.remove_index(model, index)
+        eliminados.append(index.name)
+    
+    return eliminados
@@ -0,0 +1,178 @@
+"""
+Verificación de la cadena de hashes de la bitácora.
+
+Cada ``BitacoraAccion`` guarda ``hash_anterior`` y
+``hash_registro = sha256(hash_anterior + contenido canónico)``. La verificación
+divide el rango de ids en tramos que se revisan en paralelo (cada uno valida
+sus hashes y su encadenamiento interno) y luego une los bordes de los tramos
+en orden. El avance contiguo se guarda en ``PuntoControlBitacora`` para que la
+siguiente ejecución continúe desde ahí.
+
+Solo se ignoran los registros sin hash anteriores al primer registro
+encadenado (los previos a la cadena); uno sin hash posterior se reporta.
+La cadena se ancla en un valor conocido, nunca en el primer registro visible:
+el punto de control, el último registro archivado (``indice.json``) o el
+génesis. Así borrar los registros más antiguos rompe el encadenamiento.
+El último punto de control es además la cabeza conocida de la cadena: si ese
+registro desaparece o cambia, borrar los registros más recientes también se
+detecta.
+"""
+import logging
+
+from django.db.models import Max, Min
+
+from . import archive
+from .models import CAMPOS_HASH, HASH_GENESIS, BitacoraAccion, PuntoControlBitacora, calcular_hash
+from .query_batch import ejecutar_en_paralelo
+
+logger = logging.getLogger(__name__)
+
+# Máximo de errores detallados por tramo
+MAX_ERRORES = 20
+
+
+def _verificar_tramo(desde_id, hasta_id):
+    """
+    Verifica los registros con ``desde_id <= id < hasta_id``.
+
+    Devuelve ``{'primero', 'ultimo', 'anterior', 'final', 'filas', 'errores'}``,
+    donde ``anterior`` es el hash_anterior del primer registro y ``final`` el
+    hash_registro del último, para unir el tramo con sus vecinos.
+    """
+    filas = (
+        BitacoraAccion.objects
+        .filter(id__gte=desde_id, id__lt=hasta_id)
+        .order_by('id')
+        .values('id', 'hash_anterior', 'hash_registro', *CAMPOS_HASH)
+    )
+
+    resultado = {'primero': None, 'ultimo': None, 'anterior': None, 'final': None, 'filas': 0, 'errores': []}
+    esperado = None
+    for fila in filas.iterator(chunk_size=5000):
+        resultado['filas'] += 1
+        if not fila['hash_registro']:
+            # Insertado por fuera de BitacoraAccion.save: no forma parte de la cadena
+            _agregar_error(resultado, fila['id'], 'registro sin hash')
+            continue
+
+        if resultado['primero'] is None:
+            resultado['primero'] = fila['id']
+            resultado['anterior'] = fila['hash_anterior']
+        elif fila['hash_anterior'] != esperado:
+            _agregar_error(resultado, fila['id'], 'encadenamiento roto')
+
+        if calcular_hash(fila['hash_anterior'], fila) != fila['hash_registro']:
+            _agregar_error(resultado, fila['id'], 'contenido modificado')
+
+        esperado = fila['hash_registro']
+        resultado['ultimo'] = fila['id']
+
+    resultado['final'] = esperado
+    return resultado
+
+
+def _agregar_error(resultado, registro_id, motivo):
+    if len(resultado['errores']) < MAX_ERRORES:
+        resultado['errores'].append({'id': registro_id, 'motivo': motivo})
+
+
+def _ancla(punto, archivado):
+    """``(id, hash)`` tras el cual continúa la cadena: punto de control, último archivado o génesis."""
+    anclas = [(0, HASH_GENESIS)]
+    if punto:
+        anclas.append((punto.hasta_id, punto.hash_registro))
+    if archivado:
+        anclas.append(archivado)
+    return max(anclas)
+
+
+def _verificar_cabeza(punto, archivado):
+    """El último registro verificado debe seguir en la tabla (o en el archivo) sin cambios."""
+    if punto is None or (archivado and archivado[0] >= punto.hasta_id):
+        return []
+    hash_actual = (
+        BitacoraAccion.objects.filter(id=punto.hasta_id)
+        .values_list('hash_registro', flat=True)
+        .first()
+    )
+    if hash_actual is None:
+        return [{'id': punto.hasta_id, 'motivo': 'registro eliminado'}]
+    if hash_actual != punto.hash_registro:
+        return [{'id': punto.hasta_id, 'motivo': 'contenido modificado'}]
+    return []
+
+
+def verificar(tamano_tramo=100000, desde_cero=False, max_workers=None):
+    """
+    Verifica la cadena del tenant actual y guarda un punto de control.
+
+    Devuelve ``{'filas', 'tramos', 'desde_id', 'hasta_id', 'ancla', 'errores'}``.
+    """
+    cabeza = PuntoControlBitacora.objects.first()
+    punto = None if desde_cero else cabeza
+    archivado = archive.ultimo_archivado()
+    ancla_id, ancla = _ancla(punto, archivado)
+    errores = _verificar_cabeza(cabeza, archivado)
+
+    # Los registros sin hash anteriores al primero encadenado son previos a la cadena
+    primer_encadenado = (
+        BitacoraAccion.objects.exclude(hash_registro='').aggregate(minimo=Min('id'))['minimo']
+    )
+    limites = (
+        BitacoraAccion.objects
+        .filter(id__gt=ancla_id, id__gte=primer_encadenado or 0)
+        .aggregate(minimo=Min('id'), maximo=Max('id'))
+    )
+    if primer_encadenado is None or limites['minimo'] is None:
+        return {'filas': 0, 'tramos': 0, 'desde_id': None, 'hasta_id': punto.hasta_id if punto else None,
+                'ancla': ancla, 'errores': errores}
+
+    inicio, fin = limites['minimo'], limites['maximo'] + 1
+    tramos = [(a, min(a + tamano_tramo, fin)) for a in range(inicio, fin, tamano_tramo)]
+    resultados = ejecutar_en_paralelo(
+        {tramo: (lambda t=tramo: _verificar_tramo(*t)) for tramo in tramos},
+        max_workers
+    )
+
+    # Unir los tramos en orden de id, empezando por el ancla
+    esperado = ancla
+    if archivado and ancla_id == archivado[0]:
+        logger.info(f"⚓ Bitácora: cadena anclada en el registro archivado #{ancla_id}")
+    filas = 0
+    ultimo_valido = (punto.hasta_id, punto.hash_registro) if punto else None
+    filas_validas = 0
+    contiguo = not errores
+
+    for tramo in tramos:
+        resultado = resultados[tramo]
+        if resultado['primero'] is not None:
+            if resultado['anterior'] != esperado:
+                errores.append({'id': resultado['primero'], 'motivo': 'encadenamiento roto'})
+            esperado = resultado['final']
+
+        errores.extend(resultado['errores'])
+        filas += resultado['filas']
+
+        if contiguo and not errores:
+            if resultado['primero'] is not None:
+                ultimo_valido = (resultado['ultimo'], resultado['final'])
+            filas_validas += resultado['filas']
+        else:
+            contiguo = False
+
+    if ultimo_valido and (not punto or ultimo_valido[0] > punto.hasta_id):
+        PuntoControlBitacora.objects.create(
+            hasta_id=ultimo_valido[0],
+            hash_registro=ultimo_valido[1],
+            filas_verificadas=(punto.filas_verificadas if punto else 0) + filas_validas,
+        )
+
+    logger.info(f"🔐 Bitácora: {filas} registros verificados en {len(tramos)} tramos, {len(errores)} errores")
+    return {
+        'filas': filas,
+        'tramos': len(tramos),
+        'desde_id': inicio,
+        'hasta_id': fin - 1,
+        'ancla': ancla,
+        'errores': sorted(errores, key=lambda error: error['id']),
+    }
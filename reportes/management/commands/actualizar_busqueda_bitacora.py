@@ -0,0 +1,38 @@
+"""
+Completa el vector de búsqueda de los registros de bitácora existentes.
+
+Uso:
+    python manage.py actualizar_busqueda_bitacora
+    python manage.py actualizar_busqueda_bitacora --schema clinica_demo --lote 5000
+"""
+from django.contrib.postgres.search import SearchVector
+from django.core.management.base import BaseCommand
+
+from reportes.models import BitacoraAccion, BITACORA_BUSQUEDA_CONFIG
+from reportes.tenants import iterar_tenants
+
+
+class Command(BaseCommand):
+    help = 'Calcula el tsvector de búsqueda para registros de bitácora sin indexar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Procesar solo el tenant con este schema_name')
+        parser.add_argument('--lote', type=int, default=5000, help='Registros por actualización')
+
+    def handle(self, *args, **options):
+        vector = SearchVector('descripcion', config=BITACORA_BUSQUEDA_CONFIG)
+        
+        for tenant in iterar_tenants(options.get('schema')):
+            total = 0
+            while True:
+                ids = list(
+                    BitacoraAccion.objects.filter(busqueda__isnull=True)
+                    .values_list('id', flat=True)[:options['lote']]
+                )
+                if not ids:
+                    break
+                total += BitacoraAccion.objects.filter(id__in=ids).update(busqueda=vector)
+            
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {tenant.schema_name}: {total} registros indexados"
+            ))
@@ -0,0 +1,38 @@
+"""
+Mueve los registros antiguos de la bitácora a archivos comprimidos por mes.
+
+Uso:
+    python manage.py archivar_bitacora                  # usa REPORTES_BITACORA_DIAS_ACTIVOS
+    python manage.py archivar_bitacora --dias 180 --schema clinica_demo
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reportes import archive
+from reportes.tenants import iterar_tenants
+
+
+class Command(BaseCommand):
+    help = 'Archiva registros de bitácora más antiguos que la ventana activa (Parquet o NDJSON.gz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=archive.DIAS_ACTIVOS,
+            help='Antigüedad en días a partir de la cual se archiva'
+        )
+        parser.add_argument('--schema', help='Procesar solo el tenant con este schema_name')
+        parser.add_argument('--lote', type=int, default=5000, help='Registros por archivo/lote')
+
+    def handle(self, *args, **options):
+        antes_de = timezone.now() - timedelta(days=options['dias'])
+        formato = 'Parquet' if archive.parquet_disponible() else 'NDJSON.gz'
+        
+        for tenant in iterar_tenants(options.get('schema')):
+            total = archive.archivar(antes_de, lote=options['lote'])
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {tenant.schema_name}: {total} registros archivados ({formato})"
+            ))
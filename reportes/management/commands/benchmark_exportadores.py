@@ -0,0 +1,106 @@
+"""
+Micro-benchmark de los generadores de exportación (PDF y Excel).
+
+Mide, con y sin los estilos en caché del tema:
+- construcción del generador
+- costo por fila de ``add_table``
+- exportación pequeña completa (encabezado + tabla -> bytes)
+
+Uso:
+    python manage.py benchmark_exportadores
+    python manage.py benchmark_exportadores --filas 50 --repeticiones 200
+"""
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+
+from reportes import pdf_renderer
+from reportes.exporters.excel import ExcelReportGenerator, estilos_excel
+from reportes.exporters.pdf import PDFReportGenerator
+
+
+def _limpiar_caches():
+    pdf_renderer._estilos.cache_clear()
+    pdf_renderer._estilo_tabla.cache_clear()
+    estilos_excel.cache_clear()
+
+
+def _medir(funcion, repeticiones, sin_cache=False):
+    """Promedio en milisegundos de ``funcion()``."""
+    total = 0.0
+    for _ in range(repeticiones):
+        if sin_cache:
+            _limpiar_caches()
+        inicio = time.perf_counter()
+        funcion()
+        total += time.perf_counter() - inicio
+    return total * 1000 / repeticiones
+
+
+def _datos(filas):
+    data = [['Código', 'Nombre', 'Categoría', 'Stock', 'Valor']]
+    for i in range(filas):
+        data.append([f'INS-{i:05d}', f'Insumo {i}', 'Descartables', i % 40, f'${i * 12.5:,.2f}'])
+    return data
+
+
+class Command(BaseCommand):
+    help = 'Mide la construcción y el costo por fila de los generadores PDF y Excel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=20, help='Filas de la exportación pequeña')
+        parser.add_argument('--repeticiones', type=int, default=100, help='Repeticiones por medición')
+
+    def handle(self, *args, **options):
+        filas = options['filas']
+        repeticiones = options['repeticiones']
+        data = _datos(filas)
+        data_grande = _datos(filas * 50)
+
+        def pdf_pequeno():
+            pdf = PDFReportGenerator('Benchmark')
+            pdf.add_header()
+            pdf.add_table(data, title='Inventario')
+            return pdf_renderer.construir_pdf(pdf.to_spec())
+
+        def excel_construir():
+            return ExcelReportGenerator('Benchmark')
+
+        def excel_tabla(tabla):
+            def funcion():
+                excel = ExcelReportGenerator('Benchmark')
+                excel.add_table(tabla)
+            return funcion
+
+        def excel_pequeno():
+            excel = ExcelReportGenerator('Benchmark')
+            excel.add_header()
+            excel.add_table(data, title='Inventario')
+            buffer = BytesIO()
+            excel.workbook.save(buffer)
+            return buffer.getvalue()
+
+        # Precalienta imports, fuentes y cachés antes de medir
+        pdf_pequeno()
+        excel_pequeno()
+
+        mediciones = [
+            ('PDF: exportación pequeña (sin caché)', _medir(pdf_pequeno, repeticiones, sin_cache=True)),
+            ('PDF: exportación pequeña', _medir(pdf_pequeno, repeticiones)),
+            ('Excel: construcción (sin caché)', _medir(excel_construir, repeticiones, sin_cache=True)),
+            ('Excel: construcción', _medir(excel_construir, repeticiones)),
+            ('Excel: exportación pequeña', _medir(excel_pequeno, repeticiones)),
+        ]
+
+        self.stdout.write(f"📊 {filas} filas, {repeticiones} repeticiones\n")
+        for nombre, ms in mediciones:
+            self.stdout.write(f"   {nombre:<40} {ms:8.3f} ms")
+
+        # Costo por fila: diferencia entre una tabla grande y una pequeña
+        pequena = _medir(excel_tabla(data), max(repeticiones // 10, 1))
+        grande = _medir(excel_tabla(data_grande), max(repeticiones // 10, 1))
+        por_fila = (grande - pequena) * 1000 / max(len(data_grande) - len(data), 1)
+        self.stdout.write(f"   {'Excel: costo por fila':<40} {por_fila:8.3f} µs")
+
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark completado"))
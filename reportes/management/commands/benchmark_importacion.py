@@ -0,0 +1,105 @@
+"""
+Benchmark del tiempo de importación de la app de reportes.
+
+Cada medición corre en un intérprete nuevo (como un worker recién levantado):
+mide ``django.setup()`` y luego la importación de cada módulo, e informa qué
+dependencias pesadas quedaron cargadas. Los backends de exportación
+(ReportLab, openpyxl) no deberían aparecer: se importan al primer
+``formato=pdf``/``excel`` (ver reportes/exporters).
+
+Uso:
+    python manage.py benchmark_importacion
+    python manage.py benchmark_importacion --repeticiones 10 --modulos reportes.views
+    python manage.py benchmark_importacion --detalle    # top de python -X importtime
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand
+
+MODULOS = ['reportes.urls', 'reportes.views', 'reportes.voice_views']
+PESADOS = ['reportlab', 'openpyxl', 'numpy', 'pyarrow']
+
+SCRIPT = """
+import importlib, json, sys, time
+inicio = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter() - inicio
+inicio = time.perf_counter()
+importlib.import_module(sys.argv[1])
+modulo = time.perf_counter() - inicio
+print(json.dumps({
+    'setup': setup,
+    'modulo': modulo,
+    'pesados': [nombre for nombre in json.loads(sys.argv[2]) if nombre in sys.modules],
+}))
+"""
+
+
+def _medir(modulo, importtime=False):
+    argumentos = [sys.executable]
+    if importtime:
+        argumentos += ['-X', 'importtime']
+    proceso = subprocess.run(
+        argumentos + ['-c', SCRIPT, modulo, json.dumps(PESADOS)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(proceso.stdout.strip().splitlines()[-1]), proceso.stderr
+
+
+def _top_importtime(salida, limite):
+    """Módulos con mayor tiempo acumulado en la salida de ``-X importtime``."""
+    # Formato: "import time:  <propio us> | <acumulado us> | <módulo>"
+    filas = []
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        _, acumulado, nombre = linea[len('import time:'):].split('|')
+        filas.append((int(acumulado), nombre.strip()))
+    return sorted(filas, reverse=True)[:limite]
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de importación de los módulos de reportes en intérpretes nuevos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modulos', nargs='+', default=MODULOS, help='Módulos a importar')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Intérpretes por módulo (se usa la mediana)')
+        parser.add_argument('--detalle', action='store_true', help='Mostrar los imports más lentos (-X importtime)')
+        parser.add_argument('--top', type=int, default=15, help='Cantidad de imports a mostrar con --detalle')
+
+    def handle(self, *args, **options):
+        repeticiones = max(options['repeticiones'], 1)
+        self.stdout.write(f"⏱️  Importación en intérpretes nuevos ({repeticiones} repeticiones, mediana)\n")
+
+        for modulo in options['modulos']:
+            try:
+                mediciones = [_medir(modulo)[0] for _ in range(repeticiones)]
+            except subprocess.CalledProcessError as e:
+                self.stdout.write(self.style.ERROR(f"❌ {modulo}: {e.stderr.strip().splitlines()[-1]}"))
+                continue
+
+            setup = statistics.median(medicion['setup'] for medicion in mediciones) * 1000
+            importacion = statistics.median(medicion['modulo'] for medicion in mediciones) * 1000
+            pesados = mediciones[-1]['pesados']
+            self.stdout.write(
+                f"   {modulo:<28} django.setup() {setup:8.1f} ms   import {importacion:8.1f} ms"
+            )
+            exportadores = [nombre for nombre in pesados if nombre in ('reportlab', 'openpyxl')]
+            if exportadores:
+                self.stdout.write(self.style.WARNING(
+                    f"      ⚠️ backends de exportación cargados al importar: {', '.join(exportadores)}"
+                ))
+            otros = [nombre for nombre in pesados if nombre not in exportadores]
+            if otros:
+                self.stdout.write(f"      dependencias pesadas cargadas: {', '.join(otros)}")
+
+            if options['detalle']:
+                _, salida = _medir(modulo, importtime=True)
+                for acumulado, nombre in _top_importtime(salida, options['top']):
+                    self.stdout.write(f"      {acumulado / 1000:8.1f} ms  {nombre}")
+
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark completado"))
@@ -0,0 +1,85 @@
+"""
+Benchmark de velocidad y exactitud de los intérpretes de comandos de voz.
+
+Corre el corpus (reportes/nlp/corpus.py) con el intérprete compilado
+(nlp.matcher) y con ``voice_parser.parse_voice_command``. El parser original
+usa la fecha real, así que en él las fechas de las entradas relativas no se
+comparan.
+
+Uso:
+    python manage.py benchmark_voz
+    python manage.py benchmark_voz --repeticiones 1000 --errores
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from reportes.nlp import matcher
+from reportes.nlp.corpus import CORPUS, FECHA_REFERENCIA, diferencias
+
+
+def _parser_original():
+    try:
+        from reportes.nlp.voice_parser import parse_voice_command
+    except ImportError:
+        return None
+    return parse_voice_command
+
+
+def _evaluar(interpretar, repeticiones, fecha_real):
+    """(aciertos, fallos, µs por comando) de ``interpretar`` sobre el corpus."""
+    fallos = []
+    for entrada in CORPUS:
+        try:
+            interpretacion = interpretar(entrada['texto'])
+        except Exception:
+            interpretacion = {}
+        distintos = diferencias(entrada, interpretacion, fechas=not (fecha_real and entrada['relativa']))
+        if distintos:
+            fallos.append((entrada, interpretacion, distintos))
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for entrada in CORPUS:
+            interpretar(entrada['texto'])
+    microsegundos = (time.perf_counter() - inicio) * 1_000_000 / (repeticiones * len(CORPUS))
+    return len(CORPUS) - len(fallos), fallos, microsegundos
+
+
+class Command(BaseCommand):
+    help = 'Mide velocidad y exactitud de los intérpretes de voz sobre el corpus de comandos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=200, help='Pasadas del corpus para medir tiempos')
+        parser.add_argument('--errores', action='store_true', help='Mostrar los comandos mal interpretados')
+
+    def handle(self, *args, **options):
+        repeticiones = max(options['repeticiones'], 1)
+        interpretes = [
+            ('compilado', lambda texto: matcher.interpretar(texto, hoy=FECHA_REFERENCIA), False),
+        ]
+        original = _parser_original()
+        if original is not None:
+            interpretes.append(('voice_parser', original, True))
+        else:
+            self.stdout.write(self.style.WARNING("⚠️ reportes.nlp.voice_parser no disponible, se omite"))
+
+        self.stdout.write(
+            f"🎙️ {len(CORPUS)} comandos, {repeticiones} repeticiones, "
+            f"vocabulario compilado de {len(matcher.VOCABULARIO)} frases\n"
+        )
+        for nombre, interpretar, fecha_real in interpretes:
+            aciertos, fallos, microsegundos = _evaluar(interpretar, repeticiones, fecha_real)
+            self.stdout.write(
+                f"   {nombre:<14} exactitud {aciertos}/{len(CORPUS)} "
+                f"({aciertos / len(CORPUS) * 100:5.1f}%)   {microsegundos:8.1f} µs/comando"
+            )
+            if options['errores']:
+                for entrada, interpretacion, distintos in fallos:
+                    self.stdout.write(f"      ❌ \"{entrada['texto']}\"")
+                    for campo in distintos:
+                        self.stdout.write(
+                            f"         {campo}: esperado {entrada[campo]!r}, obtenido {interpretacion.get(campo)!r}"
+                        )
+
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark completado"))
@@ -0,0 +1,41 @@
+"""
+Completa las columnas snapshot (usuario y modelo) de registros de bitácora antiguos.
+
+Uso:
+    python manage.py completar_snapshots_bitacora
+    python manage.py completar_snapshots_bitacora --schema clinica_demo --lote 2000
+"""
+from django.core.management.base import BaseCommand
+
+from reportes.models import BitacoraAccion
+from reportes.tenants import iterar_tenants
+
+CAMPOS_SNAPSHOT = ['usuario_nombre', 'usuario_email', 'usuario_tipo', 'modelo']
+
+
+class Command(BaseCommand):
+    help = 'Completa usuario_nombre/email/tipo y modelo en registros de bitácora sin snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Procesar solo el tenant con este schema_name')
+        parser.add_argument('--lote', type=int, default=2000, help='Registros por lote')
+
+    def handle(self, *args, **options):
+        for tenant in iterar_tenants(options.get('schema')):
+            total = 0
+            while True:
+                registros = list(
+                    BitacoraAccion.objects.filter(usuario_nombre='')
+                    .select_related('usuario', 'content_type')
+                    .only('id', 'usuario', 'content_type', *CAMPOS_SNAPSHOT)[:options['lote']]
+                )
+                if not registros:
+                    break
+                for registro in registros:
+                    registro.tomar_snapshot()
+                BitacoraAccion.objects.bulk_update(registros, CAMPOS_SNAPSHOT)
+                total += len(registros)
+            
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {tenant.schema_name}: {total} registros completados"
+            ))
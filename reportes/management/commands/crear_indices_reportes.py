@@ -0,0 +1,53 @@
+"""
+Crea los índices de reportes (reportes/indexes.py) en cada tenant.
+
+Uso:
+    python manage.py crear_indices_reportes
+    python manage.py crear_indices_reportes --schema clinica_demo --concurrently
+    python manage.py crear_indices_reportes --revertir
+"""
+from django.core.management.base import BaseCommand
+
+from reportes.indexes import aplicar_indices, quitar_indices
+from reportes.tenants import iterar_tenants
+
+
+class Command(BaseCommand):
+    help = 'Crea los índices de consultas de reportes en los esquemas de los tenants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schema',
+            help='Procesar solo el tenant con este schema_name'
+        )
+        parser.add_argument(
+            '--concurrently',
+            action='store_true',
+            help='Usar CREATE/DROP INDEX CONCURRENTLY (PostgreSQL, sin bloquear escrituras)'
+        )
+        parser.add_argument(
+            '--revertir',
+            action='store_true',
+            help='Eliminar los índices en lugar de crearlos'
+        )
+
+    def handle(self, *args, **options):
+        revertir = options['revertir']
+        for tenant in iterar_tenants(options.get('schema')):
+            if revertir:
+                eliminados = quitar_indices(concurrently=options['concurrently'])
+                if eliminados:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"🗑️ {tenant.schema_name}: {', '.join(eliminados)}"
+                    ))
+                else:
+                    self.stdout.write(f"{tenant.schema_name}: sin índices que eliminar")
+                continue
+            
+            creados = aplicar_indices(concurrently=options['concurrently'])
+            if creados:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ {tenant.schema_name}: {', '.join(creados)}"
+                ))
+            else:
+                self.stdout.write(f"{tenant.schema_name}: índices ya existentes")
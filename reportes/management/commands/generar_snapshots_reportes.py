@@ -0,0 +1,63 @@
+"""
+Genera los snapshots nocturnos de reportes (JSON/PDF/Excel) de cada tenant.
+
+Uso:
+    python manage.py generar_snapshots_reportes                     # una pasada (cron)
+    python manage.py generar_snapshots_reportes --loop              # todos los días a REPORTES_SNAPSHOTS_HORA
+    python manage.py generar_snapshots_reportes --schema clinica_demo --reporte dashboard-kpis
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reportes import snapshots
+from reportes.tenants import iterar_tenants
+
+
+class Command(BaseCommand):
+    help = 'Pre-genera los reportes configurados en REPORTES_SNAPSHOTS para cada tenant'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Procesar solo el tenant con este schema_name')
+        parser.add_argument('--reporte', help='Generar solo este reporte (url_path)')
+        parser.add_argument(
+            '--formatos',
+            help='Formatos separados por coma (default: REPORTES_SNAPSHOTS_FORMATOS)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Quedarse en ejecución y generar cada día a la hora REPORTES_SNAPSHOTS_HORA'
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self._generar(options)
+            return
+        
+        while True:
+            espera = self._segundos_hasta_proxima_ejecucion()
+            self.stdout.write(f"⏳ Próxima generación de snapshots en {espera / 3600:.1f} horas")
+            time.sleep(espera)
+            self._generar(options)
+
+    def _generar(self, options):
+        configuracion = snapshots.SNAPSHOTS
+        if options.get('reporte'):
+            configuracion = [e for e in configuracion if e['reporte'] == options['reporte']]
+        formatos = options['formatos'].split(',') if options.get('formatos') else None
+        
+        for tenant in iterar_tenants(options.get('schema')):
+            creados = snapshots.generar(tenant, configuracion, formatos)
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {tenant.schema_name}: {creados} snapshots generados"
+            ))
+
+    def _segundos_hasta_proxima_ejecucion(self):
+        ahora = timezone.localtime()
+        proxima = timezone.make_aware(datetime.combine(ahora.date(), datetime.min.time())) + timedelta(hours=snapshots.HORA)
+        if proxima <= ahora:
+            proxima += timedelta(days=1)
+        return (proxima - ahora).total_seconds()
@@ -0,0 +1,25 @@
+"""
+Reconstruye los contadores diarios de la bitácora (BitacoraContador).
+
+Uso:
+    python manage.py reconstruir_contadores_bitacora
+    python manage.py reconstruir_contadores_bitacora --schema clinica_demo
+"""
+from django.core.management.base import BaseCommand
+
+from reportes.models import BitacoraContador
+from reportes.tenants import iterar_tenants
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores por día/acción/usuario desde la tabla de bitácora'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Procesar solo el tenant con este schema_name')
+
+    def handle(self, *args, **options):
+        for tenant in iterar_tenants(options.get('schema')):
+            total = BitacoraContador.reconstruir()
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {tenant.schema_name}: {total} contadores reconstruidos"
+            ))
@@ -0,0 +1,28 @@
+"""
+Reconstruye la tabla materializada ResumenPaciente.
+
+Uso:
+    python manage.py reconstruir_resumen_pacientes
+    python manage.py reconstruir_resumen_pacientes --schema clinica_demo
+"""
+from django.core.management.base import BaseCommand
+
+from reportes.models import ResumenPaciente
+from reportes.tenants import iterar_tenants
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen materializado de pacientes (citas, facturación, saldo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schema',
+            help='Procesar solo el tenant con este schema_name'
+        )
+
+    def handle(self, *args, **options):
+        for tenant in iterar_tenants(options.get('schema')):
+            total = ResumenPaciente.reconstruir()
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {tenant.schema_name}: {total} resúmenes de pacientes reconstruidos"
+            ))
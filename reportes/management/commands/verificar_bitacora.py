@@ -0,0 +1,53 @@
+"""
+Verifica la cadena de hashes de la bitácora (evidencia de manipulación).
+
+Uso:
+    python manage.py verificar_bitacora                      # continúa desde el último punto de control
+    python manage.py verificar_bitacora --desde-cero --schema clinica_demo
+    python manage.py verificar_bitacora --tramo 500000 --workers 8
+"""
+from django.core.management.base import BaseCommand
+
+from reportes import integridad
+from reportes.tenants import iterar_tenants
+
+
+class Command(BaseCommand):
+    help = 'Verifica en tramos paralelos la cadena de hashes de la bitácora'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Procesar solo el tenant con este schema_name')
+        parser.add_argument('--tramo', type=int, default=100000, help='Rango de ids por tramo')
+        parser.add_argument('--workers', type=int, help='Hilos de verificación (REPORTES_QUERY_WORKERS por defecto)')
+        parser.add_argument(
+            '--desde-cero',
+            action='store_true',
+            help='Ignorar los puntos de control y verificar toda la tabla'
+        )
+
+    def handle(self, *args, **options):
+        con_errores = False
+        
+        for tenant in iterar_tenants(options.get('schema')):
+            resultado = integridad.verificar(
+                tamano_tramo=options['tramo'],
+                desde_cero=options['desde_cero'],
+                max_workers=options.get('workers'),
+            )
+            
+            if resultado['errores']:
+                con_errores = True
+                self.stdout.write(self.style.ERROR(
+                    f"❌ {tenant.schema_name}: {len(resultado['errores'])} errores en "
+                    f"{resultado['filas']} registros"
+                ))
+                for error in resultado['errores']:
+                    self.stdout.write(f"   #{error['id']}: {error['motivo']}")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ {tenant.schema_name}: {resultado['filas']} registros verificados "
+                    f"en {resultado['tramos']} tramos"
+                ))
+        
+        if con_errores:
+            raise SystemExit(1)
@@ -0,0 +1,34 @@
+"""
+Middleware de auditoría automática (CU39).
+
+Agregar en settings.MIDDLEWARE, después de la autenticación:
+    'reportes.middleware.BitacoraMiddleware',
+"""
+from . import auditoria
+
+
+class BitacoraMiddleware:
+    """
+    Expone el request actual a los signals de auditoría y registra VER/EXPORTAR.
+
+    DRF autentica dentro de la vista y asigna el usuario al HttpRequest, por
+    lo que ``request.user`` ya es el usuario JWT al terminar el request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not auditoria.AUDITORIA_AUTOMATICA:
+            return self.get_response(request)
+
+        auditoria.establecer_request(request)
+        try:
+            response = self.get_response(request)
+            try:
+                auditoria.registrar_request(request, response)
+            except Exception:
+                auditoria.logger.exception("Error registrando auditoría del request")
+            return response
+        finally:
+            auditoria.limpiar_request()
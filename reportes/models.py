@@ -1,9 +1,51 @@
-from django.db import models
+import hashlib
+import ipaddress
+import json
+from datetime import timezone as dt_timezone
 
-from django.db import models
+from django.db import models, connection, transaction
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+
+
+# Configuración de texto de PostgreSQL para la búsqueda en la bitácora
+BITACORA_BUSQUEDA_CONFIG = getattr(settings, 'REPORTES_BITACORA_BUSQUEDA_CONFIG', 'spanish')
+
+# Clave reservada de BitacoraAccion.detalles con la tasa de muestreo de la
+# auditoría automática (ver auditoria.py)
+CLAVE_MUESTREO = '_muestreo'
+
+# Cadena de hashes de la bitácora: hash "anterior" del primer registro del tenant
+HASH_GENESIS = '0' * 64
+
+# Campos que forman el contenido canónico de cada registro encadenado.
+# usuario_id queda fuera: la FK es SET_NULL y borrar un usuario lo cambiaría en
+# todos sus registros; el actor queda identificado por las columnas snapshot.
+CAMPOS_HASH = [
+    'usuario_nombre', 'usuario_email', 'usuario_tipo',
+    'accion', 'modelo', 'object_id', 'descripcion', 'detalles',
+    'fecha_hora', 'ip_address', 'user_agent',
+]
+
+
+def contenido_canonico(datos):
+    """JSON determinista (claves ordenadas, fecha en UTC) de los CAMPOS_HASH."""
+    valores = {campo: datos.get(campo) for campo in CAMPOS_HASH}
+    if valores['fecha_hora'] is not None:
+        valores['fecha_hora'] = valores['fecha_hora'].astimezone(dt_timezone.utc).isoformat()
+    if valores['ip_address']:
+        # PostgreSQL (inet) devuelve la forma normalizada de la dirección
+        valores['ip_address'] = str(ipaddress.ip_address(valores['ip_address']))
+    return json.dumps(valores, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def calcular_hash(hash_anterior, datos):
+    """SHA-256 del hash anterior concatenado al contenido canónico."""
+    return hashlib.sha256((hash_anterior + contenido_canonico(datos)).encode('utf-8')).hexdigest()
 
 
 class BitacoraAccion(models.Model):
@@ -69,8 +111,10 @@ class BitacoraAccion(models.Model):
     )
     
     # Fecha y hora de la acción
+    # Se asigna antes del INSERT porque forma parte del hash del registro
     fecha_hora = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         db_index=True
     )
     
@@ -88,6 +132,30 @@ class BitacoraAccion(models.Model):
         verbose_name='Navegador/Dispositivo'
     )
     
+    # Snapshot del actor y del modelo al momento de la acción. Evita joins en
+    # los listados y conserva el dato histórico si el usuario cambia después.
+    usuario_nombre = models.CharField(max_length=255, blank=True, default='')
+    usuario_email = models.CharField(max_length=254, blank=True, default='')
+    usuario_tipo = models.CharField(max_length=20, blank=True, default='')
+    modelo = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name='Modelo afectado'
+    )
+    
+    # Cadena de hashes por tenant (evidencia de manipulación).
+    # Verificable con: python manage.py verificar_bitacora
+    hash_anterior = models.CharField(max_length=64, blank=True, default='', editable=False)
+    hash_registro = models.CharField(max_length=64, blank=True, default='', editable=False)
+    
+    # Vector de búsqueda de texto completo sobre la descripción. Como el resto
+    # del proyecto (django-tenants), requiere PostgreSQL.
+    busqueda = SearchVectorField(
+        null=True,
+        editable=False
+    )
+    
     class Meta:
         db_table = 'reportes_bitacora_accion'
         verbose_name = 'Registro de Bitácora'
@@ -97,13 +165,78 @@ class BitacoraAccion(models.Model):
             models.Index(fields=['-fecha_hora']),
             models.Index(fields=['usuario', '-fecha_hora']),
             models.Index(fields=['accion', '-fecha_hora']),
+            # Filtro ?modelo= de la bitácora (columna snapshot)
+            models.Index(fields=['modelo', '-fecha_hora']),
+            # Búsqueda de texto completo (?busqueda=)
+            GinIndex(fields=['busqueda'], name='rep_bitacora_busqueda_gin'),
         ]
     
     def __str__(self):
-        usuario_nombre = self.usuario.full_name if self.usuario else 'Sistema'
+        usuario_nombre = self.usuario_nombre or (self.usuario.full_name if self.usuario else 'Sistema')
         fecha = self.fecha_hora.strftime('%d/%m/%Y %H:%M')
         return f"{usuario_nombre} - {self.get_accion_display()} - {fecha}"
     
+    def tomar_snapshot(self):
+        """Copia los datos del usuario y del modelo afectado a las columnas snapshot."""
+        if self.usuario_id:
+            usuario = self.usuario
+            self.usuario_nombre = usuario.full_name
+            self.usuario_email = usuario.email or ''
+            self.usuario_tipo = usuario.tipo_usuario or ''
+        else:
+            self.usuario_nombre = 'Sistema'
+            self.usuario_email = 'sistema@clinica-demo.com'
+            self.usuario_tipo = 'SISTEMA'
+        if self.content_type_id:
+            self.modelo = self.content_type.model
+    
+    def datos_hash(self):
+        """Valores de CAMPOS_HASH de esta instancia."""
+        return {campo: getattr(self, campo) for campo in CAMPOS_HASH}
+    
+    @property
+    def peso_muestreo(self):
+        """Cuántas acciones representa este registro (1/tasa si fue muestreado)."""
+        tasa = self.detalles.get(CLAVE_MUESTREO) if isinstance(self.detalles, dict) else None
+        return round(1 / tasa) if tasa else 1
+    
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.usuario_nombre:
+            self.tomar_snapshot()
+        
+        # Mantener el vector de búsqueda en el mismo INSERT/UPDATE
+        self.busqueda = SearchVector(
+            models.Value(self.descripcion or ''),
+            config=BITACORA_BUSQUEDA_CONFIG
+        )
+        
+        if not (self._state.adding and not self.hash_registro):
+            super().save(*args, **kwargs)
+            return
+        
+        # Encadenar: el lock consultivo serializa las inserciones del tenant
+        # hasta el commit, así el orden de id coincide con el de la cadena.
+        # Restricción: el lock es de la transacción externa. Dentro de
+        # ATOMIC_REQUESTS o de una vista con transaction.atomic, otro request
+        # del mismo tenant que también registre espera hasta que este termine:
+        # conviene registrar al final de la vista, justo antes de responder.
+        # La auditoría automática escribe desde su hilo, fuera del request.
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT pg_advisory_xact_lock(hashtext(%s))',
+                        [f"{getattr(connection, 'schema_name', 'public')}.bitacora_cadena"]
+                    )
+            self.hash_anterior = (
+                BitacoraAccion.objects.exclude(hash_registro='')
+                .order_by('-id')
+                .values_list('hash_registro', flat=True)
+                .first()
+            ) or HASH_GENESIS
+            self.hash_registro = calcular_hash(self.hash_anterior, self.datos_hash())
+            super().save(*args, **kwargs)
+    
     @classmethod
     def registrar(cls, usuario, accion, descripcion, content_object=None, detalles=None, ip_address=None, user_agent=None):
         """
@@ -134,3 +267,301 @@ class BitacoraAccion(models.Model):
         bitacora.save()
         return bitacora
 
+
+
+class ResumenPaciente(models.Model):
+    """
+    Resumen materializado por paciente para reportes (valor y actividad).
+    
+    Se mantiene desde los signals de Cita/Factura/Pago (ver signals.py) y se
+    puede reconstruir con: python manage.py reconstruir_resumen_pacientes
+    """
+    
+    paciente = models.OneToOneField(
+        'usuarios.PerfilPaciente',
+        on_delete=models.CASCADE,
+        related_name='resumen_reportes'
+    )
+    total_citas = models.PositiveIntegerField(default=0)
+    ultima_visita = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Fecha de la última cita atendida'
+    )
+    total_facturado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_pagado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    saldo_pendiente = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'reportes_resumen_paciente'
+        verbose_name = 'Resumen de Paciente'
+        verbose_name_plural = 'Resúmenes de Pacientes'
+        indexes = [
+            models.Index(fields=['-total_facturado']),
+            models.Index(fields=['ultima_visita']),
+        ]
+    
+    def __str__(self):
+        return f"Resumen paciente #{self.paciente_id}"
+    
+    @staticmethod
+    def _calcular(filtro_citas, filtro_facturas):
+        """Agregados de citas y facturas agrupados por paciente."""
+        from agenda.models import Cita
+        from facturacion.models import Factura
+        
+        citas = (
+            Cita.objects.filter(filtro_citas)
+            .values('paciente_id')
+            .annotate(
+                total=models.Count('id'),
+                ultima=models.Max('fecha_hora', filter=models.Q(estado='ATENDIDA'))
+            )
+        )
+        facturas = (
+            Factura.objects.filter(filtro_facturas)
+            .values('paciente_id')
+            .annotate(
+                facturado=models.Sum('monto_total'),
+                pagado=models.Sum('monto_pagado')
+            )
+        )
+        
+        resumenes = {}
+        for fila in citas:
+            resumen = resumenes.setdefault(fila['paciente_id'], {})
+            resumen['total_citas'] = fila['total']
+            resumen['ultima_visita'] = fila['ultima']
+        for fila in facturas:
+            resumen = resumenes.setdefault(fila['paciente_id'], {})
+            resumen['total_facturado'] = fila['facturado'] or 0
+            resumen['total_pagado'] = fila['pagado'] or 0
+        for resumen in resumenes.values():
+            resumen['saldo_pendiente'] = (
+                resumen.get('total_facturado', 0) - resumen.get('total_pagado', 0)
+            )
+        resumenes.pop(None, None)
+        return resumenes
+    
+    @classmethod
+    def actualizar(cls, paciente_id):
+        """Recalcula el resumen de un solo paciente (actualización incremental)."""
+        if not paciente_id:
+            return None
+        valores = cls._calcular(
+            models.Q(paciente_id=paciente_id),
+            models.Q(paciente_id=paciente_id)
+        ).get(paciente_id, {})
+        resumen, _ = cls.objects.update_or_create(
+            paciente_id=paciente_id,
+            defaults={
+                'total_citas': valores.get('total_citas', 0),
+                'ultima_visita': valores.get('ultima_visita'),
+                'total_facturado': valores.get('total_facturado', 0),
+                'total_pagado': valores.get('total_pagado', 0),
+                'saldo_pendiente': valores.get('saldo_pendiente', 0),
+            }
+        )
+        return resumen
+    
+    @classmethod
+    def reconstruir(cls):
+        """
+        Reconstruye todos los resúmenes del tenant actual con dos consultas agrupadas.
+        
+        Cálculo, borrado y carga van en una sola transacción: si algo falla la
+        tabla queda como estaba y los lectores nunca la ven vacía o a medias.
+        """
+        from django.db import transaction
+        from usuarios.models import PerfilPaciente
+        from .snapshots import invalidar
+        
+        with transaction.atomic():
+            resumenes = cls._calcular(models.Q(), models.Q())
+            pacientes = PerfilPaciente.objects.values_list('id', flat=True)
+            nuevos = [
+                cls(paciente_id=paciente_id, **resumenes.get(paciente_id, {}))
+                for paciente_id in pacientes
+            ]
+            cls.objects.all().delete()
+            cls.objects.bulk_create(nuevos, batch_size=1000)
+            # bulk_create no emite post_save: los snapshots se invalidan a mano
+            invalidar()
+        return len(nuevos)
+
+
+def peso_muestreo():
+    """
+    Expresión equivalente a ``BitacoraAccion.peso_muestreo`` para agregaciones:
+    ``Sum(peso_muestreo())`` estima las acciones reales a partir de las muestreadas.
+    """
+    from django.db.models.fields.json import KeyTextTransform
+    from django.db.models.functions import Cast, Coalesce, NullIf, Round
+    
+    tasa = NullIf(Cast(KeyTextTransform(CLAVE_MUESTREO, 'detalles'), models.FloatField()), models.Value(0.0))
+    return Cast(
+        Coalesce(Round(models.Value(1.0) / tasa), models.Value(1.0)),
+        models.IntegerField()
+    )
+
+
+class BitacoraContador(models.Model):
+    """
+    Contador incremental de acciones de bitácora por día, acción y usuario.
+    
+    Se actualiza al registrar cada acción (signals.py) y permite servir
+    ``BitacoraViewSet.estadisticas`` sumando pocas filas en lugar de agrupar
+    toda la bitácora. Las acciones muestreadas (p. ej. VER al 10%) suman su
+    peso 1/tasa, así el total estima las acciones reales. Reconstruible con: python manage.py reconstruir_contadores_bitacora
+    """
+    
+    fecha = models.DateField()
+    accion = models.CharField(max_length=20, choices=BitacoraAccion.ACCION_CHOICES)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    total = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'reportes_bitacora_contador'
+        verbose_name = 'Contador de Bitácora'
+        verbose_name_plural = 'Contadores de Bitácora'
+        indexes = [
+            models.Index(fields=['fecha', 'accion', 'usuario']),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha} - {self.accion} - {self.usuario_id or 'Sistema'}: {self.total}"
+    
+    @classmethod
+    def incrementar(cls, bitacora):
+        """Suma el peso de ``bitacora`` al contador de su día/acción/usuario."""
+        from django.utils import timezone
+        
+        fecha = timezone.localtime(bitacora.fecha_hora).date()
+        peso = bitacora.peso_muestreo
+        filtro = {'fecha': fecha, 'accion': bitacora.accion, 'usuario_id': bitacora.usuario_id}
+        actualizados = cls.objects.filter(**filtro).update(total=models.F('total') + peso)
+        if not actualizados:
+            # En una carrera pueden crearse dos filas para la misma clave;
+            # las lecturas suman, así que el resultado sigue siendo correcto.
+            cls.objects.create(total=peso, **filtro)
+    
+    @classmethod
+    def reconstruir(cls):
+        """
+        Recalcula los contadores a partir de la tabla de bitácora.
+        
+        Solo reemplaza los días presentes en la tabla, de modo que se conservan
+        los contadores de períodos ya archivados (ver archivar_bitacora).
+        """
+        from django.db import transaction
+        from django.db.models.functions import TruncDate
+        
+        agrupado = (
+            BitacoraAccion.objects
+            .annotate(fecha=TruncDate('fecha_hora'))
+            .values('fecha', 'accion', 'usuario_id')
+            .annotate(total=models.Sum(peso_muestreo()))
+        )
+        nuevos = [cls(**fila) for fila in agrupado]
+        if not nuevos:
+            return 0
+        with transaction.atomic():
+            cls.objects.filter(fecha__gte=min(fila.fecha for fila in nuevos)).delete()
+            cls.objects.bulk_create(nuevos, batch_size=1000)
+        return len(nuevos)
+
+
+class PuntoControlBitacora(models.Model):
+    """
+    Punto de control de la verificación de la cadena de hashes.
+    
+    Marca el último registro (por id) verificado de forma contigua desde el
+    inicio de la cadena; la siguiente verificación continúa desde aquí.
+    """
+    
+    hasta_id = models.BigIntegerField()
+    hash_registro = models.CharField(max_length=64)
+    filas_verificadas = models.PositiveBigIntegerField(default=0)
+    fecha = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'reportes_bitacora_punto_control'
+        verbose_name = 'Punto de Control de Bitácora'
+        verbose_name_plural = 'Puntos de Control de Bitácora'
+        ordering = ['-hasta_id']
+    
+    def __str__(self):
+        return f"Bitácora verificada hasta #{self.hasta_id}"
+
+
+class ReporteSnapshot(models.Model):
+    """
+    Salida pre-generada de un reporte (JSON, PDF o Excel).
+    
+    La genera el programador nocturno (python manage.py generar_snapshots_reportes)
+    y se sirve directamente mientras la versión de los datos no cambie.
+    Cada tenant tiene su propia tabla (esquema), por lo que la clave es
+    reporte + parámetros + formato + fecha + versión de datos.
+    """
+    
+    reporte = models.CharField(max_length=100, help_text='url_path de la acción de ReportesViewSet')
+    parametros = models.JSONField(default=dict, blank=True)
+    parametros_hash = models.CharField(max_length=64)
+    formato = models.CharField(max_length=10)
+    fecha = models.DateField(help_text='Día para el que es válido el snapshot')
+    version_datos = models.CharField(max_length=64)
+    contenido = models.BinaryField()
+    content_type = models.CharField(max_length=100)
+    content_disposition = models.CharField(max_length=255, blank=True, default='')
+    creado = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'reportes_reporte_snapshot'
+        verbose_name = 'Snapshot de Reporte'
+        verbose_name_plural = 'Snapshots de Reportes'
+        indexes = [
+            models.Index(fields=['reporte', 'parametros_hash', 'formato', 'fecha']),
+        ]
+    
+    def __str__(self):
+        return f"{self.reporte} ({self.formato}) {self.fecha}"
+
+
+class VersionDatosReportes(models.Model):
+    """
+    Contador de cambios de los datos que usan los reportes (una fila por tenant).
+    
+    Lo incrementan los signals de los modelos de snapshots.MODELOS_VERSION;
+    cada snapshot guarda el valor con el que se generó y deja de servirse
+    cuando cambia.
+    """
+    
+    version = models.PositiveBigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'reportes_version_datos'
+        verbose_name = 'Versión de Datos de Reportes'
+        verbose_name_plural = 'Versión de Datos de Reportes'
+    
+    def __str__(self):
+        return f"v{self.version} ({self.actualizado:%d/%m/%Y %H:%M})"
+    
+    @classmethod
+    def actual(cls):
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+    
+    @classmethod
+    def incrementar(cls):
+        actualizadas = cls.objects.filter(pk=1).update(
+            version=models.F('version') + 1, actualizado=timezone.now()
+        )
+        if not actualizadas:
+            cls.objects.get_or_create(pk=1, defaults={'version': 1})
@@ -0,0 +1,126 @@
+"""
+Corpus de comandos de voz con su interpretación esperada.
+
+Sirve para medir velocidad y exactitud de los intérpretes
+(``python manage.py benchmark_voz``) y como prueba de regresión (tests.py).
+Las fechas esperadas se calcularon con ``FECHA_REFERENCIA`` como "hoy"; las
+entradas ``relativa=True`` dependen de esa fecha.
+"""
+from datetime import date
+
+FECHA_REFERENCIA = date(2025, 11, 15)  # sábado
+
+
+def _entrada(texto, tipo_reporte, fecha_inicio=None, fecha_fin=None, relativa=False, **filtros):
+    return {
+        'texto': texto,
+        'tipo_reporte': tipo_reporte,
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin or fecha_inicio,
+        'filtros': filtros,
+        'relativa': relativa,
+    }
+
+
+CORPUS = [
+    # Rangos explícitos
+    _entrada('dame las citas del 1 al 5 de septiembre de 2025', 'citas', '2025-09-01', '2025-09-05'),
+    _entrada('Citas del 10 al 20 de octubre del 2025', 'citas', '2025-10-10', '2025-10-20'),
+    _entrada('facturas del 3 de octubre de 2025', 'facturas', '2025-10-03'),
+    _entrada('pagos entre el 1 de septiembre y el 15 de octubre de 2025', 'ingresos', '2025-09-01', '2025-10-15'),
+    _entrada('ingresos desde el 1 de agosto de 2025 hasta el 31 de agosto de 2025', 'ingresos',
+             '2025-08-01', '2025-08-31'),
+    _entrada('tratamientos de septiembre de 2025', 'tratamientos', '2025-09-01', '2025-09-30'),
+    _entrada('ingresos de septiembre a noviembre de 2024', 'ingresos', '2024-09-01', '2024-11-30'),
+    _entrada('pacientes registrados en 2024', 'pacientes', '2024-01-01', '2024-12-31'),
+    _entrada('citas del 03/10/2025', 'citas', '2025-10-03'),
+    _entrada('facturas del 01/09/2025 al 30/09/2025', 'facturas', '2025-09-01', '2025-09-30'),
+    _entrada('muéstrame las consultas de febrero de 2024', 'citas', '2024-02-01', '2024-02-29'),
+    _entrada('turnos del uno al cinco de marzo de 2025', 'citas', '2025-03-01', '2025-03-05'),
+
+    # Fechas relativas
+    _entrada('citas de hoy', 'citas', '2025-11-15', relativa=True),
+    _entrada('ingresos de ayer', 'ingresos', '2025-11-14', relativa=True),
+    _entrada('citas canceladas de esta semana', 'citas', '2025-11-10', '2025-11-16', relativa=True,
+             estado='CANCELADA'),
+    _entrada('facturas de la semana pasada', 'facturas', '2025-11-03', '2025-11-09', relativa=True),
+    _entrada('ingresos de este mes', 'ingresos', '2025-11-01', '2025-11-30', relativa=True),
+    _entrada('Facturas pendientes mayores a 500 del mes pasado', 'facturas', '2025-10-01', '2025-10-31',
+             relativa=True, estado='PENDIENTE', monto_minimo=500),
+    _entrada('exporta las facturas pendientes del año', 'facturas', '2025-01-01', '2025-12-31', relativa=True,
+             estado='PENDIENTE'),
+    _entrada('citas confirmadas del mes', 'citas', '2025-11-01', '2025-11-30', relativa=True,
+             estado='CONFIRMADA'),
+    _entrada('pacientes nuevos de este año', 'pacientes', '2025-01-01', '2025-12-31', relativa=True),
+    _entrada('tratamientos en progreso del año pasado', 'tratamientos', '2024-01-01', '2024-12-31',
+             relativa=True, estado='en_progreso'),
+    _entrada('ingresos de los últimos 7 días', 'ingresos', '2025-11-09', '2025-11-15', relativa=True),
+    _entrada('las últimas dos semanas de consultas confirmadas', 'citas', '2025-11-02', '2025-11-15',
+             relativa=True, estado='CONFIRMADA'),
+    _entrada('pagos de los últimos 3 meses', 'ingresos', '2025-08-18', '2025-11-15', relativa=True),
+    _entrada('citas atendidas del último mes', 'citas', '2025-10-17', '2025-11-15', relativa=True,
+             estado='ATENDIDA'),
+    _entrada('citas de octubre', 'citas', '2025-10-01', '2025-10-31', relativa=True),
+
+    # Filtros
+    _entrada('facturas entre 100 y 500', 'facturas', monto_minimo=100, monto_maximo=500),
+    _entrada('facturas pagadas menores a 1000', 'facturas', estado='PAGADA', monto_maximo=1000),
+    _entrada('facturas anuladas', 'facturas', estado='ANULADA'),
+    _entrada('citas pendientes', 'citas', estado='PENDIENTE'),
+    _entrada('tratamientos completados', 'tratamientos', estado='completado'),
+    _entrada('planes de tratamiento propuestos', 'tratamientos', estado='propuesto'),
+    _entrada('citas del paciente Juan Pérez de octubre de 2025', 'citas', '2025-10-01', '2025-10-31',
+             paciente_nombre='Juan Pérez'),
+    _entrada('facturas de la paciente María López', 'facturas', paciente_nombre='María López'),
+    _entrada('citas del doctor Ramírez de esta semana', 'citas', '2025-11-10', '2025-11-16', relativa=True,
+             odontologo_nombre='Ramírez'),
+    _entrada('tratamientos de la Dra. Ana Gómez', 'tratamientos', odontologo_nombre='Ana Gómez'),
+    _entrada('citas atendidas del paciente Pedro Soto con la doctora Ruiz', 'citas', estado='ATENDIDA',
+             paciente_nombre='Pedro Soto', odontologo_nombre='Ruiz'),
+
+    # Sin rango
+    _entrada('reporte de turnos', 'citas'),
+    _entrada('quiero ver los ingresos', 'ingresos'),
+    _entrada('lista de pacientes', 'pacientes'),
+    _entrada('hola, ¿cómo estás?', None),
+]
+
+
+def _multiple(texto, comparacion, *consultas):
+    return {
+        'texto': texto,
+        'comparacion': comparacion,
+        'consultas': [
+            {'tipo_reporte': tipo, 'fecha_inicio': inicio, 'fecha_fin': fin, 'filtros': filtros}
+            for tipo, inicio, fin, filtros in consultas
+        ],
+    }
+
+
+# Comandos con varias consultas (nlp.matcher.interpretar_consultas)
+CORPUS_MULTIPLE = [
+    _multiple('compara ingresos de septiembre y octubre de 2025', True,
+              ('ingresos', '2025-09-01', '2025-09-30', {}), ('ingresos', '2025-10-01', '2025-10-31', {})),
+    _multiple('citas y facturas de esta semana', False,
+              ('citas', '2025-11-10', '2025-11-16', {}), ('facturas', '2025-11-10', '2025-11-16', {})),
+    _multiple('ingresos de este mes frente al mes pasado', True,
+              ('ingresos', '2025-11-01', '2025-11-30', {}), ('ingresos', '2025-10-01', '2025-10-31', {})),
+    _multiple('facturas pagadas de septiembre de 2025 vs pendientes de octubre de 2025', True,
+              ('facturas', '2025-09-01', '2025-09-30', {'estado': 'PAGADA'}),
+              ('facturas', '2025-10-01', '2025-10-31', {'estado': 'PENDIENTE'})),
+    _multiple('tratamientos, citas e ingresos de octubre de 2025', False,
+              ('tratamientos', '2025-10-01', '2025-10-31', {}), ('citas', '2025-10-01', '2025-10-31', {}),
+              ('ingresos', '2025-10-01', '2025-10-31', {})),
+    _multiple('compara citas del doctor Ruiz y de la doctora Gómez de este mes', True,
+              ('citas', '2025-11-01', '2025-11-30', {'odontologo_nombre': 'Ruiz'}),
+              ('citas', '2025-11-01', '2025-11-30', {'odontologo_nombre': 'Gómez'})),
+]
+
+
+CAMPOS = ('tipo_reporte', 'fecha_inicio', 'fecha_fin', 'filtros')
+
+
+def diferencias(entrada, interpretacion, fechas=True):
+    """Campos de ``interpretacion`` que no coinciden con la ``entrada`` del corpus."""
+    campos = CAMPOS if fechas else ('tipo_reporte', 'filtros')
+    return [campo for campo in campos if interpretacion.get(campo) != entrada[campo]]
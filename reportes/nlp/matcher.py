@@ -0,0 +1,595 @@
+"""
+Intérprete compilado de comandos de voz para reportes.
+
+Todo el vocabulario (tipos de reporte, estados, meses, números en palabras y
+frases de fechas relativas) se compila una sola vez en una única expresión
+regular factorizada como trie: en cada posición del texto el motor avanza
+carácter por carácter por el prefijo común en lugar de probar frase por frase,
+así que el costo depende del largo del comando y no del tamaño del
+vocabulario. El texto se recorre una vez y las fechas, montos y filtros se
+arman sobre la lista de tokens resultante.
+
+    interpretar("dame las citas del 1 al 5 de septiembre de 2025")
+    {
+        'texto_original': 'dame las citas del 1 al 5 de septiembre de 2025',
+        'tipo_reporte': 'citas',
+        'fecha_inicio': '2025-09-01',
+        'fecha_fin': '2025-09-05',
+        'filtros': {},
+        'interpretacion': 'Reporte de citas desde el 01/09/2025 hasta el 05/09/2025',
+    }
+
+Devuelve el mismo formato que ``voice_parser.parse_voice_command``; si no
+reconoce el tipo de reporte, ``tipo_reporte`` es None.
+"""
+import calendar
+import re
+import unicodedata
+from datetime import date, timedelta
+
+# ============================================================================
+# VOCABULARIO: frase normalizada -> (categoría, valor)
+# ============================================================================
+
+TIPOS_REPORTE = {
+    'citas': ['cita', 'citas', 'turno', 'turnos', 'agenda', 'consulta', 'consultas'],
+    'facturas': ['factura', 'facturas', 'facturacion', 'cuentas por cobrar', 'deudas'],
+    'tratamientos': [
+        'tratamiento', 'tratamientos', 'plan de tratamiento', 'planes de tratamiento',
+        'procedimiento', 'procedimientos',
+    ],
+    'pacientes': ['paciente', 'pacientes'],
+    'ingresos': [
+        'ingreso', 'ingresos', 'pago', 'pagos', 'ganancias', 'recaudacion', 'recaudado', 'cobrado', 'ventas',
+    ],
+}
+
+# Estado mencionado -> valor del filtro según el tipo de reporte
+ESTADOS = {
+    'pendiente': {'citas': 'PENDIENTE', 'facturas': 'PENDIENTE'},
+    'confirmada': {'citas': 'CONFIRMADA'},
+    'atendida': {'citas': 'ATENDIDA'},
+    'cancelada': {'citas': 'CANCELADA', 'facturas': 'ANULADA', 'tratamientos': 'cancelado'},
+    'pagada': {'facturas': 'PAGADA'},
+    'propuesto': {'tratamientos': 'propuesto'},
+    'aprobado': {'tratamientos': 'aprobado'},
+    'en_progreso': {'tratamientos': 'en_progreso'},
+    'completado': {'citas': 'ATENDIDA', 'tratamientos': 'completado', 'facturas': 'PAGADA'},
+}
+
+PALABRAS_ESTADO = {
+    'pendiente': ['pendiente', 'pendientes', 'por cobrar', 'sin pagar', 'impaga', 'impagas'],
+    'confirmada': ['confirmada', 'confirmadas', 'confirmado', 'confirmados'],
+    'atendida': ['atendida', 'atendidas', 'realizada', 'realizadas'],
+    'cancelada': [
+        'cancelada', 'canceladas', 'cancelado', 'cancelados', 'anulada', 'anuladas', 'anulado', 'anulados',
+    ],
+    'pagada': ['pagada', 'pagadas', 'cobrada', 'cobradas'],
+    'propuesto': ['propuesto', 'propuestos', 'propuesta', 'propuestas'],
+    'aprobado': ['aprobado', 'aprobados', 'aprobada', 'aprobadas'],
+    'en_progreso': ['en progreso', 'en curso', 'activo', 'activos', 'activa', 'activas'],
+    'completado': ['completado', 'completados', 'completada', 'completadas', 'terminado', 'terminados'],
+}
+
+MESES = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6, 'julio': 7,
+    'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12,
+}
+
+NUMEROS = {
+    'un': 1, 'uno': 1, 'una': 1, 'dos': 2, 'tres': 3, 'cuatro': 4, 'cinco': 5, 'seis': 6,
+    'siete': 7, 'ocho': 8, 'nueve': 9, 'diez': 10, 'once': 11, 'doce': 12, 'quince': 15,
+    'veinte': 20, 'treinta': 30, 'sesenta': 60, 'noventa': 90,
+}
+
+RELATIVOS = {
+    'hoy': 'hoy',
+    'ayer': 'ayer',
+    'anteayer': 'anteayer',
+    'antier': 'anteayer',
+    'esta semana': 'esta_semana',
+    'semana actual': 'esta_semana',
+    'semana pasada': 'semana_pasada',
+    'semana anterior': 'semana_pasada',
+    'este mes': 'este_mes',
+    'mes actual': 'este_mes',
+    'mes pasado': 'mes_pasado',
+    'mes anterior': 'mes_pasado',
+    'del mes': 'este_mes',
+    'del mes actual': 'este_mes',
+    'del mes pasado': 'mes_pasado',
+    'del mes anterior': 'mes_pasado',
+    'este ano': 'este_ano',
+    'ano actual': 'este_ano',
+    'ano pasado': 'ano_pasado',
+    'ano anterior': 'ano_pasado',
+    'del ano': 'este_ano',
+    'del ano actual': 'este_ano',
+    'del ano pasado': 'ano_pasado',
+    'del ano anterior': 'ano_pasado',
+    'ultima semana': 'ultimos_7_dias',
+    'ultimo mes': 'ultimos_30_dias',
+}
+
+UNIDADES = {'dia': 1, 'dias': 1, 'semana': 7, 'semanas': 7, 'mes': 30, 'meses': 30}
+
+MARCADORES = {
+    'ultimos': ['ultimos', 'ultimas', 'pasados', 'pasadas'],
+    'mayor': ['mayor a', 'mayores a', 'mayor que', 'mayores que', 'mas de', 'superior a', 'superiores a',
+              'minimo', 'como minimo', 'al menos'],
+    'menor': ['menor a', 'menores a', 'menor que', 'menores que', 'menos de', 'inferior a', 'inferiores a',
+              'maximo', 'como maximo'],
+    'entre': ['entre'],
+    'paciente': ['del paciente', 'de la paciente', 'paciente'],
+    'odontologo': [
+        'odontologo', 'odontologa', 'del odontologo', 'de la odontologa', 'con el odontologo', 'con la odontologa',
+        'doctor', 'doctora', 'del doctor', 'de la doctora', 'con el doctor', 'con la doctora',
+        'dr', 'dra', 'del dr', 'de la dra', 'con el dr', 'con la dra', 'dentista', 'del dentista',
+    ],
+    'comparar': [
+        'compara', 'comparar', 'comparame', 'comparacion', 'comparativa', 'comparativo',
+        'versus', 'vs', 'contra', 'frente a', 'frente al',
+    ],
+}
+
+
+def _vocabulario():
+    vocabulario = {}
+    for tipo, frases in TIPOS_REPORTE.items():
+        vocabulario.update({frase: ('reporte', tipo) for frase in frases})
+    for estado, frases in PALABRAS_ESTADO.items():
+        vocabulario.update({frase: ('estado', estado) for frase in frases})
+    vocabulario.update({frase: ('mes', numero) for frase, numero in MESES.items()})
+    vocabulario.update({frase: ('numero', numero) for frase, numero in NUMEROS.items()})
+    vocabulario.update({frase: ('relativo', clave) for frase, clave in RELATIVOS.items()})
+    vocabulario.update({frase: ('unidad', dias) for frase, dias in UNIDADES.items()})
+    for marcador, frases in MARCADORES.items():
+        vocabulario.update({frase: ('marcador', marcador) for frase in frases})
+    return vocabulario
+
+
+# ============================================================================
+# COMPILACIÓN
+# ============================================================================
+
+def _regex_trie(frases):
+    """Alternancia de ``frases`` factorizada por prefijos (sin grupos de captura)."""
+    trie = {}
+    for frase in frases:
+        nodo = trie
+        for caracter in frase:
+            nodo = nodo.setdefault(caracter, {})
+        nodo[''] = {}
+    return _nodo_a_regex(trie)
+
+
+def _nodo_a_regex(nodo):
+    ramas = [re.escape(caracter) + _nodo_a_regex(hijo) for caracter, hijo in sorted(nodo.items()) if caracter]
+    if not ramas:
+        return ''
+    cuerpo = ramas[0] if len(ramas) == 1 else '(?:' + '|'.join(ramas) + ')'
+    # Frase completa en este nodo: la continuación es opcional (gana la más larga)
+    return f'(?:{cuerpo})?' if '' in nodo else cuerpo
+
+
+VOCABULARIO = _vocabulario()
+
+PATRON = re.compile(
+    r'\b(?:'
+    r'(?P<fecha>\d{1,2}/\d{1,2}/\d{4})'
+    r'|(?P<numero>\d+(?:[.,]\d+)?)'
+    r'|(?P<frase>' + _regex_trie(VOCABULARIO) + r')'
+    r')\b'
+)
+
+# Palabras que no forman parte de un nombre de paciente u odontólogo
+PALABRAS_VACIAS = frozenset([
+    'de', 'del', 'la', 'el', 'los', 'las', 'y', 'en', 'con', 'por', 'para', 'que', 'a', 'al',
+]) | frozenset(VOCABULARIO)
+
+PATRON_NOMBRE = re.compile(r'\.?\s+([^\W\d_]+(?:\s+[^\W\d_]+){0,2})')
+
+# Conectores que separan consultas ("citas, tratamientos y facturas", "septiembre vs octubre")
+SEPARADOR = re.compile(r'\b(?:y|e|vs|versus|contra|frente al?)\b|,')
+
+
+# ============================================================================
+# INTERPRETACIÓN
+# ============================================================================
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, conservando la posición de cada carácter (ñ -> n)."""
+    return ''.join(
+        unicodedata.normalize('NFD', caracter)[0]
+        for caracter in texto.lower()
+    )
+
+
+def tokenizar(texto_normalizado):
+    """Lista de ``(categoría, valor, inicio, fin)`` en una sola pasada."""
+    tokens = []
+    for match in PATRON.finditer(texto_normalizado):
+        if match.group('fecha'):
+            dia, mes, anio = (int(parte) for parte in match.group('fecha').split('/'))
+            tokens.append(('fecha', (anio, mes, dia), match.start(), match.end()))
+        elif match.group('numero'):
+            numero = match.group('numero').replace(',', '.')
+            valor = float(numero) if '.' in numero else int(numero)
+            tokens.append(('numero', valor, match.start(), match.end()))
+        else:
+            categoria, valor = VOCABULARIO[match.group('frase')]
+            tokens.append((categoria, valor, match.start(), match.end()))
+    return tokens
+
+
+def _fin_de_mes(anio, mes):
+    return date(anio, mes, calendar.monthrange(anio, mes)[1])
+
+
+def _fecha(anio, mes, dia):
+    try:
+        return date(anio, mes, dia)
+    except ValueError:
+        return None
+
+
+def rango_relativo(clave, hoy):
+    """Rango ``(desde, hasta)`` de una frase relativa respecto de ``hoy``."""
+    if clave == 'hoy':
+        return hoy, hoy
+    if clave == 'ayer':
+        return hoy - timedelta(days=1), hoy - timedelta(days=1)
+    if clave == 'anteayer':
+        return hoy - timedelta(days=2), hoy - timedelta(days=2)
+    if clave == 'esta_semana':
+        lunes = hoy - timedelta(days=hoy.weekday())
+        return lunes, lunes + timedelta(days=6)
+    if clave == 'semana_pasada':
+        lunes = hoy - timedelta(days=hoy.weekday() + 7)
+        return lunes, lunes + timedelta(days=6)
+    if clave == 'este_mes':
+        return hoy.replace(day=1), _fin_de_mes(hoy.year, hoy.month)
+    if clave == 'mes_pasado':
+        fin = hoy.replace(day=1) - timedelta(days=1)
+        return fin.replace(day=1), fin
+    if clave == 'este_ano':
+        return date(hoy.year, 1, 1), date(hoy.year, 12, 31)
+    if clave == 'ano_pasado':
+        return date(hoy.year - 1, 1, 1), date(hoy.year - 1, 12, 31)
+    if clave.startswith('ultimos_'):
+        dias = int(clave.split('_')[1])
+        return hoy - timedelta(days=dias - 1), hoy
+    raise ValueError(f"Rango relativo desconocido: {clave}")
+
+
+def _es_anio(token):
+    return token is not None and token[0] == 'numero' and isinstance(token[1], int) and 1900 <= token[1] <= 2100
+
+
+def _es_dia(token):
+    return token is not None and token[0] == 'numero' and isinstance(token[1], int) and 1 <= token[1] <= 31
+
+
+def _es_mes(token):
+    return token is not None and token[0] == 'mes'
+
+
+def _numero(token):
+    if token is None:
+        return None
+    if token[0] == 'numero':
+        return token[1]
+    return None
+
+
+class _Lector:
+    """Cursor sobre los tokens con acceso a los siguientes."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.i = 0
+
+    def ver(self, desplazamiento=0):
+        indice = self.i + desplazamiento
+        return self.tokens[indice] if 0 <= indice < len(self.tokens) else None
+
+    def anio_opcional(self, desplazamiento, hoy):
+        """Año explícito en la posición indicada (y cuántos tokens ocupa)."""
+        token = self.ver(desplazamiento)
+        if _es_anio(token):
+            return token[1], 1
+        return hoy.year, 0
+
+
+def _leer_fecha_con_mes(lector, hoy):
+    """``<día> <mes> [año]`` desde la posición actual: (fecha, tokens) o (None, 0)."""
+    dia, mes = lector.ver(), lector.ver(1)
+    if _es_dia(dia) and _es_mes(mes):
+        anio, extra = lector.anio_opcional(2, hoy)
+        return _fecha(anio, mes[1], dia[1]), 2 + extra
+    return None, 0
+
+
+def interpretar_tokens(tokens, texto_original, hoy, tipo_reporte=None):
+    desde = hasta = None
+    estado = None
+    monto_minimo = monto_maximo = None
+    paciente_nombre = odontologo_nombre = None
+
+    lector = _Lector(tokens)
+    while lector.i < len(tokens):
+        categoria, valor, inicio, fin = lector.ver()
+        siguiente = lector.ver(1)
+
+        if categoria == 'reporte':
+            if tipo_reporte is None:
+                tipo_reporte = valor
+            lector.i += 1
+            continue
+
+        if categoria == 'marcador' and valor == 'paciente':
+            nombre = _nombre_despues(texto_original, fin)
+            if nombre:
+                paciente_nombre = nombre
+            elif tipo_reporte is None:
+                tipo_reporte = 'pacientes'
+            lector.i += 1
+            continue
+
+        if categoria == 'marcador' and valor == 'odontologo':
+            odontologo_nombre = odontologo_nombre or _nombre_despues(texto_original, fin)
+            lector.i += 1
+            continue
+
+        if categoria == 'estado':
+            estado = estado or valor
+            lector.i += 1
+            continue
+
+        if categoria == 'relativo' and desde is None:
+            desde, hasta = rango_relativo(valor, hoy)
+            lector.i += 1
+            continue
+
+        if categoria == 'fecha' and desde is None:
+            inicial = _fecha(*valor)
+            final = inicial
+            # "01/09/2025 al 05/09/2025"
+            if siguiente is not None and siguiente[0] == 'fecha':
+                final = _fecha(*siguiente[1])
+                lector.i += 1
+            if inicial and final:
+                desde, hasta = inicial, final
+            lector.i += 1
+            continue
+
+        if categoria == 'marcador' and valor == 'ultimos':
+            cantidad = _numero(siguiente)
+            unidad = lector.ver(2)
+            if cantidad and unidad is not None and unidad[0] == 'unidad' and desde is None:
+                desde, hasta = rango_relativo(f'ultimos_{int(cantidad * unidad[1])}_dias', hoy)
+                lector.i += 3
+                continue
+            lector.i += 1
+            continue
+
+        if categoria == 'marcador' and valor == 'entre':
+            # "entre el 1 de septiembre y el 15 de octubre" / "entre 100 y 500"
+            lector.i += 1
+            inicial, usados = _leer_fecha_con_mes(lector, hoy)
+            if inicial:
+                lector.i += usados
+                final, usados = _leer_fecha_con_mes(lector, hoy)
+                if final:
+                    lector.i += usados
+                    desde, hasta = inicial, final
+                continue
+            minimo, maximo = _numero(lector.ver()), _numero(lector.ver(1))
+            if minimo is not None and maximo is not None:
+                monto_minimo, monto_maximo = minimo, maximo
+                lector.i += 2
+            continue
+
+        if categoria == 'marcador' and valor in ('mayor', 'menor'):
+            monto = _numero(siguiente)
+            if monto is not None:
+                if valor == 'mayor':
+                    monto_minimo = monto
+                else:
+                    monto_maximo = monto
+                lector.i += 2
+                continue
+            lector.i += 1
+            continue
+
+        if categoria == 'numero' and desde is None:
+            # "del 1 al 5 de septiembre [de 2025]"
+            if _es_dia(lector.ver()) and _es_dia(siguiente) and _es_mes(lector.ver(2)):
+                anio, extra = lector.anio_opcional(3, hoy)
+                mes = lector.ver(2)[1]
+                inicial, final = _fecha(anio, mes, valor), _fecha(anio, mes, siguiente[1])
+                if inicial and final:
+                    desde, hasta = inicial, final
+                lector.i += 3 + extra
+                continue
+            # "el 3 de octubre [de 2025]" (opcionalmente "al 10 de noviembre")
+            inicial, usados = _leer_fecha_con_mes(lector, hoy)
+            if inicial:
+                lector.i += usados
+                final, usados = _leer_fecha_con_mes(lector, hoy)
+                if final:
+                    lector.i += usados
+                desde, hasta = inicial, final or inicial
+                continue
+            # "en 2024"
+            if _es_anio(lector.ver()):
+                desde, hasta = date(valor, 1, 1), date(valor, 12, 31)
+                lector.i += 1
+                continue
+
+        if categoria == 'mes' and desde is None:
+            # "de septiembre [de 2025]" o "de septiembre a noviembre [de 2025]"
+            if _es_mes(siguiente):
+                anio, extra = lector.anio_opcional(2, hoy)
+                desde, hasta = date(anio, valor, 1), _fin_de_mes(anio, siguiente[1])
+                lector.i += 2 + extra
+                continue
+            anio, extra = lector.anio_opcional(1, hoy)
+            desde, hasta = date(anio, valor, 1), _fin_de_mes(anio, valor)
+            lector.i += 1 + extra
+            continue
+
+        lector.i += 1
+
+    filtros = {}
+    if estado and tipo_reporte:
+        valor_estado = ESTADOS.get(estado, {}).get(tipo_reporte)
+        if valor_estado:
+            filtros['estado'] = valor_estado
+    if monto_minimo is not None:
+        filtros['monto_minimo'] = monto_minimo
+    if monto_maximo is not None:
+        filtros['monto_maximo'] = monto_maximo
+    if paciente_nombre:
+        filtros['paciente_nombre'] = paciente_nombre
+    if odontologo_nombre:
+        filtros['odontologo_nombre'] = odontologo_nombre
+
+    return tipo_reporte, desde, hasta, filtros
+
+
+def _nombre_despues(texto_original, posicion):
+    """Hasta tres palabras después de "paciente"/"doctor" que no sean del vocabulario."""
+    match = PATRON_NOMBRE.match(texto_original, posicion)
+    if not match:
+        return None
+    palabras = []
+    for palabra in match.group(1).split():
+        if normalizar(palabra) in PALABRAS_VACIAS:
+            break
+        palabras.append(palabra)
+    return ' '.join(palabras) or None
+
+
+def describir(tipo_reporte, desde, hasta):
+    if tipo_reporte is None:
+        return 'No se reconoció el tipo de reporte'
+    descripcion = f"Reporte de {tipo_reporte}"
+    if desde and hasta:
+        if desde == hasta:
+            return f"{descripcion} del {desde:%d/%m/%Y}"
+        return f"{descripcion} desde el {desde:%d/%m/%Y} hasta el {hasta:%d/%m/%Y}"
+    return descripcion
+
+
+def _resultado(texto, tipo_reporte, desde, hasta, filtros):
+    if desde and hasta and desde > hasta:
+        desde, hasta = hasta, desde
+    return {
+        'texto_original': texto,
+        'tipo_reporte': tipo_reporte,
+        'fecha_inicio': desde.isoformat() if desde else None,
+        'fecha_fin': hasta.isoformat() if hasta else None,
+        'filtros': filtros,
+        'interpretacion': describir(tipo_reporte, desde, hasta),
+    }
+
+
+def interpretar(texto, hoy=None):
+    """Interpreta un comando de voz (ver docstring del módulo)."""
+    hoy = hoy or date.today()
+    tokens = tokenizar(normalizar(texto))
+    return _resultado(texto, *interpretar_tokens(tokens, texto, hoy))
+
+
+# ============================================================================
+# VARIAS CONSULTAS Y COMPARACIONES
+# ============================================================================
+
+def _tramos(texto_normalizado, tokens):
+    """
+    Tramos ``(inicio, fin)`` del texto separados por los conectores. No cortan
+    los que forman parte de un token ("1,5") ni el primer "y" después de
+    "entre", que es parte del rango ("entre 100 y 500").
+    """
+    separadores = list(SEPARADOR.finditer(texto_normalizado))
+    protegidos = set()
+    for categoria, valor, inicio, fin in tokens:
+        if categoria == 'marcador' and valor == 'comparar':
+            continue
+        protegidos.update(match.start() for match in separadores if inicio <= match.start() < fin)
+        if categoria == 'marcador' and valor == 'entre':
+            siguiente = next((match for match in separadores if match.start() >= fin), None)
+            if siguiente:
+                protegidos.add(siguiente.start())
+
+    tramos = []
+    inicio = 0
+    for match in separadores:
+        if match.start() not in protegidos:
+            tramos.append((inicio, match.start()))
+            inicio = match.end()
+    tramos.append((inicio, len(texto_normalizado)))
+    return tramos
+
+
+def _mas_cercano(partes, indice, clave):
+    """La parte más cercana a ``indice`` (primero hacia atrás) con ``clave``."""
+    anteriores = [parte for parte in reversed(partes[:indice]) if parte[clave]]
+    siguientes = [parte for parte in partes[indice + 1:] if parte[clave]]
+    candidatas = anteriores + siguientes
+    return candidatas[0] if candidatas else None
+
+
+def interpretar_consultas(texto, hoy=None):
+    """
+    Interpreta un comando que puede pedir varias consultas:
+
+        "citas y facturas de esta semana"          -> citas y facturas, misma semana
+        "compara ingresos de septiembre y octubre" -> ingresos de cada mes
+
+    Cada tramo entre conectores se interpreta por separado; el que no nombra
+    un tipo de reporte hereda el tipo y los filtros del tramo más cercano, y
+    el que no tiene fechas hereda su rango. Es una comparación si se dijo
+    "compara"/"vs"/"contra" o si todas las consultas son del mismo tipo.
+
+    Devuelve ``{'texto_original', 'consultas': [...], 'comparacion': bool}``
+    donde cada consulta tiene el formato de ``interpretar``. Con una sola
+    consulta es exactamente ``interpretar(texto)``.
+    """
+    hoy = hoy or date.today()
+    normalizado = normalizar(texto)
+    tokens = tokenizar(normalizado)
+
+    partes = []
+    for inicio, fin in _tramos(normalizado, tokens):
+        propios = [token for token in tokens if token[2] >= inicio and token[3] <= fin]
+        tipo_reporte, desde, hasta, filtros = interpretar_tokens(propios, texto, hoy)
+        if tipo_reporte or desde or filtros:
+            partes.append({
+                'texto': texto[inicio:fin].strip(' ,'), 'tokens': propios,
+                'tipo': tipo_reporte, 'rango': (desde, hasta) if desde else None, 'filtros': filtros,
+            })
+
+    if len(partes) <= 1:
+        return {'texto_original': texto, 'consultas': [interpretar(texto, hoy)], 'comparacion': False}
+
+    consultas = []
+    for indice, parte in enumerate(partes):
+        tipo_reporte, filtros = parte['tipo'], parte['filtros']
+        if tipo_reporte is None:
+            fuente = _mas_cercano(partes, indice, 'tipo')
+            if fuente is None:
+                continue
+            # Se reinterpreta con el tipo heredado para resolver sus estados
+            tipo_reporte, _, _, filtros = interpretar_tokens(parte['tokens'], texto, hoy, fuente['tipo'])
+            filtros = {**fuente['filtros'], **filtros}
+        rango = parte['rango'] or (_mas_cercano(partes, indice, 'rango') or {}).get('rango') or (None, None)
+        consultas.append(_resultado(parte['texto'], tipo_reporte, *rango, filtros))
+
+    if len(consultas) <= 1:
+        return {'texto_original': texto, 'consultas': [interpretar(texto, hoy)], 'comparacion': False}
+
+    comparar = any(categoria == 'marcador' and valor == 'comparar' for categoria, valor, _, _ in tokens)
+    mismo_tipo = len({consulta['tipo_reporte'] for consulta in consultas}) == 1
+    return {'texto_original': texto, 'consultas': consultas, 'comparacion': comparar or mismo_tipo}
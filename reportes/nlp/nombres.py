@@ -0,0 +1,178 @@
+"""
+Índice en memoria de nombres de pacientes y odontólogos para los filtros por voz.
+
+Los nombres dictados ("del paciente juan perez", "con la doctora ramirez") se
+resuelven a ids antes de consultar, así los filtros son ``id IN (...)`` sobre
+columnas indexadas en lugar de un join con ``ILIKE`` por comando.
+
+Cada tenant tiene su índice (por ``connection.schema_name``), construido en la
+primera búsqueda con una consulta por tipo de persona. Los signals de
+``Usuario``/``PerfilPaciente``/``PerfilOdontologo`` lo invalidan al confirmar
+la transacción y ``REPORTES_INDICE_NOMBRES_TTL`` acota cuánto puede quedar
+desactualizado en los demás procesos.
+
+Coincidencias, por cada palabra dictada y en este orden de preferencia:
+- exacta, sin tildes ni mayúsculas ("perez" -> "Pérez")
+- prefijo, desde 3 letras ("rami" -> "Ramírez")
+- aproximada, desde 4 letras, a una edición de distancia ("gonzales" -> "González")
+Una persona coincide si todas las palabras dictadas coinciden con alguna de
+las de su nombre.
+"""
+import bisect
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import connection
+
+from .matcher import normalizar
+
+TTL = getattr(settings, 'REPORTES_INDICE_NOMBRES_TTL', 300)
+MIN_PREFIJO = 3
+MIN_APROXIMADO = 4
+
+Persona = namedtuple('Persona', ['id', 'usuario_id', 'nombre'])
+
+
+def _palabras(texto):
+    return [palabra for palabra in normalizar(texto or '').replace('.', ' ').split() if palabra]
+
+
+def _borrados(palabra):
+    """La palabra y sus variantes con una letra menos (vecindario de edición 1)."""
+    return {palabra} | {palabra[:i] + palabra[i + 1:] for i in range(len(palabra))}
+
+
+def _distancia_hasta_uno(a, b):
+    """True si ``a`` y ``b`` difieren en a lo sumo una edición (incluye transposición)."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diferencias = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diferencias) == 1:
+            return True
+        return (
+            len(diferencias) == 2 and diferencias[1] == diferencias[0] + 1
+            and a[diferencias[0]] == b[diferencias[1]] and a[diferencias[1]] == b[diferencias[0]]
+        )
+    corta, larga = (a, b) if len(a) < len(b) else (b, a)
+    i = 0
+    while i < len(corta) and corta[i] == larga[i]:
+        i += 1
+    return corta[i:] == larga[i + 1:]
+
+
+class IndiceNombres:
+    """Índice de palabras de nombres -> personas (exacto, prefijo y aproximado)."""
+
+    def __init__(self, personas):
+        self.personas = {}
+        self._por_palabra = defaultdict(set)
+        self._por_borrado = defaultdict(set)
+        for persona in personas:
+            self.personas[persona.id] = persona
+            for palabra in _palabras(persona.nombre):
+                self._por_palabra[palabra].add(persona.id)
+        for palabra in self._por_palabra:
+            for borrado in _borrados(palabra):
+                self._por_borrado[borrado].add(palabra)
+        self._ordenadas = sorted(self._por_palabra)
+
+    def __len__(self):
+        return len(self.personas)
+
+    def _coincidencias(self, palabra):
+        """Ids de las personas con una palabra que coincide (mejor nivel disponible)."""
+        if palabra in self._por_palabra:
+            return set(self._por_palabra[palabra])
+
+        if len(palabra) >= MIN_PREFIJO:
+            ids = set()
+            inicio = bisect.bisect_left(self._ordenadas, palabra)
+            for candidata in self._ordenadas[inicio:]:
+                if not candidata.startswith(palabra):
+                    break
+                ids |= self._por_palabra[candidata]
+            if ids:
+                return ids
+
+        if len(palabra) >= MIN_APROXIMADO:
+            ids = set()
+            candidatas = set()
+            for borrado in _borrados(palabra):
+                candidatas |= self._por_borrado.get(borrado, set())
+            for candidata in candidatas:
+                if _distancia_hasta_uno(palabra, candidata):
+                    ids |= self._por_palabra[candidata]
+            return ids
+
+        return set()
+
+    def buscar(self, texto):
+        """Personas cuyo nombre coincide con todas las palabras de ``texto``."""
+        palabras = _palabras(texto)
+        if not palabras:
+            return []
+        ids = None
+        for palabra in palabras:
+            coincidencias = self._coincidencias(palabra)
+            ids = coincidencias if ids is None else ids & coincidencias
+            if not ids:
+                return []
+        return [self.personas[persona_id] for persona_id in sorted(ids)]
+
+
+# ============================================================================
+# ÍNDICES POR TENANT
+# ============================================================================
+
+_indices = {}
+_lock = threading.Lock()
+
+
+def _construir():
+    from usuarios.models import PerfilOdontologo, PerfilPaciente
+
+    def personas(queryset):
+        return [
+            Persona(persona_id, usuario_id, f"{nombre or ''} {apellido or ''}".strip())
+            for persona_id, usuario_id, nombre, apellido in queryset.values_list(
+                'pk', 'usuario_id', 'usuario__first_name', 'usuario__last_name'
+            )
+        ]
+
+    return {
+        'pacientes': IndiceNombres(personas(PerfilPaciente.objects.all())),
+        'odontologos': IndiceNombres(personas(PerfilOdontologo.objects.filter(usuario__is_active=True))),
+        'creado': time.monotonic(),
+    }
+
+
+def obtener_indice(tipo):
+    """Índice ``'pacientes'`` u ``'odontologos'`` del tenant actual (lo construye si falta)."""
+    schema_name = getattr(connection, 'schema_name', None)
+    indices = _indices.get(schema_name)
+    if indices is None or time.monotonic() - indices['creado'] > TTL:
+        with _lock:
+            indices = _indices.get(schema_name)
+            if indices is None or time.monotonic() - indices['creado'] > TTL:
+                indices = _construir()
+                _indices[schema_name] = indices
+    return indices[tipo]
+
+
+def invalidar(schema_name):
+    """Descarta el índice del tenant; se reconstruye en la próxima búsqueda."""
+    with _lock:
+        _indices.pop(schema_name, None)
+
+
+def buscar_pacientes(texto):
+    return obtener_indice('pacientes').buscar(texto)
+
+
+def buscar_odontologos(texto):
+    return obtener_indice('odontologos').buscar(texto)
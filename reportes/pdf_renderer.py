@@ -0,0 +1,237 @@
+"""
+Servicio de renderizado de PDF en un pool de procesos.
+
+ReportLab es CPU intensivo y retiene el GIL: un PDF grande bloquea los demás
+hilos del worker. ``PDFReportGenerator`` (exporters/pdf.py) solo arma una
+especificación serializable del documento:
+
+    {
+        'title': 'Reporte de Pacientes',
+        'tenant_name': 'Clínica Demo',
+        'tema': {'color_primario': '#1e3a8a', ...},   # themes.Tema
+        'bloques': [
+            {'tipo': 'header', 'fecha': '01/11/2025 08:00'},
+            {'tipo': 'table', 'data': [[...], ...], 'col_widths': None, 'title': '...'},
+            {'tipo': 'paragraph', 'text': '...', 'style': 'CustomNormal'},
+        ],
+    }
+
+y ``renderizar_pdf(spec)`` la convierte en bytes en un ``ProcessPoolExecutor``
+persistente, cuyos procesos precargan estilos y fuentes al iniciar. Los PDF
+pequeños, el pool saturado o cualquier falla del pool se resuelven en el
+mismo proceso.
+
+Configuración (settings.py):
+    REPORTES_PDF_WORKERS = 4            # 0 desactiva el pool
+    REPORTES_PDF_MAX_CONCURRENTES = 8   # trabajos simultáneos en el pool
+    REPORTES_PDF_MIN_FILAS = 200        # por debajo se renderiza en el proceso
+    REPORTES_PDF_ESPERA = 5             # segundos esperando un lugar en el pool
+    REPORTES_PDF_TIMEOUT = 120
+"""
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturoTimeout
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .themes import TEMA_BASE, Tema
+
+logger = logging.getLogger(__name__)
+
+PDF_WORKERS = getattr(settings, 'REPORTES_PDF_WORKERS', min(os.cpu_count() or 1, 4))
+MAX_CONCURRENTES = getattr(settings, 'REPORTES_PDF_MAX_CONCURRENTES', max(PDF_WORKERS, 1) * 2)
+MIN_FILAS_POOL = getattr(settings, 'REPORTES_PDF_MIN_FILAS', 200)
+ESPERA_POOL = getattr(settings, 'REPORTES_PDF_ESPERA', 5)
+TIMEOUT = getattr(settings, 'REPORTES_PDF_TIMEOUT', 120)
+
+
+# ============================================================================
+# CONSTRUCCIÓN DEL DOCUMENTO (se ejecuta en el proceso que renderiza)
+# ============================================================================
+
+@functools.lru_cache(maxsize=32)
+def _estilos(tema):
+    """Hoja de estilos del reporte; se crea una vez por proceso y tema."""
+    estilos = getSampleStyleSheet()
+    estilos.add(ParagraphStyle(
+        name='CustomTitle',
+        parent=estilos['Heading1'],
+        fontSize=18,
+        textColor=colors.HexColor(tema.color_primario),
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    ))
+    estilos.add(ParagraphStyle(
+        name='CustomSubtitle',
+        parent=estilos['Heading2'],
+        fontSize=14,
+        textColor=colors.HexColor(tema.color_secundario),
+        spaceAfter=12,
+        spaceBefore=12,
+        fontName='Helvetica-Bold'
+    ))
+    estilos.add(ParagraphStyle(
+        name='CustomNormal',
+        parent=estilos['Normal'],
+        fontSize=10,
+        spaceAfter=6
+    ))
+    return estilos
+
+
+@functools.lru_cache(maxsize=32)
+def _estilo_tabla(tema):
+    return TableStyle([
+        # Encabezado
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(tema.color_primario)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+
+        # Contenido
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('TOPPADDING', (0, 1), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+
+        # Bordes
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor(tema.color_primario)),
+
+        # Alternar colores en filas
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+    ])
+
+
+def _agregar_tabla(story, estilos, tema, bloque):
+    if bloque.get('title'):
+        story.append(Paragraph(bloque['title'], estilos['CustomSubtitle']))
+        story.append(Spacer(1, 0.1 * inch))
+
+    if not bloque['data']:
+        story.append(Paragraph("No hay datos disponibles", estilos['CustomNormal']))
+        return
+
+    table = Table(bloque['data'], colWidths=bloque.get('col_widths'))
+    table.setStyle(_estilo_tabla(tema))
+    story.append(table)
+    story.append(Spacer(1, 0.3 * inch))
+
+
+def construir_pdf(spec):
+    """Convierte una especificación (ver docstring del módulo) en bytes de PDF."""
+    tema = Tema(**spec['tema']) if spec.get('tema') else TEMA_BASE
+    estilos = _estilos(tema)
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=letter,
+        rightMargin=0.75 * inch,
+        leftMargin=0.75 * inch,
+        topMargin=1 * inch,
+        bottomMargin=0.75 * inch
+    )
+
+    story = []
+    for bloque in spec['bloques']:
+        tipo = bloque['tipo']
+        if tipo == 'header':
+            story.append(Paragraph(spec['tenant_name'], estilos['CustomTitle']))
+            story.append(Paragraph(spec['title'], estilos['CustomSubtitle']))
+            story.append(Paragraph(f"<i>Generado el: {bloque['fecha']}</i>", estilos['CustomNormal']))
+            story.append(Spacer(1, 0.3 * inch))
+        elif tipo == 'table':
+            _agregar_tabla(story, estilos, tema, bloque)
+        elif tipo == 'paragraph':
+            story.append(Paragraph(bloque['text'], estilos[bloque.get('style', 'CustomNormal')]))
+            story.append(Spacer(1, 0.1 * inch))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _precalentar():
+    """Inicializador de cada proceso: estilos, estilo de tabla y fuentes cargados."""
+    construir_pdf({
+        'title': '', 'tenant_name': '',
+        'bloques': [{'tipo': 'table', 'data': [['a'], ['b']], 'col_widths': None, 'title': None}],
+    })
+
+
+# ============================================================================
+# POOL DE PROCESOS
+# ============================================================================
+
+_pool = None
+_pool_lock = threading.Lock()
+_cupos = threading.BoundedSemaphore(MAX_CONCURRENTES)
+
+
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: no se hereda el estado de los hilos del servidor
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_precalentar,
+            )
+        return _pool
+
+
+def _descartar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _filas(spec):
+    return sum(len(bloque['data']) for bloque in spec['bloques'] if bloque['tipo'] == 'table')
+
+
+def renderizar_pdf(spec):
+    """
+    Renderiza ``spec`` y devuelve los bytes del PDF.
+
+    Usa el pool de procesos si está habilitado, el documento es grande y hay
+    cupo; en cualquier otro caso (o si el pool falla) renderiza en el proceso.
+    """
+    if PDF_WORKERS <= 0 or _filas(spec) < MIN_FILAS_POOL:
+        return construir_pdf(spec)
+
+    if not _cupos.acquire(timeout=ESPERA_POOL):
+        logger.warning("⚠️ Pool de PDF saturado, renderizando en el proceso")
+        return construir_pdf(spec)
+    try:
+        return _obtener_pool().submit(construir_pdf, spec).result(timeout=TIMEOUT)
+    except FuturoTimeout:
+        # Repetirlo en el proceso tardaría lo mismo
+        raise
+    except BrokenProcessPool:
+        logger.error("Pool de PDF caído, se recrea en el próximo uso")
+        _descartar_pool()
+    except Exception as e:
+        logger.error(f"Error renderizando PDF en el pool: {str(e)}")
+    finally:
+        _cupos.release()
+    return construir_pdf(spec)
@@ -0,0 +1,149 @@
+"""
+Proyección de columnas para los reportes.
+
+Cada reporte declara sus columnas de salida y de qué campos del ORM depende
+cada una. ``Proyeccion`` deriva de ahí la lista mínima de campos y construye
+las filas directamente desde las tuplas de ``values_list()``, sin instanciar
+modelos ni traer columnas que el reporte no usa.
+
+Ejemplo:
+    proyeccion = Proyeccion(
+        Columna('codigo'),
+        Columna('categoria', 'categoria__nombre'),
+        Columna('valor_total', 'stock_actual', 'precio_costo',
+                calcular=lambda stock, costo: format_currency(stock * costo)),
+    )
+    data = proyeccion.filas(Insumo.objects.filter(...))
+
+Si alguna columna necesita la instancia (``instancia=True``, p. ej. para un
+método del modelo), se usa ``only()`` con los mismos campos como respaldo.
+"""
+
+
+def nombre_completo(nombre, apellido):
+    """Equivalente a ``Usuario.full_name`` a partir de las columnas."""
+    return f"{nombre or ''} {apellido or ''}".strip()
+
+
+def display(choices):
+    """Formateador que devuelve la etiqueta legible de un campo con choices."""
+    etiquetas = dict(choices)
+    return lambda valor: etiquetas.get(valor, valor)
+
+
+class Columna:
+    """
+    Columna de salida de un reporte.
+
+    - ``salida``: clave en la fila resultante.
+    - ``campos``: rutas del ORM de las que depende (por defecto ``salida``).
+    - ``calcular``: función que recibe los valores de ``campos`` en orden.
+    - ``instancia``: si es True, ``calcular`` recibe la instancia del modelo;
+      ``campos`` indica entonces qué columnas cargar con ``only()``.
+    """
+
+    __slots__ = ('salida', 'campos', 'calcular', 'instancia')
+
+    def __init__(self, salida, *campos, calcular=None, instancia=False):
+        self.salida = salida
+        self.campos = campos or (() if instancia else (salida,))
+        self.calcular = calcular
+        self.instancia = instancia
+
+    def valor_desde_tupla(self, valores):
+        if self.calcular is None:
+            return valores[0]
+        return self.calcular(*valores)
+
+    def valor_desde_instancia(self, objeto):
+        if self.instancia:
+            return self.calcular(objeto)
+        valores = [_atributo(objeto, campo) for campo in self.campos]
+        return self.valor_desde_tupla(valores)
+
+
+def _atributo(objeto, ruta):
+    """Resuelve ``paciente__usuario__email`` sobre una instancia."""
+    for parte in ruta.split('__'):
+        if objeto is None:
+            return None
+        objeto = getattr(objeto, parte)
+    return objeto
+
+
+class Proyeccion:
+    """Conjunto de columnas de un reporte y la lista mínima de campos que leen."""
+
+    def __init__(self, *columnas):
+        self.columnas = columnas
+        campos = []
+        for columna in columnas:
+            for campo in columna.campos:
+                if campo not in campos:
+                    campos.append(campo)
+        self.campos = campos
+        # Posición de cada campo de cada columna dentro de la tupla
+        self._posiciones = [
+            None if columna.instancia else [campos.index(campo) for campo in columna.campos]
+            for columna in columnas
+        ]
+
+    @property
+    def requiere_instancia(self):
+        return any(columna.instancia for columna in self.columnas)
+
+    @property
+    def encabezados(self):
+        return [columna.salida for columna in self.columnas]
+
+    def filas(self, queryset, limite=None):
+        """Lista de dicts ``{salida: valor}`` para ``queryset``."""
+        if self.requiere_instancia:
+            return self._filas_desde_instancias(queryset, limite)
+
+        tuplas = queryset.values_list(*self.campos)
+        if limite is not None:
+            tuplas = tuplas[:limite]
+
+        pares = list(zip(self.columnas, self._posiciones))
+        return [
+            {
+                columna.salida: columna.valor_desde_tupla([tupla[i] for i in posiciones])
+                for columna, posiciones in pares
+            }
+            for tupla in tuplas
+        ]
+
+    def iterar(self, queryset, chunk_size=2000):
+        """
+        Filas como listas (en el orden de ``encabezados``) a medida que llegan
+        de la base de datos. Usa ``iterator()``, así que la memoria no crece con
+        la cantidad de filas: pensado para exportar sin límite.
+        """
+        if self.requiere_instancia:
+            for objeto in self._con_instancias(queryset).iterator(chunk_size=chunk_size):
+                yield [columna.valor_desde_instancia(objeto) for columna in self.columnas]
+            return
+
+        pares = list(zip(self.columnas, self._posiciones))
+        for tupla in queryset.values_list(*self.campos).iterator(chunk_size=chunk_size):
+            yield [columna.valor_desde_tupla([tupla[i] for i in posiciones]) for columna, posiciones in pares]
+
+    def _con_instancias(self, queryset):
+        relaciones = sorted({
+            campo.rsplit('__', 1)[0]
+            for campo in self.campos if '__' in campo
+        })
+        # only() no acepta anotaciones; esas llegan igual en la instancia
+        anotaciones = set(queryset.query.annotations)
+        campos = [campo for campo in self.campos if campo.split('__', 1)[0] not in anotaciones]
+        return queryset.select_related(*relaciones).only(*campos) if campos else queryset
+
+    def _filas_desde_instancias(self, queryset, limite):
+        queryset = self._con_instancias(queryset)
+        if limite is not None:
+            queryset = queryset[:limite]
+        return [
+            {columna.salida: columna.valor_desde_instancia(objeto) for columna in self.columnas}
+            for objeto in queryset
+        ]
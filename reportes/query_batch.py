@@ -0,0 +1,132 @@
+"""
+Agrupación y ejecución paralela de consultas independientes para reportes.
+
+Los endpoints de estadísticas ejecutan muchas llamadas ``count()`` /
+``aggregate()`` independientes. ``AggregateBatch`` fusiona en una sola consulta
+los agregados que comparten modelo y filtros base (usando agregados
+condicionales ``filter=Q(...)``) y luego ejecuta los lotes restantes en
+paralelo, cada uno con su propia conexión a la base de datos.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django_tenants.utils import schema_context
+
+logger = logging.getLogger(__name__)
+
+# Hilos máximos por request para consultas de reportes
+QUERY_WORKERS = getattr(settings, 'REPORTES_QUERY_WORKERS', 4)
+
+
+def _ejecutar_en_hilo(funcion, schema_name):
+    """
+    Ejecuta ``funcion`` en un hilo del pool usando el esquema del tenant.
+
+    Cada hilo tiene su propia conexión (Django las guarda por hilo), por lo que
+    se cierra al terminar para no dejar conexiones abiertas en el pool.
+    """
+    try:
+        if schema_name:
+            with schema_context(schema_name):
+                return funcion()
+        return funcion()
+    finally:
+        connection.close()
+
+
+def puede_paralelizar():
+    """
+    Indica si es seguro abrir conexiones adicionales.
+
+    Dentro de una transacción (por ejemplo en los tests) las otras conexiones
+    no verían los datos no confirmados, así que se ejecuta secuencialmente.
+    """
+    return QUERY_WORKERS > 1 and not connection.in_atomic_block
+
+
+def ejecutar_en_paralelo(funciones, max_workers=None):
+    """
+    Ejecuta un diccionario ``{nombre: callable}`` y devuelve ``{nombre: resultado}``.
+
+    Usa un pool de hilos pequeño con una conexión por hilo, conservando el
+    esquema del tenant actual. Si no es seguro paralelizar, ejecuta en orden.
+    """
+    if not funciones:
+        return {}
+
+    max_workers = min(max_workers or QUERY_WORKERS, len(funciones))
+    if max_workers <= 1 or not puede_paralelizar():
+        return {nombre: funcion() for nombre, funcion in funciones.items()}
+
+    schema_name = getattr(connection, 'schema_name', None)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {
+            nombre: executor.submit(_ejecutar_en_hilo, funcion, schema_name)
+            for nombre, funcion in funciones.items()
+        }
+        return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+
+
+class AggregateBatch:
+    """
+    Lote de agregados independientes.
+
+    Ejemplo:
+        lote = AggregateBatch()
+        lote.add(Cita.objects.filter(fecha_hora__month=11),
+                 total=Count('id'),
+                 atendidas=Count('id', filter=Q(estado='ATENDIDA')))
+        lote.add(Pago.objects.all(), ingresos=Sum('monto_pagado'))
+        resultados = lote.execute()  # {'total': 10, 'atendidas': 4, 'ingresos': ...}
+
+    Los agregados añadidos sobre querysets equivalentes (mismo modelo y misma
+    consulta SQL) se fusionan en un único ``aggregate()``. ``consultas_ejecutadas``
+    es la cantidad real de consultas que emite ``execute()``; cuántas habría
+    hecho el código sin lote depende de cómo se escribieron (un ``count()`` por
+    métrica o un ``aggregate()`` con varias), así que no se estima aquí.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._grupos = {}
+        self._aliases = set()
+
+    def add(self, queryset, **aggregates):
+        """Añade agregados con alias únicos sobre ``queryset``."""
+        duplicados = self._aliases.intersection(aggregates)
+        if duplicados:
+            raise ValueError(f"Alias de agregado duplicados: {', '.join(sorted(duplicados))}")
+
+        clave = (queryset.model._meta.label, str(queryset.query))
+        if clave not in self._grupos:
+            self._grupos[clave] = (queryset, {})
+        self._grupos[clave][1].update(aggregates)
+
+        self._aliases.update(aggregates)
+        return self
+
+    @property
+    def agregados(self):
+        return len(self._aliases)
+
+    @property
+    def consultas_ejecutadas(self):
+        return len(self._grupos)
+
+    def execute(self):
+        """Ejecuta los lotes (en paralelo si es posible) y devuelve ``{alias: valor}``."""
+        funciones = {
+            clave: (lambda qs=queryset, ag=aggregates: qs.aggregate(**ag))
+            for clave, (queryset, aggregates) in self._grupos.items()
+        }
+        resultados = {}
+        for parcial in ejecutar_en_paralelo(funciones, self.max_workers).values():
+            resultados.update(parcial)
+
+        logger.info(
+            f"📦 AggregateBatch: {self.agregados} agregados en "
+            f"{self.consultas_ejecutadas} consultas"
+        )
+        return resultados
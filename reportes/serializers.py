@@ -197,7 +197,15 @@ class BitacoraSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'fecha_hora']
     
     def get_usuario(self, obj):
-        """Devuelve información completa del usuario"""
+        """Devuelve información completa del usuario (desde el snapshot, sin join)"""
+        if obj.usuario_nombre:
+            return {
+                'id': obj.usuario_id,
+                'nombre_completo': obj.usuario_nombre,
+                'email': obj.usuario_email,
+                'tipo_usuario': obj.usuario_tipo
+            }
+        # Registros anteriores al snapshot (ver completar_snapshots_bitacora)
         if obj.usuario:
             return {
                 'id': obj.usuario.id,
@@ -214,6 +222,8 @@ class BitacoraSerializer(serializers.ModelSerializer):
     
     def get_modelo(self, obj):
         """Devuelve el nombre del modelo afectado"""
-        if obj.content_type:
+        if obj.modelo:
+            return obj.modelo
+        if obj.content_type_id:
             return obj.content_type.model
         return None
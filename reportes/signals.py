@@ -5,10 +5,15 @@ NOTA: Los signals de user_logged_in y user_logged_out no funcionan con JWT.
 El registro de login se hace directamente en CustomTokenObtainPairView.
 """
 
+import logging
+
 from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from reportes.models import BitacoraAccion
+from reportes.models import BitacoraAccion, BitacoraContador, ResumenPaciente
+
+logger = logging.getLogger(__name__)
 
 
 # Los signals de login/logout están desactivados porque se usa JWT
@@ -33,3 +38,147 @@ def get_client_ip(request):
     else:
         ip = request.META.get('REMOTE_ADDR')
     return ip
+
+
+# ============================================================================
+# RESUMEN MATERIALIZADO DE PACIENTES
+# ============================================================================
+
+def _programar_resumen(paciente_id):
+    """Recalcula el resumen del paciente cuando la transacción se confirma."""
+    if not paciente_id:
+        return
+    
+    def actualizar():
+        try:
+            ResumenPaciente.actualizar(paciente_id)
+        except Exception as e:
+            logger.error(f"Error actualizando resumen del paciente {paciente_id}: {str(e)}")
+    
+    transaction.on_commit(actualizar)
+
+
+@receiver(post_save, sender='agenda.Cita')
+@receiver(post_delete, sender='agenda.Cita')
+@receiver(post_save, sender='facturacion.Factura')
+@receiver(post_delete, sender='facturacion.Factura')
+def actualizar_resumen_paciente(sender, instance, **kwargs):
+    """Mantiene ResumenPaciente al guardar/eliminar citas y facturas."""
+    _programar_resumen(instance.paciente_id)
+
+
+@receiver(post_save, sender='facturacion.Pago')
+@receiver(post_delete, sender='facturacion.Pago')
+def actualizar_resumen_paciente_pago(sender, instance, **kwargs):
+    """Los pagos afectan el total pagado del paciente de la factura."""
+    from facturacion.models import Factura
+    
+    paciente_id = (
+        Factura.objects.filter(pk=instance.factura_id)
+        .values_list('paciente_id', flat=True)
+        .first()
+    )
+    _programar_resumen(paciente_id)
+
+
+# ============================================================================
+# ÍNDICE DE NOMBRES PARA COMANDOS DE VOZ
+# ============================================================================
+
+CAMPOS_NOMBRE = {'first_name', 'last_name', 'is_active'}
+
+
+@receiver(post_save, sender='usuarios.Usuario')
+@receiver(post_delete, sender='usuarios.Usuario')
+@receiver(post_save, sender='usuarios.PerfilPaciente')
+@receiver(post_delete, sender='usuarios.PerfilPaciente')
+@receiver(post_save, sender='usuarios.PerfilOdontologo')
+@receiver(post_delete, sender='usuarios.PerfilOdontologo')
+def invalidar_indice_nombres(sender, instance, update_fields=None, **kwargs):
+    """Descarta el índice de nombres del tenant cuando la transacción se confirma."""
+    # Guardados parciales que no tocan el nombre (p. ej. last_login en cada login)
+    if update_fields and not CAMPOS_NOMBRE & set(update_fields):
+        return
+    from django.db import connection
+    from reportes.nlp import nombres
+
+    schema_name = getattr(connection, 'schema_name', None)
+    transaction.on_commit(lambda: nombres.invalidar(schema_name))
+
+
+# ============================================================================
+# VERSIÓN DE DATOS DE LOS SNAPSHOTS DE REPORTES
+# ============================================================================
+
+def invalidar_snapshots(sender, instance, update_fields=None, **kwargs):
+    """Incrementa la versión de datos del tenant cuando la transacción se confirma."""
+    # El login solo actualiza last_login, que ningún reporte usa
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    from reportes import snapshots
+
+    def invalidar():
+        try:
+            snapshots.invalidar()
+        except Exception as e:
+            logger.error(f"Error actualizando la versión de datos de reportes: {str(e)}")
+
+    transaction.on_commit(invalidar)
+
+
+def _conectar_version_datos():
+    from reportes import snapshots
+    for label in snapshots.MODELOS_VERSION:
+        post_save.connect(invalidar_snapshots, sender=label, dispatch_uid=f'snapshots_guardado_{label}')
+        post_delete.connect(invalidar_snapshots, sender=label, dispatch_uid=f'snapshots_eliminacion_{label}')
+
+
+_conectar_version_datos()
+
+
+# ============================================================================
+# CONTADORES DE BITÁCORA
+# ============================================================================
+
+@receiver(post_save, sender=BitacoraAccion)
+def incrementar_contador_bitacora(sender, instance, created, **kwargs):
+    """Actualiza los contadores diarios al registrar una acción."""
+    if not created:
+        return
+    try:
+        BitacoraContador.incrementar(instance)
+    except Exception as e:
+        logger.error(f"Error actualizando contadores de bitácora: {str(e)}")
+
+
+# ============================================================================
+# AUDITORÍA AUTOMÁTICA DE MODELOS
+# ============================================================================
+
+def auditar_guardado(sender, instance, created, raw=False, **kwargs):
+    """Registra CREAR/EDITAR de los modelos en REPORTES_AUDITORIA_MODELOS."""
+    if raw:
+        return
+    from reportes import auditoria
+    if created:
+        auditoria.registrar_cambio_modelo(instance, 'CREAR', 'Creó')
+    else:
+        auditoria.registrar_cambio_modelo(instance, 'EDITAR', 'Editó')
+
+
+def auditar_eliminacion(sender, instance, **kwargs):
+    """Registra ELIMINAR de los modelos en REPORTES_AUDITORIA_MODELOS."""
+    from reportes import auditoria
+    auditoria.registrar_cambio_modelo(instance, 'ELIMINAR', 'Eliminó')
+
+
+def _conectar_auditoria():
+    from reportes import auditoria
+    if not auditoria.AUDITORIA_AUTOMATICA:
+        return
+    for label in auditoria.MODELOS_AUDITADOS:
+        post_save.connect(auditar_guardado, sender=label, dispatch_uid=f'auditoria_guardado_{label}')
+        post_delete.connect(auditar_eliminacion, sender=label, dispatch_uid=f'auditoria_eliminacion_{label}')
+
+
+_conectar_auditoria()
@@ -0,0 +1,302 @@
+"""
+Snapshots pre-generados de reportes por tenant.
+
+Un programador nocturno (``python manage.py generar_snapshots_reportes``)
+renderiza en horario de baja carga los reportes configurados de cada tenant en
+JSON, PDF y Excel, y los guarda en ``ReporteSnapshot`` con la versión de los
+datos. Las acciones decoradas con ``@servir_snapshot`` devuelven directamente
+el snapshot si coincide reporte, parámetros, formato, día y versión de datos.
+
+La versión de datos es un contador por tenant (``VersionDatosReportes``) que
+los signals de post_save/post_delete de MODELOS_VERSION incrementan al
+confirmar cada transacción; leerla es una consulta por clave primaria. Los
+``QuerySet.update()`` no emiten signals: quien actualice estos modelos en
+bloque debe llamar a ``snapshots.invalidar()``.
+
+Configuración (settings.py):
+    REPORTES_SNAPSHOTS = [
+        {'reporte': 'dashboard-kpis'},
+        {'reporte': 'reporte-financiero', 'parametros': {'periodo': '{mes_anterior}'}},
+    ]
+    REPORTES_SNAPSHOTS_FORMATOS = ['json', 'pdf', 'excel']
+    REPORTES_SNAPSHOTS_HORA = 2        # hora local de ejecución con --loop
+    REPORTES_SNAPSHOTS_DIAS = 7        # días que se conservan
+
+Marcadores disponibles en los parámetros: {hoy}, {mes_actual}, {mes_anterior},
+{anio_actual}. ``?fresco=1`` (o ``true``) fuerza el cálculo en vivo. Las respuestas
+servidas desde un snapshot llevan Last-Modified y X-Snapshot-Generado.
+"""
+import functools
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from .models import ReporteSnapshot, VersionDatosReportes
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOTS = getattr(settings, 'REPORTES_SNAPSHOTS', [
+    {'reporte': 'dashboard-kpis'},
+    {'reporte': 'estadisticas-generales'},
+    {'reporte': 'reporte-financiero'},
+    {'reporte': 'reporte-financiero', 'parametros': {'periodo': '{mes_anterior}'}},
+    {'reporte': 'reporte-pacientes'},
+    {'reporte': 'reporte-tratamientos'},
+    {'reporte': 'reporte-inventario'},
+    {'reporte': 'antiguedad-saldos'},
+])
+FORMATOS = getattr(settings, 'REPORTES_SNAPSHOTS_FORMATOS', ['json', 'pdf', 'excel'])
+HORA = getattr(settings, 'REPORTES_SNAPSHOTS_HORA', 2)
+DIAS_CONSERVAR = getattr(settings, 'REPORTES_SNAPSHOTS_DIAS', 7)
+
+# Modelos que consulta cada reporte con snapshot (incluidos los de sus joins,
+# p. ej. categoria__nombre o los nombres de odontólogos). Un reporte nuevo en
+# REPORTES_SNAPSHOTS debe declararse aquí.
+MODELOS_POR_REPORTE = {
+    'dashboard-kpis': [
+        'agenda.Cita', 'facturacion.Factura', 'facturacion.Pago', 'tratamientos.PlanDeTratamiento',
+        'tratamientos.ItemPlanTratamiento', 'tratamientos.Servicio', 'usuarios.PerfilPaciente', 'usuarios.Usuario',
+    ],
+    'estadisticas-generales': [
+        'agenda.Cita', 'facturacion.Factura', 'facturacion.Pago', 'tratamientos.PlanDeTratamiento',
+        'tratamientos.ItemPlanTratamiento', 'usuarios.PerfilPaciente', 'usuarios.PerfilOdontologo',
+        'usuarios.Usuario',
+    ],
+    'reporte-financiero': ['facturacion.Factura', 'facturacion.Pago'],
+    'reporte-pacientes': ['usuarios.PerfilPaciente', 'usuarios.Usuario', 'reportes.ResumenPaciente'],
+    'reporte-tratamientos': [
+        'tratamientos.PlanDeTratamiento', 'tratamientos.ItemPlanTratamiento', 'tratamientos.Servicio',
+        'usuarios.PerfilPaciente', 'usuarios.PerfilOdontologo', 'usuarios.Usuario',
+    ],
+    'reporte-inventario': ['inventario.Insumo', 'inventario.CategoriaInsumo'],
+    'antiguedad-saldos': ['facturacion.Factura', 'facturacion.Pago', 'usuarios.PerfilPaciente', 'usuarios.Usuario'],
+}
+
+# Modelos cuyos cambios incrementan la versión de datos (ver signals.py)
+MODELOS_VERSION = sorted({modelo for modelos in MODELOS_POR_REPORTE.values() for modelo in modelos})
+
+# Parámetros que no forman parte de la clave del snapshot
+PARAMETROS_IGNORADOS = ('formato', 'fresco')
+
+
+# ============================================================================
+# CLAVE DEL SNAPSHOT
+# ============================================================================
+
+def version_datos():
+    """Versión de los datos del tenant actual (cambia con cada escritura)."""
+    return str(VersionDatosReportes.actual())
+
+
+def invalidar():
+    """Marca como desactualizados los snapshots del tenant actual."""
+    VersionDatosReportes.incrementar()
+
+
+def normalizar_parametros(parametros):
+    return {
+        clave: valor for clave, valor in sorted(parametros.items())
+        if clave not in PARAMETROS_IGNORADOS
+    }
+
+
+def hash_parametros(parametros):
+    contenido = json.dumps(normalizar_parametros(parametros), sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def normalizar_formato(formato):
+    formato = (formato or '').lower()
+    return formato if formato in ('pdf', 'excel') else 'json'
+
+
+def resolver_parametros(parametros, hoy):
+    """Reemplaza los marcadores ({mes_anterior}, ...) de la configuración."""
+    anterior = hoy.replace(day=1) - timedelta(days=1)
+    marcadores = {
+        'hoy': hoy.isoformat(),
+        'mes_actual': f"{hoy:%Y-%m}",
+        'mes_anterior': f"{anterior:%Y-%m}",
+        'anio_actual': f"{hoy:%Y}",
+    }
+    return {
+        clave: valor.format(**marcadores) if isinstance(valor, str) else valor
+        for clave, valor in parametros.items()
+    }
+
+
+# ============================================================================
+# LECTURA
+# ============================================================================
+
+def buscar(reporte, parametros, formato):
+    """Snapshot vigente (mismo día y versión de datos) o None."""
+    candidato = (
+        ReporteSnapshot.objects
+        .filter(
+            reporte=reporte,
+            parametros_hash=hash_parametros(parametros),
+            formato=normalizar_formato(formato),
+            fecha=timezone.localdate(),
+        )
+        .order_by('-creado')
+        .values('id', 'version_datos')
+        .first()
+    )
+    # Solo se calcula la versión de datos si hay un candidato
+    if candidato is None or candidato['version_datos'] != version_datos():
+        return None
+    return ReporteSnapshot.objects.get(pk=candidato['id'])
+
+
+def a_respuesta(snapshot):
+    """
+    Respuesta con el contenido guardado. Los encabezados indican cuándo se
+    generó (el "Generado el" de un PDF/Excel es la hora de la generación).
+    """
+    response = HttpResponse(bytes(snapshot.contenido), content_type=snapshot.content_type)
+    if snapshot.content_disposition:
+        response['Content-Disposition'] = snapshot.content_disposition
+    response['Last-Modified'] = http_date(snapshot.creado.timestamp())
+    response['X-Snapshot-Generado'] = snapshot.creado.isoformat()
+    response['X-Reporte-Snapshot'] = snapshot.creado.isoformat()
+    return response
+
+
+def pide_fresco(request):
+    return request.query_params.get('fresco', '').lower() in ('1', 'true', 'si', 'sí')
+
+
+def servir_snapshot(funcion):
+    """
+    Decorador para acciones de ReportesViewSet: sirve el snapshot vigente.
+
+    Se aplica debajo de ``@action``; el reporte es el nombre de la acción con
+    guiones (igual que su ``url_path``).
+    """
+    reporte = funcion.__name__.replace('_', '-')
+
+    @functools.wraps(funcion)
+    def envoltura(self, request, *args, **kwargs):
+        if not pide_fresco(request):
+            try:
+                snapshot = buscar(reporte, request.query_params.dict(), request.query_params.get('formato'))
+            except Exception as e:
+                logger.error(f"Error buscando snapshot de {reporte}: {str(e)}")
+                snapshot = None
+            if snapshot is not None:
+                logger.info(f"📸 Sirviendo snapshot de {reporte} ({snapshot.formato})")
+                return a_respuesta(snapshot)
+        return funcion(self, request, *args, **kwargs)
+
+    return envoltura
+
+
+# ============================================================================
+# GENERACIÓN
+# ============================================================================
+
+class SnapshotDependeDelUsuario(RuntimeError):
+    """El reporte leyó el usuario del request: su salida no se puede compartir."""
+
+
+class _SinUsuario:
+    """
+    Autenticador del request de generación: cualquier acceso a ``request.user``
+    falla. Un snapshot se sirve a todos los usuarios del tenant, así que un
+    reporte que dependa del usuario no puede tener snapshot.
+    """
+
+    def __init__(self, reporte):
+        self.reporte = reporte
+
+    def authenticate(self, request):
+        raise SnapshotDependeDelUsuario(
+            f"{self.reporte} lee request.user y no puede generarse como snapshot"
+        )
+
+
+def renderizar(reporte, parametros, formato, tenant):
+    """
+    Ejecuta el reporte y devuelve ``(contenido, content_type, disposition)``.
+
+    Llama directamente a la acción de ReportesViewSet (sin el decorador de
+    snapshot ni el circuito de autenticación/permisos): los reportes solo leen
+    los query params y el tenant del request. Si leen ``request.user`` se
+    lanza SnapshotDependeDelUsuario.
+    """
+    from django.http import HttpRequest, QueryDict
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from .views import ReportesViewSet
+
+    query = QueryDict(mutable=True)
+    query.update(parametros)
+    if formato != 'json':
+        query['formato'] = formato
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = query
+    http_request.tenant = tenant
+    request = Request(http_request, authenticators=[_SinUsuario(reporte)])
+
+    construir = getattr(ReportesViewSet, reporte.replace('-', '_')).__wrapped__
+    response = construir(ReportesViewSet(request=request, format_kwarg=None), request)
+    if response.status_code != 200:
+        raise ValueError(f"{reporte} respondió {response.status_code}")
+    if hasattr(response, 'data'):
+        return JSONRenderer().render(response.data), 'application/json', ''
+    return response.content, response['Content-Type'], response.get('Content-Disposition', '')
+
+
+def generar(tenant, configuracion=None, formatos=None):
+    """
+    Genera los snapshots del tenant actual que falten para hoy y la versión actual.
+
+    Devuelve la cantidad de snapshots creados.
+    """
+    hoy = timezone.localdate()
+    version = version_datos()
+    creados = 0
+    for entrada in configuracion or SNAPSHOTS:
+        reporte = entrada['reporte']
+        parametros = normalizar_parametros(resolver_parametros(entrada.get('parametros', {}), hoy))
+        parametros_hash = hash_parametros(parametros)
+
+        for formato in entrada.get('formatos', formatos or FORMATOS):
+            formato = normalizar_formato(formato)
+            existente = ReporteSnapshot.objects.filter(
+                reporte=reporte, parametros_hash=parametros_hash, formato=formato,
+                fecha=hoy, version_datos=version,
+            ).exists()
+            if existente:
+                continue
+            try:
+                contenido, content_type, disposition = renderizar(reporte, parametros, formato, tenant)
+            except SnapshotDependeDelUsuario:
+                raise
+            except Exception as e:
+                logger.error(f"Error generando snapshot {reporte} ({formato}) en {tenant.schema_name}: {str(e)}")
+                continue
+            ReporteSnapshot.objects.create(
+                reporte=reporte,
+                parametros=parametros,
+                parametros_hash=parametros_hash,
+                formato=formato,
+                fecha=hoy,
+                version_datos=version,
+                contenido=contenido,
+                content_type=content_type,
+                content_disposition=disposition,
+            )
+            creados += 1
+
+    ReporteSnapshot.objects.filter(fecha__lt=hoy - timedelta(days=DIAS_CONSERVAR)).delete()
+    logger.info(f"📸 {tenant.schema_name}: {creados} snapshots de reportes generados")
+    return creados
@@ -0,0 +1,21 @@
+"""
+Utilidades para ejecutar tareas de reportes en cada tenant (django-tenants).
+"""
+from django_tenants.utils import get_public_schema_name, get_tenant_model, tenant_context
+
+
+def iterar_tenants(schema_name=None):
+    """
+    Itera los tenants (excluye ``public``) activando su esquema en cada paso.
+
+    Ejemplo:
+        for tenant in iterar_tenants():
+            ResumenPaciente.reconstruir()  # se ejecuta en el esquema del tenant
+    """
+    tenants = get_tenant_model().objects.exclude(schema_name=get_public_schema_name())
+    if schema_name:
+        tenants = tenants.filter(schema_name=schema_name)
+    
+    for tenant in tenants.order_by('schema_name'):
+        with tenant_context(tenant):
+            yield tenant
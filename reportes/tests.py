@@ -1,3 +1,1201 @@
-from django.test import TestCase
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from django_tenants.utils import schema_context
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from agenda.models import Cita
+from facturacion.models import Factura, Pago
+from inventario.models import CategoriaInsumo, Insumo
+from tratamientos.models import ItemPlanTratamiento
+from usuarios.models import PerfilOdontologo, PerfilPaciente
+
+from . import analytics, archive, auditoria, bundle, exporters, integridad, snapshots, themes, voice_views
+from .expressions import saldo_factura
+from .indexes import INDICES_REPORTES, aplicar_indices, quitar_indices
+from .models import BitacoraAccion, BitacoraContador, PuntoControlBitacora, ResumenPaciente, peso_muestreo
+from .nlp import matcher
+from .nlp.nombres import IndiceNombres, Persona
+from .nlp.corpus import CORPUS, CORPUS_MULTIPLE, FECHA_REFERENCIA, diferencias
+from .query_batch import AggregateBatch
+from .utils import MoneyAccumulator, format_currency, format_date, seleccionar_campos
+from .views import PROYECCION_PACIENTES, BitacoraViewSet, ReportesViewSet
+
+
+def crear_paciente(email, nombre='Ana'):
+    usuario = get_user_model().objects.create(
+        email=email, first_name=nombre, last_name='Paz', tipo_usuario='PACIENTE'
+    )
+    return PerfilPaciente.objects.create(usuario=usuario, fecha_nacimiento=date(1990, 1, 1))
+
+
+def crear_odontologo(email, nombre='Luis'):
+    usuario = get_user_model().objects.create(
+        email=email, first_name=nombre, last_name='Vega', tipo_usuario='ODONTOLOGO'
+    )
+    return PerfilOdontologo.objects.create(usuario=usuario, especialidad='General', cedulaProfesional='CP-001')
+
+
+def crear_factura(paciente, monto_total):
+    return Factura.objects.create(paciente=paciente, monto_total=monto_total, estado='PENDIENTE')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'La verificación con EXPLAIN requiere PostgreSQL')
+class IndicesReportesTests(TenantTestCase):
+    """Verifica con EXPLAIN que las consultas de reportes usan sus índices."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        aplicar_indices()
+
+    def assertUsaIndice(self, queryset, nombre_indice):
+        # Con tablas casi vacías el planner prefiere seq scan; se desactiva
+        # solo dentro de la transacción del test.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertIn(nombre_indice, plan, plan)
+
+    def test_revertir_y_reaplicar(self):
+        nombres = [index.name for _, index in INDICES_REPORTES]
+        self.assertEqual(quitar_indices(), nombres)
+        self.assertEqual(quitar_indices(), [])
+        self.assertEqual(aplicar_indices(), nombres)
+        self.assertEqual(aplicar_indices(), [])
+
+    def test_citas_por_odontologo_y_mes(self):
+        inicio = timezone.now() - timezone.timedelta(days=30)
+        self.assertUsaIndice(
+            Cita.objects.filter(odontologo_id=1, fecha_hora__gte=inicio, estado='ATENDIDA'),
+            'rep_cita_odo_fecha_est_idx'
+        )
+
+    def test_pagos_completados_por_fecha(self):
+        inicio = timezone.now() - timezone.timedelta(days=30)
+        self.assertUsaIndice(
+            Pago.objects.filter(estado_pago='COMPLETADO', fecha_pago__gte=inicio).values('monto_pagado'),
+            'rep_pago_estado_fecha_idx'
+        )
+
+    def test_facturas_pendientes_por_fecha(self):
+        self.assertUsaIndice(
+            Factura.objects.filter(estado='PENDIENTE', fecha_emision__lt=timezone.now()),
+            'rep_factura_pend_fecha_idx'
+        )
+
+    def test_items_por_servicio_y_estado(self):
+        self.assertUsaIndice(
+            ItemPlanTratamiento.objects.filter(servicio_id=1, estado='COMPLETADO'),
+            'rep_item_serv_estado_idx'
+        )
+
+    def test_bitacora_por_modelo(self):
+        nombre = next(
+            index.name for index in BitacoraAccion._meta.indexes
+            if index.fields == ['modelo', '-fecha_hora']
+        )
+        self.assertUsaIndice(
+            BitacoraAccion.objects.filter(modelo='cita').order_by('-fecha_hora'),
+            nombre
+        )
+
+
+class CadenaBitacoraTests(TenantTestCase):
+    """Cadena de hashes de la bitácora y sus puntos de control."""
+
+    def registrar(self, descripcion, usuario=None):
+        return BitacoraAccion.objects.create(accion='OTRO', descripcion=descripcion, usuario=usuario)
+
+    def test_cadena_valida(self):
+        for numero in range(3):
+            self.registrar(f'Acción {numero}')
+        resultado = integridad.verificar(desde_cero=True)
+        self.assertEqual(resultado['errores'], [])
+        self.assertGreaterEqual(resultado['filas'], 3)
+
+    def test_contenido_modificado(self):
+        registro = self.registrar('Original')
+        self.registrar('Siguiente')
+        BitacoraAccion.objects.filter(pk=registro.pk).update(descripcion='Alterado')
+        errores = integridad.verificar(desde_cero=True)['errores']
+        self.assertIn({'id': registro.pk, 'motivo': 'contenido modificado'}, errores)
+
+    def test_eliminar_usuario_no_rompe_la_cadena(self):
+        usuario = get_user_model().objects.create(
+            email='auditado@clinica-demo.com', first_name='Ana', last_name='Ruiz', tipo_usuario='ODONTOLOGO'
+        )
+        registro = self.registrar('Acción del usuario', usuario=usuario)
+        self.registrar('Otra acción', usuario=usuario)
+
+        usuario.delete()  # SET_NULL en usuario_id
+
+        registro.refresh_from_db()
+        self.assertIsNone(registro.usuario_id)
+        self.assertEqual(registro.usuario_email, 'auditado@clinica-demo.com')
+        self.assertEqual(integridad.verificar(desde_cero=True)['errores'], [])
+
+    def test_registro_sin_hash(self):
+        self.registrar('Legítima')
+        falso = BitacoraAccion.objects.bulk_create([
+            BitacoraAccion(accion='OTRO', descripcion='Insertada por SQL', usuario_nombre='Sistema')
+        ])[0]
+        self.registrar('Posterior')
+        errores = integridad.verificar(desde_cero=True)['errores']
+        self.assertIn({'id': falso.pk, 'motivo': 'registro sin hash'}, errores)
+
+    def test_eliminar_los_mas_antiguos(self):
+        primero = self.registrar('Primera')
+        segundo = self.registrar('Segunda')
+        self.registrar('Tercera')
+        BitacoraAccion.objects.filter(pk=primero.pk).delete()
+
+        errores = integridad.verificar(desde_cero=True)['errores']
+        self.assertIn({'id': segundo.pk, 'motivo': 'encadenamiento roto'}, errores)
+
+    def test_eliminar_los_mas_recientes(self):
+        self.registrar('Primera')
+        ultimo = self.registrar('Última')
+        integridad.verificar(desde_cero=True)
+        BitacoraAccion.objects.filter(pk=ultimo.pk).delete()
+
+        errores = integridad.verificar()['errores']
+        self.assertIn({'id': ultimo.pk, 'motivo': 'registro eliminado'}, errores)
+
+    def test_punto_de_control(self):
+        self.registrar('Primera')
+        integridad.verificar(desde_cero=True)
+        punto = PuntoControlBitacora.objects.first()
+        self.assertEqual(punto.hasta_id, BitacoraAccion.objects.latest('id').pk)
+
+        nuevo = self.registrar('Después del punto de control')
+        resultado = integridad.verificar()
+        self.assertEqual(resultado['errores'], [])
+        self.assertEqual(resultado['desde_id'], nuevo.pk)
+        self.assertEqual(PuntoControlBitacora.objects.first().hasta_id, nuevo.pk)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'El lock consultivo de la cadena requiere PostgreSQL')
+class CadenaConcurrenteTests(TenantTestCase):
+    """Escritores concurrentes en transacciones largas mantienen la cadena válida."""
+
+    def test_escritores_concurrentes(self):
+        schema_name = connection.schema_name
+        errores = []
+
+        def escribir(numero):
+            try:
+                with schema_context(schema_name):
+                    for indice in range(5):
+                        # Transacción externa larga, como con ATOMIC_REQUESTS
+                        with transaction.atomic():
+                            BitacoraAccion.objects.create(accion='OTRO', descripcion=f'Hilo {numero}.{indice}')
+                            time.sleep(0.01)
+            except Exception as e:  # pragma: no cover - se reporta en la aserción
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=escribir, args=(numero,)) for numero in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        resultado = integridad.verificar(desde_cero=True)
+        self.assertEqual(resultado['errores'], [])
+        self.assertGreaterEqual(resultado['filas'], 20)
+
+
+class ContadorBitacoraTests(TenantTestCase):
+    """Los contadores escalan las acciones muestreadas por 1/tasa."""
+
+    def test_accion_muestreada(self):
+        BitacoraAccion.objects.create(accion='VER', descripcion='Consultó', detalles={'_muestreo': 0.1})
+        BitacoraAccion.objects.create(accion='VER', descripcion='Consultó')
+        # Una clave 'muestreo' propia del llamador no es una tasa
+        BitacoraAccion.objects.create(accion='VER', descripcion='Consultó', detalles={'muestreo': 0.5})
+        total = sum(BitacoraContador.objects.filter(accion='VER').values_list('total', flat=True))
+        self.assertEqual(total, 12)
+
+        BitacoraContador.reconstruir()
+        total = sum(BitacoraContador.objects.filter(accion='VER').values_list('total', flat=True))
+        self.assertEqual(total, 12)
+
+    def test_tasa_cero_no_divide(self):
+        BitacoraAccion.objects.create(accion='VER', descripcion='Consultó', detalles={'_muestreo': 0})
+        BitacoraContador.reconstruir()
+        self.assertEqual(BitacoraContador.objects.get(accion='VER').total, 1)
+
+    def test_validar_muestreo(self):
+        self.assertEqual(auditoria._validar_muestreo({'VER': 0.1}), {'VER': 0.1})
+        for tasa in (0, -0.5, 1.5):
+            with self.assertRaises(ImproperlyConfigured):
+                auditoria._validar_muestreo({'VER': tasa})
+
+
+class EstadisticasBitacoraTests(TenantTestCase):
+    """La ventana de ?dias= es la misma desde los contadores y desde la bitácora."""
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create(
+            email='estadisticas@clinica-demo.com', first_name='Ana', last_name='Ruiz', tipo_usuario='ADMIN'
+        )
+
+    def estadisticas(self, **params):
+        request = APIRequestFactory().get('/api/bitacora/estadisticas/', params)
+        force_authenticate(request, user=self.usuario)
+        return BitacoraViewSet.as_view({'get': 'estadisticas'})(request).data
+
+    def test_ventana_de_dias_completos(self):
+        ahora = timezone.localtime()
+        for atras in (0, 1, 6, 7, 8):
+            BitacoraAccion.objects.create(
+                accion='OTRO', descripcion=f'Hace {atras} días', fecha_hora=ahora - timedelta(days=atras)
+            )
+        BitacoraAccion.objects.create(
+            accion='VER', descripcion='Muestreada', fecha_hora=ahora, detalles={'_muestreo': 0.5}
+        )
+
+        crudo = BitacoraAccion.objects.filter(
+            fecha_hora__date__gte=timezone.localdate() - timedelta(days=6)
+        ).aggregate(total=Sum(peso_muestreo()))['total']
+        self.assertEqual(crudo, 5)
+
+        desde_contadores = self.estadisticas(dias='7')
+        # Un filtro del listado fuerza el cálculo sobre la bitácora
+        desde_bitacora = self.estadisticas(dias='7', desde='2000-01-01')
+        self.assertEqual(desde_contadores['total_acciones'], crudo)
+        self.assertEqual(desde_bitacora['total_acciones'], crudo)
+        self.assertEqual(len(desde_contadores['actividad_diaria']), 3)
+        self.assertEqual(self.estadisticas(dias='7', descripcion='Hace')['total_acciones'], 3)
+
+
+class DespachadorBitacoraTests(TenantTestCase):
+    """Las entradas encoladas no se pierden al terminar el proceso."""
+
+    def test_vaciar_escribe_lo_pendiente(self):
+        despachador = auditoria.DespachadorBitacora(maxsize=10)
+        despachador.cola.put_nowait(auditoria.preparar_entrada('VER', 'Pendiente al salir'))
+
+        despachador.vaciar(espera=0)
+
+        self.assertTrue(BitacoraAccion.objects.filter(descripcion='Pendiente al salir').exists())
+        self.assertEqual(despachador.cola.unfinished_tasks, 0)
+
+
+class ArchivoBitacoraTests(TenantTestCase):
+    """Archivado de la bitácora: índice, lectura por generador y recuperación."""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        patcher = mock.patch.object(archive, 'ARCHIVO_DIR', directorio.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.antes = timezone.now() - timedelta(days=400)
+        for numero in range(3):
+            registro = BitacoraAccion.objects.create(accion='OTRO', descripcion=f'Antigua {numero}')
+            BitacoraAccion.objects.filter(pk=registro.pk).update(fecha_hora=self.antes + timedelta(minutes=numero))
+        BitacoraAccion.objects.create(accion='OTRO', descripcion='Reciente')
+        self.corte = timezone.now() - timedelta(days=365)
+
+    def test_archivar_y_buscar(self):
+        self.assertEqual(archive.archivar(self.corte), 3)
+        self.assertEqual(BitacoraAccion.objects.count(), 1)
+
+        resultados = archive.buscar()
+        self.assertNotIsInstance(resultados, list)
+        self.assertEqual([r['descripcion'] for r in resultados], ['Antigua 2', 'Antigua 1', 'Antigua 0'])
+        self.assertEqual(archive.contar(), 3)
+        self.assertEqual(archive.contar(descripcion='antigua 1'), 1)
+
+    def test_limite_y_busqueda(self):
+        self.assertIsNone(archive.ultima_fecha_archivada())
+        archive.archivar(self.corte)
+
+        ultima = timezone.localtime(self.antes + timedelta(minutes=2)).date().isoformat()
+        self.assertEqual(archive.ultima_fecha_archivada(), ultima)
+        self.assertEqual(archive.contar(texto='antigua 1'), 1)
+        self.assertEqual(archive.contar(texto='antigua inexistente'), 0)
+
+    def listar(self, **params):
+        usuario = get_user_model().objects.create(
+            email='auditor@clinica-demo.com', first_name='Ana', last_name='Ruiz', tipo_usuario='ODONTOLOGO'
+        )
+        request = APIRequestFactory().get('/api/reportes/bitacora/', params)
+        force_authenticate(request, user=usuario)
+        response = BitacoraViewSet.as_view({'get': 'list'})(request)
+        datos = response.data['results'] if isinstance(response.data, dict) else response.data
+        return response, [fila['descripcion'] for fila in datos]
+
+    def test_listado_sin_desde_incluye_archivo(self):
+        archive.archivar(self.corte)
+
+        _, descripciones = self.listar(hasta=timezone.localdate().isoformat())
+        self.assertIn('Reciente', descripciones)
+        self.assertIn('Antigua 0', descripciones)
+
+    def test_listado_con_busqueda_omite_archivo(self):
+        archive.archivar(self.corte)
+
+        response, descripciones = self.listar(busqueda='antigua')
+        self.assertNotIn('Antigua 0', descripciones)
+        self.assertEqual(response['X-Bitacora-Archivo-Omitido'], 'busqueda')
+
+    def test_caida_antes_de_guardar_el_indice(self):
+        with mock.patch.object(archive, '_guardar_indice', side_effect=OSError('disco lleno')):
+            with self.assertRaises(OSError):
+                archive.archivar(self.corte)
+
+        # Las filas ya se eliminaron: el lote pendiente se incorpora al índice
+        self.assertEqual(archive.leer_indice(), {})
+        self.assertEqual(archive.contar(), 3)
+        self.assertEqual(sum(e['filas'] for e in archive.leer_indice().values()), 3)
+
+
+class BusquedaBitacoraTests(TenantTestCase):
+    """?busqueda= filtra con el tsvector y ordena por relevancia."""
+
+    def buscar(self, **params):
+        usuario = get_user_model().objects.create(
+            email='buscador@clinica-demo.com', first_name='Ana', last_name='Ruiz', tipo_usuario='ADMIN'
+        )
+        request = APIRequestFactory().get('/api/reportes/bitacora/', params)
+        force_authenticate(request, user=usuario)
+        with mock.patch.object(archive, 'ultima_fecha_archivada', return_value=None):
+            response = BitacoraViewSet.as_view({'get': 'list'})(request)
+        datos = response.data['results'] if isinstance(response.data, dict) else response.data
+        return [fila['descripcion'] for fila in datos]
+
+    def test_ordena_por_relevancia(self):
+        BitacoraAccion.objects.create(accion='OTRO', descripcion='Revisión de implante')
+        BitacoraAccion.objects.create(accion='OTRO', descripcion='Limpieza dental')
+        BitacoraAccion.objects.create(accion='OTRO', descripcion='Implante colocado; implantes revisados')
+
+        self.assertEqual(
+            self.buscar(busqueda='implante'),
+            ['Implante colocado; implantes revisados', 'Revisión de implante']
+        )
+
+    def test_vector_se_guarda(self):
+        registro = BitacoraAccion.objects.create(accion='OTRO', descripcion='Factura anulada')
+        registro.refresh_from_db(fields=['busqueda'])
+        self.assertIn('anul', registro.busqueda)
+
+
+class SnapshotsReportesTests(TenantTestCase):
+    """Snapshots nocturnos: acierto, invalidación por escritura y ?fresco=."""
+
+    def setUp(self):
+        snapshots.generar(self.tenant, [{'reporte': 'reporte-inventario'}], ['json'])
+        self.usuario = get_user_model().objects.create(
+            email='gerente@clinica-demo.com', first_name='Luis', last_name='Vega', tipo_usuario='ADMIN'
+        )
+
+    def pedir(self, **params):
+        request = APIRequestFactory().get('/api/reportes/reporte-inventario/', params)
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.usuario)
+        return ReportesViewSet.as_view({'get': 'reporte_inventario'})(request)
+
+    def test_acierto(self):
+        response = self.pedir()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Snapshot-Generado', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_escritura_invalida_el_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CategoriaInsumo.objects.create(nombre='Anestesia', descripcion='Anestésicos locales')
+        self.assertNotIn('X-Snapshot-Generado', self.pedir())
+
+    def test_fresco(self):
+        self.assertNotIn('X-Snapshot-Generado', self.pedir(fresco='1'))
+
+    def test_reportes_configurados_no_dependen_del_usuario(self):
+        for entrada in snapshots.SNAPSHOTS:
+            with self.subTest(reporte=entrada['reporte']):
+                self.assertIn(entrada['reporte'], snapshots.MODELOS_POR_REPORTE)
+                parametros = snapshots.resolver_parametros(entrada.get('parametros', {}), timezone.localdate())
+                contenido, content_type, _ = snapshots.renderizar(entrada['reporte'], parametros, 'json', self.tenant)
+                self.assertEqual(content_type, 'application/json')
+
+    def test_reporte_que_lee_el_usuario(self):
+        @snapshots.servir_snapshot
+        def reporte_inventario(viewset, request):
+            return Response({'usuario': request.user.pk})
+
+        with mock.patch.object(ReportesViewSet, 'reporte_inventario', reporte_inventario):
+            with self.assertRaises(snapshots.SnapshotDependeDelUsuario):
+                snapshots.renderizar('reporte-inventario', {}, 'json', self.tenant)
+
+
+@skipUnless(analytics.disponible(), 'El motor analítico requiere NumPy')
+class AnaliticaTests(SimpleTestCase):
+    """Cálculos vectorizados del motor analítico con datos fijos."""
+
+    def dias(self, *fechas):
+        return analytics.np.array(fechas, dtype='datetime64[D]')
+
+    def test_media_movil(self):
+        serie = analytics.np.array([1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(analytics.media_movil(serie, 2).tolist(), [1.0, 1.5, 2.5, 3.5])
+
+    def test_percentiles(self):
+        self.assertEqual(analytics.percentiles(analytics.np.arange(1, 11)), {'p50': 5.5, 'p90': 9.1})
+        self.assertEqual(analytics.percentiles([]), {'p50': 0.0, 'p90': 0.0})
+
+    def test_serie_diaria(self):
+        fechas, totales, conteos = analytics.serie_diaria(
+            self.dias('2025-01-01', '2025-01-03', '2025-01-03'), analytics.np.array([100, 200, 300]),
+            date(2025, 1, 1), date(2025, 1, 4)
+        )
+        self.assertEqual(len(fechas), 4)
+        self.assertEqual(totales.tolist(), [100, 0, 500, 0])
+        self.assertEqual(conteos.tolist(), [1, 0, 2, 0])
+
+    def test_serie_diaria_sin_datos(self):
+        _, totales, conteos = analytics.serie_diaria(
+            self.dias(), analytics.np.zeros(0, dtype=analytics.np.int64), date(2025, 1, 1), date(2025, 1, 4)
+        )
+        self.assertEqual(totales.tolist(), [0, 0, 0, 0])
+        self.assertEqual(conteos.tolist(), [0, 0, 0, 0])
+
+    def test_agrupar_por_mes(self):
+        meses, totales, conteos = analytics.agrupar_por_mes(
+            self.dias('2025-01-05', '2025-01-20', '2025-02-01'), analytics.np.array([1, 2, 3])
+        )
+        self.assertEqual([str(mes) for mes in meses], ['2025-01', '2025-02'])
+        self.assertEqual(totales.tolist(), [3, 3])
+        self.assertEqual(conteos.tolist(), [2, 1])
+
+    def test_retencion_por_cohorte(self):
+        cohortes, tamanos, matriz = analytics.retencion_por_cohorte(
+            analytics.np.array([1, 1, 2, 2, 3]),
+            self.dias('2025-01-10', '2025-02-10', '2025-01-15', '2025-03-01', '2025-02-20'),
+            max_meses=2,
+        )
+        self.assertEqual([str(cohorte) for cohorte in cohortes], ['2025-01', '2025-02'])
+        self.assertEqual(tamanos.tolist(), [2, 1])
+        self.assertEqual(matriz.tolist(), [[2, 1, 1], [1, 0, 0]])
+
+    def test_retencion_sin_datos(self):
+        cohortes, tamanos, matriz = analytics.retencion_por_cohorte(
+            analytics.np.zeros(0, dtype=analytics.np.int64), self.dias(), max_meses=2
+        )
+        self.assertEqual(len(cohortes), 0)
+        self.assertEqual(matriz.shape, (0, 3))
+
+    def test_productividad_sin_datos(self):
+        vacio = analytics.np.zeros(0, dtype=analytics.np.int64)
+        self.assertEqual(
+            analytics.productividad_por_odontologo(vacio, vacio, self.dias(), analytics.np.zeros(0, dtype=object)), []
+        )
+
+
+@skipUnless(analytics.disponible(), 'El motor analítico requiere NumPy')
+class ConsumoInsumosTests(TenantTestCase):
+    """El consumo de insumos se deriva de los ajustes de stock de la bitácora."""
+
+    def ajuste(self, insumo_id, detalles, modelo='insumo', dias_atras=0):
+        BitacoraAccion.objects.create(
+            accion='EDITAR', descripcion='Ajuste de stock', modelo=modelo, object_id=insumo_id,
+            detalles=detalles, fecha_hora=timezone.now() - timedelta(days=dias_atras)
+        )
+
+    def test_consumo_desde_detalles(self):
+        self.assertEqual(analytics._consumo_desde_detalles({'ajuste': -3}), 3.0)
+        self.assertEqual(analytics._consumo_desde_detalles({'ajuste': 5}), 0.0)
+        self.assertEqual(analytics._consumo_desde_detalles({'stock_anterior': '10', 'stock_actual': '6'}), 4.0)
+        self.assertEqual(analytics._consumo_desde_detalles({'stock_anterior': 2, 'stock_actual': 8}), 0.0)
+        self.assertEqual(analytics._consumo_desde_detalles({'ajuste': 'x'}), 0.0)
+        self.assertEqual(analytics._consumo_desde_detalles(None), 0.0)
+
+    def test_extraer_y_pronosticar(self):
+        self.ajuste(1, {'ajuste': -3})
+        self.ajuste(1, {'stock_anterior': 10, 'stock_actual': 6}, dias_atras=2)
+        self.ajuste(1, {'ajuste': 5})                        # entrada: no es consumo
+        self.ajuste(2, {'ajuste': -7})
+        self.ajuste(2, {'ajuste': -100}, dias_atras=60)      # fuera del rango
+        self.ajuste(3, {'ajuste': -9}, modelo='servicio')    # otro modelo
+
+        hoy = timezone.localdate()
+        ids, cantidades = analytics.extraer_consumos(hoy - timedelta(days=29), hoy)
+        consumos = {}
+        for insumo_id, cantidad in zip(ids.tolist(), cantidades.tolist()):
+            consumos[insumo_id] = consumos.get(insumo_id, 0) + cantidad
+        self.assertEqual(consumos, {1: 7.0, 2: 7.0})
+
+        np = analytics.np
+        pronostico = analytics.pronostico_stock(
+            np.array([1, 2, 4]), np.array([14.0, 100.0, 5.0]), np.array([2.0, 2.0, 1.0]),
+            ids, cantidades, ventana=7, dias_entrega=3
+        )
+        self.assertEqual(pronostico['consumo'].tolist(), [7.0, 7.0, 0.0])
+        self.assertEqual(pronostico['dias_restantes'].tolist(), [14.0, 100.0, float('inf')])
+        self.assertEqual(pronostico['en_riesgo'].tolist(), [False, False, False])
+
+
+@skipUnless(analytics.disponible(), 'El motor analítico requiere NumPy')
+class AnaliticaRangoTests(TenantTestCase):
+    """Los endpoints analíticos rechazan rangos y parámetros sin cota."""
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create(
+            email='analista@clinica-demo.com', first_name='Eva', last_name='Soto', tipo_usuario='ADMIN'
+        )
+
+    def pedir(self, accion, **params):
+        request = APIRequestFactory().get(f"/api/reportes/{accion.replace('_', '-')}/", params)
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.usuario)
+        return ReportesViewSet.as_view({'get': accion})(request)
+
+    def test_rango_excesivo(self):
+        for accion in ('analitica_ingresos', 'analitica_productividad'):
+            with self.subTest(accion=accion):
+                response = self.pedir(accion, desde='0001-01-01', hasta='2025-12-31')
+                self.assertEqual(response.status_code, 400)
+
+    def test_meses_de_retencion(self):
+        self.assertEqual(self.pedir('analitica_retencion', meses='0').status_code, 400)
+        self.assertEqual(self.pedir('analitica_retencion', meses='37').status_code, 400)
+
+
+class MoneyAccumulatorTests(SimpleTestCase):
+    """Aritmética en centavos enteros del acumulador de montos."""
+
+    def test_tipos_de_entrada(self):
+        self.assertEqual(MoneyAccumulator(Decimal('10.25')).centavos, 1025)
+        self.assertEqual(MoneyAccumulator(10.25).centavos, 1025)
+        self.assertEqual(MoneyAccumulator(10).centavos, 1000)
+        self.assertEqual(MoneyAccumulator('10.25').centavos, 1025)
+        self.assertEqual(MoneyAccumulator(None).centavos, 0)
+        with self.assertRaises(TypeError):
+            MoneyAccumulator(True)
+
+    def test_redondeo_half_up_de_entrada(self):
+        self.assertEqual(MoneyAccumulator(Decimal('10.005')).centavos, 1001)
+        self.assertEqual(MoneyAccumulator(Decimal('-2.345')).centavos, -235)
+
+    def test_sin_deriva_de_float(self):
+        self.assertNotEqual(sum([0.1] * 10), 1.0)
+        self.assertEqual(MoneyAccumulator.sumar([0.1] * 10).to_decimal(), Decimal('1.00'))
+        self.assertEqual(MoneyAccumulator(0.1) + 0.2, Decimal('0.30'))
+
+    def test_negativos(self):
+        total = MoneyAccumulator.sumar([Decimal('1.10'), 2, 0.3, None, '-0.40'])
+        self.assertEqual(total.centavos, 300)
+        self.assertEqual((MoneyAccumulator(5) - Decimal('7.50')).centavos, -250)
+        self.assertEqual((10 - MoneyAccumulator('2.50')).centavos, 750)
+        self.assertEqual((-MoneyAccumulator('2.50')).centavos, -250)
+
+    def test_division_half_up(self):
+        self.assertEqual((MoneyAccumulator('10.00') / 3).centavos, 333)
+        self.assertEqual((MoneyAccumulator('20.00') / 3).centavos, 667)
+        self.assertEqual((MoneyAccumulator('0.05') / 2).centavos, 3)
+        self.assertEqual((MoneyAccumulator('-0.05') / 2).centavos, -3)
+        self.assertEqual((MoneyAccumulator('1.00') / 0).centavos, 0)
+
+    def test_promedio(self):
+        montos = [Decimal('10.00'), Decimal('10.00'), Decimal('10.01')]
+        self.assertEqual((MoneyAccumulator.sumar(montos) / len(montos)).to_decimal(), Decimal('10.00'))
+        montos.append(Decimal('10.01'))
+        self.assertEqual((MoneyAccumulator.sumar(montos) / len(montos)).to_decimal(), Decimal('10.01'))
+
+    def test_formato(self):
+        self.assertEqual(str(MoneyAccumulator(Decimal('1234567.5'))), '$1,234,567.50')
+        self.assertEqual(str(MoneyAccumulator('-1530.5')), '$-1,530.50')
+        self.assertEqual(str(MoneyAccumulator()), '$0.00')
+        self.assertEqual(float(MoneyAccumulator('-1530.5')), -1530.5)
+        self.assertEqual(MoneyAccumulator('1530.50').to_json(), 1530.5)
+        self.assertEqual(format_currency(MoneyAccumulator('0.07')), '$0.07')
+
+
+class MoneyAccumulatorSumTests(TenantTestCase):
+    """El acumulador da el mismo total que ``Sum()`` en la base de datos."""
+
+    def test_igual_a_sum(self):
+        paciente = crear_paciente('money@clinica-demo.com')
+        montos = [Decimal('0.10'), Decimal('0.20'), Decimal('1530.45'), Decimal('99.99'), Decimal('0.01')]
+        for monto in montos:
+            crear_factura(paciente, monto)
+
+        esperado = Factura.objects.aggregate(total=Sum('monto_total'))['total']
+        acumulado = MoneyAccumulator.sumar(Factura.objects.values_list('monto_total', flat=True))
+        self.assertEqual(acumulado.to_decimal(), esperado)
+        self.assertEqual(MoneyAccumulator(esperado), acumulado)
+        self.assertEqual(
+            MoneyAccumulator.sumar(float(monto) for monto in montos).to_decimal(), esperado
+        )
+
+
+class ResumenPacienteTests(TenantTestCase):
+    """El resumen materializado coincide con el agregado en vivo tras cada cambio."""
+
+    def setUp(self):
+        self.paciente = crear_paciente('resumen@clinica-demo.com')
+        self.odontologo = crear_odontologo('dentista@clinica-demo.com')
+
+    def agregado_en_vivo(self):
+        facturas = Factura.objects.filter(paciente=self.paciente).aggregate(
+            facturado=Sum('monto_total'), pagado=Sum('monto_pagado')
+        )
+        facturado = facturas['facturado'] or 0
+        pagado = facturas['pagado'] or 0
+        return {
+            'total_citas': Cita.objects.filter(paciente=self.paciente).count(),
+            'total_facturado': facturado,
+            'total_pagado': pagado,
+            'saldo_pendiente': facturado - pagado,
+        }
+
+    def assertConsistente(self):
+        resumen = ResumenPaciente.objects.get(paciente=self.paciente)
+        actual = {campo: getattr(resumen, campo) for campo in self.agregado_en_vivo()}
+        self.assertEqual(actual, self.agregado_en_vivo())
+
+    def test_cita_crear_actualizar_eliminar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cita = Cita.objects.create(
+                paciente=self.paciente, odontologo=self.odontologo,
+                fecha_hora=timezone.now(), estado='PENDIENTE'
+            )
+        self.assertConsistente()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cita.estado = 'ATENDIDA'
+            cita.save()
+        self.assertConsistente()
+        resumen = ResumenPaciente.objects.get(paciente=self.paciente)
+        self.assertEqual(resumen.ultima_visita, cita.fecha_hora)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cita.delete()
+        self.assertConsistente()
+
+    def test_pago_crear_actualizar_eliminar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            factura = crear_factura(self.paciente, Decimal('300.00'))
+        self.assertConsistente()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pago = Pago.objects.create(
+                factura=factura, monto_pagado=Decimal('120.50'),
+                metodo_pago='EFECTIVO', estado_pago='COMPLETADO'
+            )
+        self.assertConsistente()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pago.monto_pagado = Decimal('100.00')
+            pago.save()
+        self.assertConsistente()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pago.delete()
+        self.assertConsistente()
+
+    def test_reconstruir(self):
+        crear_factura(self.paciente, Decimal('80.00'))
+        ResumenPaciente.objects.all().delete()
+        self.assertEqual(ResumenPaciente.reconstruir(), PerfilPaciente.objects.count())
+        self.assertConsistente()
+
+    def test_reconstruir_es_atomico(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_factura(self.paciente, Decimal('80.00'))
+        antes = list(ResumenPaciente.objects.values())
+        with mock.patch.object(ResumenPaciente.objects, 'bulk_create', side_effect=RuntimeError('falla')):
+            with self.assertRaises(RuntimeError):
+                ResumenPaciente.reconstruir()
+        self.assertEqual(list(ResumenPaciente.objects.values()), antes)
+
+
+class DashboardCompuestoTests(TenantTestCase):
+    """El dashboard compuesto filtra widgets y campos y aísla el request de cada hilo."""
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create(
+            email='tablero@clinica-demo.com', first_name='Sara', last_name='Mora', tipo_usuario='ADMIN'
+        )
+
+    def pedir(self, **params):
+        request = APIRequestFactory().get('/api/reportes/dashboard/', params)
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.usuario)
+        return ReportesViewSet.as_view({'get': 'dashboard'})(request)
+
+    def test_widgets_seleccionados(self):
+        response = self.pedir(widgets='tendencia-citas, dashboard-kpis,tendencia-citas', dias='3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data), ['tendencia-citas', 'dashboard-kpis'])
+        self.assertEqual(len(response.data['tendencia-citas']), 3)
+
+    def test_campos_por_widget(self):
+        response = self.pedir(**{
+            'widgets': 'dashboard-kpis,tendencia-citas',
+            'dias': '2',
+            'fields[dashboard-kpis]': 'kpis.citas_hoy,kpis.ingresos_mes',
+            'fields[tendencia-citas]': 'fecha,cantidad',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['dashboard-kpis'], {
+            'kpis': {
+                'citas_hoy': response.data['dashboard-kpis']['kpis']['citas_hoy'],
+                'ingresos_mes': response.data['dashboard-kpis']['kpis']['ingresos_mes'],
+            }
+        })
+        for fila in response.data['tendencia-citas']:
+            self.assertEqual(set(fila), {'fecha', 'cantidad'})
+
+    def test_widget_desconocido(self):
+        response = self.pedir(widgets='dashboard-kpis,no-existe')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('no-existe', response.data['error'])
+        self.assertIn('dashboard-kpis', response.data['disponibles'])
+
+    def test_request_por_widget(self):
+        vistos = {}
+
+        def payload(vista, request, nombre):
+            vistos[nombre] = request
+            return {'usuario': request.user.email, 'dias': request.query_params.get('dias')}
+
+        with mock.patch.object(ReportesViewSet, '_payload_widget', payload):
+            response = self.pedir(widgets='dashboard-kpis,tendencia-citas', dias='5')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNot(vistos['dashboard-kpis'], vistos['tendencia-citas'])
+        self.assertIsNot(vistos['dashboard-kpis']._request, vistos['tendencia-citas']._request)
+        for nombre in vistos:
+            self.assertEqual(response.data[nombre], {'usuario': self.usuario.email, 'dias': '5'})
+
+    def test_seleccionar_campos(self):
+        datos = {'kpis': {'a': 1, 'b': 2}, 'items': [{'x': 1, 'y': 2}, {'x': 3, 'y': 4}]}
+        self.assertEqual(
+            seleccionar_campos(datos, ['kpis.a', 'items.y']),
+            {'kpis': {'a': 1}, 'items': [{'y': 2}, {'y': 4}]}
+        )
+        self.assertIs(seleccionar_campos(datos, []), datos)
+
+
+class ProyeccionTests(TenantTestCase):
+    """Las proyecciones devuelven lo mismo que el recorrido por instancias que reemplazan."""
+
+    def setUp(self):
+        self.paciente = crear_paciente('proyeccion@clinica-demo.com')
+        self.sin_resumen = crear_paciente('sin-resumen@clinica-demo.com', nombre='Beto')
+        self.odontologo = crear_odontologo('proyeccion-odo@clinica-demo.com')
+        crear_factura(self.paciente, Decimal('150.00'))
+        ResumenPaciente.actualizar(self.paciente.id)
+
+    def test_reporte_pacientes(self):
+        anterior = []
+        for paciente in PerfilPaciente.objects.select_related('usuario', 'resumen_reportes').order_by('id'):
+            resumen = getattr(paciente, 'resumen_reportes', None)
+            anterior.append({
+                'nombre': paciente.usuario.full_name,
+                'email': paciente.usuario.email,
+                'telefono': paciente.telefono or 'N/A',
+                'fecha_nacimiento': format_date(paciente.fecha_nacimiento),
+                'fecha_registro': format_date(paciente.usuario.date_joined),
+                'activo': 'Sí' if paciente.usuario.is_active else 'No',
+                'total_citas': resumen.total_citas if resumen else 0,
+                'total_gastado': format_currency(resumen.total_facturado if resumen else Decimal('0.00')),
+                'saldo_pendiente': format_currency(resumen.saldo_pendiente if resumen else Decimal('0.00')),
+                'ultima_visita': format_date(resumen.ultima_visita if resumen else None),
+            })
+
+        self.assertEqual(PROYECCION_PACIENTES.filas(PerfilPaciente.objects.order_by('id')), anterior)
+
+    def test_voz_citas(self):
+        Cita.objects.create(
+            paciente=self.paciente, odontologo=self.odontologo, fecha_hora=timezone.now(),
+            motivo='Control', motivo_tipo=Cita._meta.get_field('motivo_tipo').choices[0][0], estado='PENDIENTE'
+        )
+        anterior = [{
+            'id': cita.id,
+            'fecha': cita.fecha_hora.strftime('%d/%m/%Y'),
+            'hora': cita.fecha_hora.strftime('%H:%M'),
+            'paciente': cita.paciente.usuario.full_name if cita.paciente else 'N/A',
+            'odontologo': cita.odontologo.usuario.full_name if cita.odontologo else 'N/A',
+            'motivo': cita.motivo or 'N/A',
+            'motivo_tipo': cita.get_motivo_tipo_display(),
+            'estado': cita.get_estado_display(),
+        } for cita in Cita.objects.select_related('paciente__usuario', 'odontologo__usuario').order_by('id')]
+
+        self.assertEqual(voice_views.PROYECCION_CITAS.filas(Cita.objects.order_by('id')), anterior)
+
+    def test_voz_facturas(self):
+        facturas = Factura.objects.annotate(saldo=saldo_factura()).order_by('id')
+        anterior = [{
+            'id': factura.id,
+            'numero': f"FAC-{factura.id:06d}",
+            'fecha': factura.fecha_emision.strftime('%d/%m/%Y'),
+            'paciente': factura.paciente.usuario.full_name if factura.paciente else 'N/A',
+            'monto_total': float(factura.monto_total),
+            'monto_pagado': float(factura.monto_pagado),
+            'saldo': float(factura.saldo),
+            'estado': factura.get_estado_display(),
+        } for factura in facturas.select_related('paciente__usuario')]
+
+        self.assertEqual(voice_views.PROYECCION_FACTURAS.filas(facturas), anterior)
+
+
+class ReporteInventarioTests(TenantTestCase):
+    """Totales por ventana y orden por valor del reporte de inventario."""
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create(
+            email='inventario@clinica-demo.com', first_name='Ana', last_name='Ruiz', tipo_usuario='ADMIN'
+        )
+        self.anestesia = CategoriaInsumo.objects.create(nombre='Anestesia', descripcion='Anestésicos locales')
+        self.resinas = CategoriaInsumo.objects.create(nombre='Resinas', descripcion='Restauración')
+        for codigo, categoria, stock, minimo, costo in (
+            ('A-1', self.anestesia, 10, 2, '5.00'),     # 50.00, NORMAL
+            ('A-2', self.anestesia, 1, 5, '100.00'),    # 100.00, BAJO
+            ('R-1', self.resinas, 0, 3, '30.00'),       # 0.00, AGOTADO
+        ):
+            Insumo.objects.create(
+                codigo=codigo, nombre=f'Insumo {codigo}', categoria=categoria,
+                stock_actual=stock, stock_minimo=minimo,
+                unidad_medida=Insumo._meta.get_field('unidad_medida').choices[0][0],
+                precio_costo=Decimal(costo), precio_venta=Decimal(costo) * 2,
+            )
+
+    def pedir(self, **params):
+        request = APIRequestFactory().get('/api/reportes/reporte-inventario/', params)
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.usuario)
+        return ReportesViewSet.as_view({'get': 'reporte_inventario'})(request)
+
+    def test_ordenar_por_valor(self):
+        response = self.pedir(ordenar='valor')
+        self.assertEqual([fila['codigo'] for fila in response.data], ['A-2', 'A-1', 'R-1'])
+        self.assertEqual([fila['estado_stock'] for fila in response.data], ['BAJO', 'NORMAL', 'AGOTADO'])
+
+    def test_totales_de_ventana(self):
+        resumen = self.pedir(resumen='true').data['resumen']
+        self.assertEqual(resumen['total_items'], 3)
+        self.assertEqual(resumen['valor_total'], 150.0)
+        self.assertEqual(resumen['stock_bajo'], 1)
+        self.assertEqual(resumen['agotados'], 1)
+        self.assertEqual(
+            [(categoria['categoria'], categoria['items'], categoria['valor_total']) for categoria in resumen['por_categoria']],
+            [('Anestesia', 2, 150.0), ('Resinas', 1, 0.0)]
+        )
+
+    def test_totales_sobre_lo_filtrado(self):
+        resumen = self.pedir(resumen='true', categoria=str(self.resinas.id)).data['resumen']
+        self.assertEqual(resumen['total_items'], 1)
+        self.assertEqual(resumen['valor_total'], 0.0)
+        self.assertEqual(resumen['agotados'], 1)
+        self.assertEqual(resumen['stock_bajo'], 0)
+
+
+@skipUnless(importlib.util.find_spec('reportlab'), 'El renderizado de PDF requiere ReportLab')
+class PoolPDFTests(SimpleTestCase):
+    """Si el pool de procesos cae, el PDF se renderiza en el proceso y el pool se recrea."""
+
+    def spec(self, filas):
+        return {
+            'title': 'Reporte', 'tenant_name': 'Clínica Demo',
+            'bloques': [{'tipo': 'table', 'data': [['fila', str(i)] for i in range(filas)],
+                         'col_widths': None, 'title': None}],
+        }
+
+    def test_fallback_con_pool_caido(self):
+        from concurrent.futures.process import BrokenProcessPool
+        from . import pdf_renderer
+
+        caido = mock.Mock()
+        caido.submit.side_effect = BrokenProcessPool('worker terminado')
+        with mock.patch.multiple(pdf_renderer, PDF_WORKERS=2, MIN_FILAS_POOL=10, _pool=caido):
+            contenido = pdf_renderer.renderizar_pdf(self.spec(20))
+            self.assertIsNone(pdf_renderer._pool)
+
+        self.assertTrue(contenido.startswith(b'%PDF'))
+        caido.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+        # El cupo se devolvió: se puede tomar MAX_CONCURRENTES veces sin esperar
+        tomados = [pdf_renderer._cupos.acquire(blocking=False) for _ in range(pdf_renderer.MAX_CONCURRENTES)]
+        for tomado in tomados:
+            if tomado:
+                pdf_renderer._cupos.release()
+        self.assertTrue(all(tomados))
+
+    def test_pdf_pequeno_no_usa_el_pool(self):
+        from . import pdf_renderer
+
+        pool = mock.Mock()
+        with mock.patch.multiple(pdf_renderer, PDF_WORKERS=2, MIN_FILAS_POOL=10, _pool=pool):
+            contenido = pdf_renderer.renderizar_pdf(self.spec(3))
+        self.assertTrue(contenido.startswith(b'%PDF'))
+        pool.submit.assert_not_called()
+
+
+class TemasTests(SimpleTestCase):
+    """Tema por tenant y estilos cacheados por tema."""
+
+    def test_tema_por_tenant(self):
+        with mock.patch.dict(themes._temas, {}, clear=True):
+            verde = themes.registrar_tema('clinica_verde', color_primario='#0f766e')
+            self.assertIs(themes.obtener_tema('clinica_verde'), verde)
+            self.assertEqual(verde.color_secundario, themes.TEMA_BASE.color_secundario)
+            self.assertIs(themes.obtener_tema('otra'), themes.TEMA_BASE)
+
+            default = themes.registrar_tema('default', fuente_excel='Calibri')
+            self.assertIs(themes.obtener_tema('otra'), default)
+
+    def test_tema_del_esquema_actual(self):
+        with mock.patch.dict(themes._temas, {}, clear=True):
+            tema = themes.registrar_tema('clinica_demo', color_primario='#111111')
+            with mock.patch.object(themes, 'connection', mock.Mock(schema_name='clinica_demo')):
+                self.assertIs(themes.obtener_tema(), tema)
+
+    def test_temas_iguales_comparten_cache(self):
+        self.assertEqual(hash(themes.Tema(color_primario='#111111')), hash(themes.Tema(color_primario='#111111')))
+
+    @skipUnless(importlib.util.find_spec('openpyxl'), 'Requiere openpyxl')
+    def test_estilos_excel_una_vez_por_tema(self):
+        from .exporters.excel import estilos_excel
+
+        tema = themes.Tema(color_primario='#222222')
+        self.assertIs(estilos_excel(tema), estilos_excel(themes.Tema(color_primario='#222222')))
+        self.assertIsNot(estilos_excel(tema), estilos_excel(themes.TEMA_BASE))
+
+    @skipUnless(importlib.util.find_spec('reportlab'), 'Requiere ReportLab')
+    def test_estilos_pdf_una_vez_por_tema(self):
+        from . import pdf_renderer
+
+        tema = themes.Tema(color_primario='#333333')
+        self.assertIs(pdf_renderer._estilos(tema), pdf_renderer._estilos(themes.Tema(color_primario='#333333')))
+
+
+class PaqueteReportesTests(TenantTestCase):
+    """Los intermedios compartidos se consultan una vez y el rango tiene tope."""
+
+    NOMBRES = ['tendencia-citas', 'reporte-citas-odontologo', 'ocupacion-odontologos']
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create(
+            email='paquete@clinica-demo.com', first_name='Ana', last_name='Ruiz', tipo_usuario='ADMIN'
+        )
+
+    def pedir(self, **params):
+        request = APIRequestFactory().get('/api/reportes/paquete/', params)
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.usuario)
+        return ReportesViewSet.as_view({'get': 'paquete'})(request)
+
+    def test_intermedios_una_sola_vez(self):
+        contadores = {nombre: mock.Mock(wraps=funcion) for nombre, funcion in bundle.INTERMEDIOS.items()}
+        hasta = timezone.localdate()
+        with mock.patch.dict(bundle.INTERMEDIOS, contadores):
+            with self.assertNumQueries(3):
+                paquete = bundle.ejecutar(self.NOMBRES, hasta - timedelta(days=6), hasta)
+
+        self.assertEqual(list(paquete['reportes']), self.NOMBRES)
+        self.assertEqual(paquete['consultas'], {'solicitadas': 6, 'ejecutadas': 3})
+        self.assertEqual(bundle.planificar(self.NOMBRES), ['citas', 'odontologos', 'pacientes_atendidos'])
+        for nombre, contador in contadores.items():
+            with self.subTest(intermedio=nombre):
+                esperadas = 1 if nombre in bundle.planificar(self.NOMBRES) else 0
+                self.assertEqual(contador.call_count, esperadas)
+        self.assertEqual(len(paquete['reportes']['tendencia-citas']['datos']), 7)
+
+    def test_tope_de_dias(self):
+        hasta = date(2025, 12, 31)
+        maximo = ReportesViewSet.MAX_DIAS_PAQUETE
+        dentro = self.pedir(reportes='tendencia-citas', hasta=hasta.isoformat(),
+                            desde=(hasta - timedelta(days=maximo - 1)).isoformat())
+        fuera = self.pedir(reportes='tendencia-citas', hasta=hasta.isoformat(),
+                           desde=(hasta - timedelta(days=maximo)).isoformat())
+        self.assertEqual(dentro.status_code, 200)
+        self.assertEqual(fuera.status_code, 400)
+        self.assertIn(str(maximo), fuera.data['error'])
+
+    def test_reporte_desconocido(self):
+        response = self.pedir(reportes='tendencia-citas,no-existe')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('no-existe', response.data['error'])
+
+
+class ExportadoresPerezososTests(SimpleTestCase):
+    """ReportLab y openpyxl se importan recién al pedir su formato."""
+
+    def test_importar_vistas_no_carga_backends(self):
+        codigo = (
+            "import sys, django; django.setup()\n"
+            "antes = set(sys.modules)\n"
+            "import reportes.views, reportes.voice_views, reportes.bundle, reportes.urls\n"
+            "nuevos = set(sys.modules) - antes\n"
+            "print(sorted(m for m in nuevos if m.split('.')[0] in ('reportlab', 'openpyxl')))"
+        )
+        salida = subprocess.run(
+            [sys.executable, '-c', codigo], capture_output=True, text=True, env=os.environ, check=True
+        )
+        self.assertEqual(salida.stdout.strip().splitlines()[-1], '[]', salida.stderr)
+
+    def test_obtener_importa_en_el_primer_uso(self):
+        clase = mock.Mock()
+        modulo = mock.Mock(GeneradorPrueba=clase)
+        with mock.patch.dict(exporters.EXPORTADORES), mock.patch.dict(exporters._cargados, clear=True), \
+                mock.patch.object(exporters.importlib, 'import_module', return_value=modulo) as importar:
+            exporters.registrar('prueba', 'reportes.exporters.prueba', 'GeneradorPrueba')
+            importar.assert_not_called()
+
+            self.assertIs(exporters.obtener('prueba'), clase)
+            self.assertIs(exporters.obtener('prueba'), clase)
+            importar.assert_called_once_with('reportes.exporters.prueba')
+
+    def test_formato_desconocido(self):
+        with self.assertRaises(ValueError):
+            exporters.obtener('docx')
+
+
+class ExportacionVozTests(TenantTestCase):
+    """formato=csv exporta todas las filas, sin el límite de la respuesta JSON."""
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create(
+            email='voz@clinica-demo.com', first_name='Ana', last_name='Ruiz', tipo_usuario='ADMIN'
+        )
+        for numero in range(5):
+            get_user_model().objects.create(
+                email=f'paciente{numero}@clinica-demo.com', first_name=f'Paciente{numero}',
+                last_name='Voz', tipo_usuario='PACIENTE'
+            )
+
+    def consultar(self, **datos):
+        request = APIRequestFactory().post('/api/reportes/voice-query/', {'texto': 'lista de pacientes', **datos},
+                                           format='json')
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.usuario)
+        return voice_views.VoiceReportQueryView.as_view()(request)
+
+    def test_csv_sin_limite_de_filas(self):
+        with mock.patch.object(voice_views, 'LIMITE_FILAS', 3):
+            self.assertEqual(len(self.consultar().data['datos']), 3)
+            response = self.consultar(formato='csv')
+
+        self.assertTrue(response.streaming)
+        contenido = b''.join(response.streaming_content).decode('utf-8').lstrip('\ufeff')
+        lineas = contenido.splitlines()
+        self.assertEqual(lineas[0].split(','), voice_views.PROYECCION_PACIENTES.encabezados)
+        self.assertEqual(len(lineas) - 1, 5)
+        self.assertEqual(sorted(linea.split(',')[2] for linea in lineas[1:]),
+                         [f'paciente{numero}@clinica-demo.com' for numero in range(5)])
+
+    def test_formato_no_soportado(self):
+        self.assertEqual(self.consultar(formato='docx').status_code, 400)
+
+
+class AggregateBatchTests(TenantTestCase):
+    """Los agregados sobre la misma consulta se fusionan en un solo aggregate()."""
+
+    def test_fusiona_por_consulta(self):
+        BitacoraAccion.objects.create(accion='VER', descripcion='Uno')
+        BitacoraAccion.objects.create(accion='OTRO', descripcion='Dos')
+
+        lote = AggregateBatch()
+        lote.add(BitacoraAccion.objects.all(), total=Count('pk'))
+        lote.add(BitacoraAccion.objects.all(), vistas=Count('pk', filter=Q(accion='VER')))
+        lote.add(BitacoraContador.objects.all(), contadores=Count('pk'), suma=Sum('total'))
+        self.assertEqual((lote.agregados, lote.consultas_ejecutadas), (4, 2))
+
+        with self.assertNumQueries(lote.consultas_ejecutadas):
+            resultados = lote.execute()
+        self.assertEqual(resultados, {'total': 2, 'vistas': 1, 'contadores': 2, 'suma': 2})
+
+    def test_alias_duplicado(self):
+        lote = AggregateBatch().add(BitacoraAccion.objects.all(), total=Count('pk'))
+        with self.assertRaises(ValueError):
+            lote.add(BitacoraContador.objects.all(), total=Count('pk'))
+
+
+class CorpusVozTests(SimpleTestCase):
+    """El intérprete compilado resuelve todo el corpus de comandos de voz."""
+
+    def test_corpus(self):
+        for entrada in CORPUS:
+            with self.subTest(texto=entrada['texto']):
+                interpretacion = matcher.interpretar(entrada['texto'], hoy=FECHA_REFERENCIA)
+                self.assertEqual(diferencias(entrada, interpretacion), [], interpretacion)
+
+    def test_consultas_multiples(self):
+        for entrada in CORPUS_MULTIPLE:
+            with self.subTest(texto=entrada['texto']):
+                resultado = matcher.interpretar_consultas(entrada['texto'], hoy=FECHA_REFERENCIA)
+                consultas = [
+                    {campo: consulta[campo] for campo in ('tipo_reporte', 'fecha_inicio', 'fecha_fin', 'filtros')}
+                    for consulta in resultado['consultas']
+                ]
+                self.assertEqual(consultas, entrada['consultas'])
+                self.assertEqual(resultado['comparacion'], entrada['comparacion'])
+
+    def test_una_sola_consulta(self):
+        for entrada in CORPUS:
+            with self.subTest(texto=entrada['texto']):
+                resultado = matcher.interpretar_consultas(entrada['texto'], hoy=FECHA_REFERENCIA)
+                self.assertEqual(
+                    resultado['consultas'], [matcher.interpretar(entrada['texto'], hoy=FECHA_REFERENCIA)]
+                )
+
+    def test_formato_de_respuesta(self):
+        interpretacion = matcher.interpretar('dame las citas del 1 al 5 de septiembre de 2025')
+        self.assertEqual(
+            set(interpretacion),
+            {'texto_original', 'tipo_reporte', 'fecha_inicio', 'fecha_fin', 'filtros', 'interpretacion'}
+        )
+        self.assertEqual(
+            interpretacion['interpretacion'],
+            'Reporte de citas desde el 01/09/2025 hasta el 05/09/2025'
+        )
+
+
+class IndiceNombresTests(SimpleTestCase):
+    """Resolución de nombres dictados a ids sin tocar la base de datos."""
+
+    def setUp(self):
+        self.indice = IndiceNombres([
+            Persona(1, 10, 'Juan Pérez'),
+            Persona(2, 11, 'Juana Pereyra'),
+            Persona(3, 12, 'María González López'),
+        ])
+
+    def buscar(self, texto):
+        return [persona.id for persona in self.indice.buscar(texto)]
+
+    def test_exacto_sin_tildes(self):
+        self.assertEqual(self.buscar('juan perez'), [1])
+        self.assertEqual(self.buscar('MARIA lopez'), [3])
+
+    def test_prefijo(self):
+        self.assertEqual(self.buscar('pere'), [1, 2])
+        self.assertEqual(self.buscar('juana pe'), [])  # prefijos desde 3 letras
+
+    def test_aproximado(self):
+        self.assertEqual(self.buscar('gonzales'), [3])
+        self.assertEqual(self.buscar('jaun perez'), [1])
+
+    def test_sin_coincidencias(self):
+        self.assertEqual(self.buscar('pedro'), [])
+        self.assertEqual(self.buscar(''), [])
@@ -0,0 +1,58 @@
+"""
+Temas visuales de los exportadores PDF y Excel.
+
+Un ``Tema`` es inmutable y hashable, así que los estilos derivados (hoja de
+estilos de ReportLab, fuentes y rellenos de openpyxl) se construyen una sola
+vez por proceso y tema (ver pdf_renderer._estilos y exporters.excel.estilos_excel).
+
+Personalización por tenant (settings.py), clave = schema_name:
+    REPORTES_TEMAS = {
+        'default': {'fuente_excel': 'Calibri'},
+        'clinica_demo': {'color_primario': '#0f766e', 'color_secundario': '#14b8a6'},
+    }
+"""
+import threading
+from dataclasses import asdict, dataclass, replace
+
+from django.conf import settings
+from django.db import connection
+
+
+@dataclass(frozen=True)
+class Tema:
+    color_primario: str = '#1e3a8a'
+    color_secundario: str = '#3b82f6'
+    color_fila_alterna: str = '#F0F0F0'
+    fuente_excel: str = 'Arial'
+
+    def a_dict(self):
+        return asdict(self)
+
+    @staticmethod
+    def excel(color):
+        """'#1e3a8a' -> '1e3a8a' (formato de color de openpyxl)."""
+        return color.lstrip('#')
+
+
+TEMA_BASE = Tema()
+
+_lock = threading.Lock()
+_temas = {
+    clave: replace(TEMA_BASE, **valores)
+    for clave, valores in getattr(settings, 'REPORTES_TEMAS', {}).items()
+}
+
+
+def registrar_tema(clave, **valores):
+    """Registra (o reemplaza) el tema de un tenant a partir del tema base."""
+    tema = replace(TEMA_BASE, **valores)
+    with _lock:
+        _temas[clave] = tema
+    return tema
+
+
+def obtener_tema(clave=None):
+    """Tema del tenant ``clave`` (por defecto, el esquema de la conexión actual)."""
+    if clave is None:
+        clave = getattr(connection, 'schema_name', None)
+    return _temas.get(clave) or _temas.get('default') or TEMA_BASE
@@ -21,6 +21,9 @@ urlpatterns = [
 """
 Endpoints de Reportes Disponibles (CU37, CU38, CU39):
 
+DASHBOARD COMPUESTO (todos los widgets en una respuesta, calculados en paralelo):
+- GET /api/reportes/reportes/dashboard/?dias=15&limite=5&fields[dashboard-kpis]=kpis.citas_hoy,kpis.ingresos_mes
+
 REPORTES BÁSICOS CON EXPORTACIÓN PDF/EXCEL:
 - GET /api/reportes/reportes/dashboard-kpis/                          - KPIs principales del dashboard
 - GET /api/reportes/reportes/estadisticas-generales/                  - Estadísticas completas del sistema
@@ -28,19 +31,37 @@ REPORTES BÁSICOS CON EXPORTACIÓN PDF/EXCEL:
 - GET /api/reportes/reportes/top-procedimientos/?limite=5             - Procedimientos más realizados
 - GET /api/reportes/reportes/ocupacion-odontologos/?mes=2025-11       - Tasa ocupación por doctor
 - GET /api/reportes/reportes/reporte-financiero/?periodo=2025-11      - Resumen financiero detallado
+- GET /api/reportes/reportes/antiguedad-saldos/                       - Aging de cuentas por cobrar (0-30/31-60/61-90/90+)
 
 NUEVOS REPORTES DINÁMICOS (CU37 - Personalización Total):
 - GET /api/reportes/reportes/reporte-pacientes/?activo=true&desde=2025-01-01&formato=excel
+- GET /api/reportes/reportes/reporte-pacientes/?ordenar=valor&inactivo_dias=180
 - GET /api/reportes/reportes/reporte-tratamientos/?estado=EN_PROGRESO&formato=pdf
 - GET /api/reportes/reportes/reporte-inventario/?stock_bajo=true&categoria=FARMACO&formato=excel
 - GET /api/reportes/reportes/reporte-citas-odontologo/?mes=2025-11&estado=COMPLETADA&formato=pdf
 - GET /api/reportes/reportes/reporte-ingresos-diarios/?desde=2025-11-01&hasta=2025-11-30&formato=excel
 - GET /api/reportes/reportes/reporte-servicios-populares/?limite=20&formato=pdf
 
+ANALÍTICA VECTORIZADA (rangos largos, requiere NumPy; 501 si no está instalado):
+- GET /api/reportes/reportes/analitica-ingresos/?desde=2023-01-01&hasta=2025-12-31
+- GET /api/reportes/reportes/analitica-retencion/?desde=2024-01-01&meses=6
+- GET /api/reportes/reportes/analitica-productividad/?desde=2025-01-01&hasta=2025-12-31
+- GET /api/reportes/reportes/pronostico-inventario/?ventana=30&dias_entrega=7&solo_riesgo=true
+
+PAQUETES (varios reportes en una descarga, consultas compartidas):
+- GET /api/reportes/reportes/paquete/?reportes=tendencia-citas,ocupacion-odontologos,reporte-ingresos-diarios&desde=2025-11-01&hasta=2025-11-30&formato=excel
+  formato=excel: una hoja por reporte; formato=pdf: ZIP con un PDF por reporte (streaming)
+
 BITÁCORA/AUDITORÍA (CU39 - Implementado):
 - GET /api/reportes/bitacora/ - Lista todas las acciones registradas
 - GET /api/reportes/bitacora/?usuario=1&accion=CREAR&desde=2025-01-01&hasta=2025-12-31
   Filtros: usuario, accion, desde, hasta, modelo, ip, descripcion
+- GET /api/reportes/bitacora/?busqueda=factura anulada&modo=palabras - Texto completo con ranking
+  Modos: palabras (websearch: "frase exacta", -excluir, OR), frase, simple
+  Si el rango llega a fechas archivadas (sin ?desde= o ?desde= hasta el último día archivado),
+  el listado incluye los registros archivados con `python manage.py archivar_bitacora`
+  ("archivado": true). Con ?busqueda= u otro ?ordering= se listan solo los activos
+  ("archivo_omitido" / encabezado X-Bitacora-Archivo-Omitido)
 - GET /api/reportes/bitacora/estadisticas/?dias=7 - Estadísticas de actividad
 - GET /api/reportes/bitacora/exportar/?formato=excel&desde=2025-01-01 - Exportar bitácora
 
@@ -1,317 +1,136 @@
 """
 Utilidades para generación de reportes en diferentes formatos
+
+Los generadores PDF y Excel viven en ``reportes/exporters`` y se importan bajo
+demanda; ``PDFReportGenerator``/``ExcelReportGenerator`` siguen disponibles
+desde este módulo por compatibilidad (ver ``__getattr__``).
 """
-from io import BytesIO
-from datetime import datetime
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
-from django.http import HttpResponse
-
-
-class PDFReportGenerator:
-    """Generador de reportes PDF con formato profesional"""
-    
-    def __init__(self, title, tenant_name="Clínica Dental"):
-        self.buffer = BytesIO()
-        self.doc = SimpleDocTemplate(
-            self.buffer,
-            pagesize=letter,
-            rightMargin=0.75*inch,
-            leftMargin=0.75*inch,
-            topMargin=1*inch,
-            bottomMargin=0.75*inch
-        )
-        self.title = title
-        self.tenant_name = tenant_name
-        self.styles = getSampleStyleSheet()
-        self.story = []
-        self._setup_custom_styles()
-    
-    def _setup_custom_styles(self):
-        """Configura estilos personalizados"""
-        self.styles.add(ParagraphStyle(
-            name='CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=18,
-            textColor=colors.HexColor('#1e3a8a'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        ))
-        
-        self.styles.add(ParagraphStyle(
-            name='CustomSubtitle',
-            parent=self.styles['Heading2'],
-            fontSize=14,
-            textColor=colors.HexColor('#3b82f6'),
-            spaceAfter=12,
-            spaceBefore=12,
-            fontName='Helvetica-Bold'
-        ))
-        
-        self.styles.add(ParagraphStyle(
-            name='CustomNormal',
-            parent=self.styles['Normal'],
-            fontSize=10,
-            spaceAfter=6
-        ))
-    
-    def add_header(self):
-        """Añade encabezado al reporte"""
-        # Título de la clínica
-        clinic_title = Paragraph(self.tenant_name, self.styles['CustomTitle'])
-        self.story.append(clinic_title)
-        
-        # Título del reporte
-        report_title = Paragraph(self.title, self.styles['CustomSubtitle'])
-        self.story.append(report_title)
-        
-        # Fecha de generación
-        fecha = datetime.now().strftime("%d/%m/%Y %H:%M")
-        fecha_text = Paragraph(f"<i>Generado el: {fecha}</i>", self.styles['CustomNormal'])
-        self.story.append(fecha_text)
-        self.story.append(Spacer(1, 0.3*inch))
-    
-    def add_table(self, data, col_widths=None, title=None):
-        """
-        Añade una tabla al reporte
-        
-        Args:
-            data: Lista de listas con los datos (primera fila = encabezados)
-            col_widths: Lista con anchos de columnas (opcional)
-            title: Título de la tabla (opcional)
-        """
-        if title:
-            self.story.append(Paragraph(title, self.styles['CustomSubtitle']))
-            self.story.append(Spacer(1, 0.1*inch))
-        
-        if not data or len(data) == 0:
-            self.story.append(Paragraph("No hay datos disponibles", self.styles['CustomNormal']))
-            return
-        
-        # Crear tabla
-        table = Table(data, colWidths=col_widths)
-        
-        # Estilo de la tabla
-        style = TableStyle([
-            # Encabezado
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            
-            # Contenido
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-            
-            # Bordes
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#1e3a8a')),
-            
-            # Alternar colores en filas
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-        ])
-        
-        table.setStyle(style)
-        self.story.append(table)
-        self.story.append(Spacer(1, 0.3*inch))
-    
-    def add_key_metrics(self, metrics):
-        """
-        Añade métricas clave en formato destacado
-        
-        Args:
-            metrics: Diccionario con nombre_metrica: valor
-        """
-        data = [['Métrica', 'Valor']]
-        for key, value in metrics.items():
-            data.append([key, str(value)])
-        
-        self.add_table(data, col_widths=[4*inch, 2*inch], title="Métricas Principales")
-    
-    def add_paragraph(self, text, style='CustomNormal'):
-        """Añade un párrafo de texto"""
-        self.story.append(Paragraph(text, self.styles[style]))
-        self.story.append(Spacer(1, 0.1*inch))
-    
-    def generate(self):
-        """Genera el PDF y retorna HttpResponse"""
-        self.doc.build(self.story)
-        self.buffer.seek(0)
-        
-        response = HttpResponse(self.buffer.getvalue(), content_type='application/pdf')
-        filename = f"{self.title.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        return response
-
-
-class ExcelReportGenerator:
-    """Generador de reportes Excel con formato profesional"""
-    
-    def __init__(self, title, tenant_name="Clínica Dental"):
-        self.workbook = Workbook()
-        self.worksheet = self.workbook.active
-        self.title = title
-        self.tenant_name = tenant_name
-        self.current_row = 1
-        self._setup_styles()
-    
-    def _setup_styles(self):
-        """Define estilos reutilizables"""
-        self.header_font = Font(name='Arial', size=14, bold=True, color='FFFFFF')
-        self.header_fill = PatternFill(start_color='1e3a8a', end_color='1e3a8a', fill_type='solid')
-        
-        self.title_font = Font(name='Arial', size=16, bold=True, color='1e3a8a')
-        self.subtitle_font = Font(name='Arial', size=12, bold=True, color='3b82f6')
-        self.normal_font = Font(name='Arial', size=10)
-        
-        self.center_alignment = Alignment(horizontal='center', vertical='center')
-        self.left_alignment = Alignment(horizontal='left', vertical='center')
-        self.right_alignment = Alignment(horizontal='right', vertical='center')
-        
-        self.border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-    
-    def add_header(self):
-        """Añade encabezado al reporte"""
-        # Título de la clínica
-        self.worksheet.merge_cells(f'A{self.current_row}:F{self.current_row}')
-        cell = self.worksheet[f'A{self.current_row}']
-        cell.value = self.tenant_name
-        cell.font = self.title_font
-        cell.alignment = self.center_alignment
-        self.current_row += 1
-        
-        # Título del reporte
-        self.worksheet.merge_cells(f'A{self.current_row}:F{self.current_row}')
-        cell = self.worksheet[f'A{self.current_row}']
-        cell.value = self.title
-        cell.font = self.subtitle_font
-        cell.alignment = self.center_alignment
-        self.current_row += 1
-        
-        # Fecha
-        self.worksheet.merge_cells(f'A{self.current_row}:F{self.current_row}')
-        cell = self.worksheet[f'A{self.current_row}']
-        cell.value = f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-        cell.font = Font(name='Arial', size=9, italic=True)
-        cell.alignment = self.center_alignment
-        self.current_row += 2
-    
-    def add_table(self, data, title=None):
-        """
-        Añade una tabla al reporte
-        
-        Args:
-            data: Lista de listas (primera fila = encabezados)
-            title: Título de la tabla (opcional)
-        """
-        if title:
-            self.worksheet.merge_cells(
-                f'A{self.current_row}:{get_column_letter(len(data[0]))}{self.current_row}'
-            )
-            cell = self.worksheet[f'A{self.current_row}']
-            cell.value = title
-            cell.font = self.subtitle_font
-            cell.alignment = self.left_alignment
-            self.current_row += 1
-        
-        if not data or len(data) == 0:
-            cell = self.worksheet[f'A{self.current_row}']
-            cell.value = "No hay datos disponibles"
-            cell.font = self.normal_font
-            self.current_row += 2
-            return
-        
-        # Encabezados
-        for col_idx, header in enumerate(data[0], start=1):
-            cell = self.worksheet.cell(row=self.current_row, column=col_idx)
-            cell.value = header
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.alignment = self.center_alignment
-            cell.border = self.border
-        
-        self.current_row += 1
-        
-        # Datos
-        for row_data in data[1:]:
-            for col_idx, value in enumerate(row_data, start=1):
-                cell = self.worksheet.cell(row=self.current_row, column=col_idx)
-                cell.value = value
-                cell.font = self.normal_font
-                cell.alignment = self.left_alignment
-                cell.border = self.border
-                
-                # Alternar color de fondo
-                if self.current_row % 2 == 0:
-                    cell.fill = PatternFill(start_color='F0F0F0', end_color='F0F0F0', fill_type='solid')
-            
-            self.current_row += 1
-        
-        # Ajustar ancho de columnas
-        for col_idx in range(1, len(data[0]) + 1):
-            column_letter = get_column_letter(col_idx)
-            max_length = max(
-                len(str(self.worksheet[f'{column_letter}{row}'].value or ''))
-                for row in range(self.current_row - len(data), self.current_row)
-            )
-            self.worksheet.column_dimensions[column_letter].width = min(max_length + 2, 50)
-        
-        self.current_row += 1
-    
-    def add_key_metrics(self, metrics):
-        """
-        Añade métricas clave en formato destacado
-        
-        Args:
-            metrics: Diccionario con nombre_metrica: valor
-        """
-        data = [['Métrica', 'Valor']]
-        for key, value in metrics.items():
-            data.append([key, value])
-        
-        self.add_table(data, title="Métricas Principales")
-    
-    def generate(self):
-        """Genera el Excel y retorna HttpResponse"""
-        buffer = BytesIO()
-        self.workbook.save(buffer)
-        buffer.seek(0)
-        
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        filename = f"{self.title.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        return response
+import importlib
+from decimal import Decimal, ROUND_HALF_UP
+
+
+_CENTAVO = Decimal('0.01')
+
+
+class MoneyAccumulator:
+    """
+    Acumulador de montos en centavos enteros para los pipelines de reportes.
+
+    Suma enteros en lugar de encadenar ``Decimal``/``float`` por fila, no tiene
+    deriva de punto flotante y solo se formatea una vez al generar la salida:
+    - JSON: ``to_json()`` (float exacto a 2 decimales)
+    - PDF: ``str()`` / ``format_currency()``
+    - Excel: ``ExcelReportGenerator`` escribe el ``Decimal`` con formato moneda
+
+    Ejemplo:
+        total = MoneyAccumulator()
+        for factura in facturas:
+            total += factura.monto_total
+        total.to_json()  # 1530.5
+        str(total)       # '$1,530.50'
+    """
+    __slots__ = ('centavos',)
+
+    def __init__(self, valor=None):
+        self.centavos = self._a_centavos(valor)
+
+    @classmethod
+    def from_centavos(cls, centavos):
+        acumulador = cls()
+        acumulador.centavos = int(centavos)
+        return acumulador
+
+    @classmethod
+    def sumar(cls, valores):
+        """Suma un iterable de montos (Decimal, int, float, str o None)."""
+        a_centavos = cls._a_centavos
+        return cls.from_centavos(sum(a_centavos(valor) for valor in valores))
+
+    @staticmethod
+    def _a_centavos(valor):
+        """Convierte un monto a centavos enteros (redondeo half-up)."""
+        if valor is None:
+            return 0
+        if isinstance(valor, MoneyAccumulator):
+            return valor.centavos
+        if isinstance(valor, Decimal):
+            return int(valor.quantize(_CENTAVO, rounding=ROUND_HALF_UP).scaleb(2))
+        if isinstance(valor, bool):
+            raise TypeError("MoneyAccumulator no acepta valores booleanos")
+        if isinstance(valor, int):
+            return valor * 100
+        if isinstance(valor, float):
+            # Los float de reportes provienen de montos de 2 decimales
+            return round(valor * 100)
+        return int(Decimal(str(valor)).quantize(_CENTAVO, rounding=ROUND_HALF_UP).scaleb(2))
+
+    def add(self, valor):
+        self.centavos += self._a_centavos(valor)
+        return self
+
+    __iadd__ = add
+
+    def __add__(self, otro):
+        return MoneyAccumulator.from_centavos(self.centavos + self._a_centavos(otro))
+
+    __radd__ = __add__
+
+    def __sub__(self, otro):
+        return MoneyAccumulator.from_centavos(self.centavos - self._a_centavos(otro))
+
+    def __rsub__(self, otro):
+        return MoneyAccumulator.from_centavos(self._a_centavos(otro) - self.centavos)
+
+    def __neg__(self):
+        return MoneyAccumulator.from_centavos(-self.centavos)
+
+    def __truediv__(self, divisor):
+        """División entera con redondeo half-up (promedios)."""
+        if not divisor:
+            return MoneyAccumulator()
+        cociente, resto = divmod(abs(self.centavos), int(divisor))
+        if resto * 2 >= int(divisor):
+            cociente += 1
+        return MoneyAccumulator.from_centavos(cociente if self.centavos >= 0 else -cociente)
+
+    def __eq__(self, otro):
+        try:
+            return self.centavos == self._a_centavos(otro)
+        except (TypeError, ArithmeticError, ValueError):
+            return NotImplemented
+
+    def __hash__(self):
+        return hash(self.centavos)
+
+    def __lt__(self, otro):
+        return self.centavos < self._a_centavos(otro)
+
+    def __bool__(self):
+        return self.centavos != 0
+
+    def to_decimal(self):
+        return Decimal(self.centavos).scaleb(-2)
+
+    def to_json(self):
+        return self.centavos / 100
+
+    __float__ = to_json
+
+    def __str__(self):
+        signo = '-' if self.centavos < 0 else ''
+        enteros, centavos = divmod(abs(self.centavos), 100)
+        return f"${signo}{enteros:,}.{centavos:02d}"
+
+    def __repr__(self):
+        return f"MoneyAccumulator('{self.to_decimal()}')"
 
 
 def format_currency(value):
     """Formatea un valor como moneda"""
     if value is None:
         return "$0.00"
+    if isinstance(value, MoneyAccumulator):
+        return str(value)
     return f"${value:,.2f}"
 
 
@@ -329,3 +148,46 @@ def format_date(date_obj):
     if isinstance(date_obj, str):
         return date_obj
     return date_obj.strftime("%d/%m/%Y")
+
+
+def seleccionar_campos(datos, campos):
+    """
+    Recorta un payload JSON a ``campos`` (rutas con punto, p. ej. 'kpis.citas_hoy').
+
+    En las listas se aplica a cada elemento; sin campos devuelve ``datos`` igual.
+    """
+    if not campos:
+        return datos
+    arbol = {}
+    for campo in campos:
+        nodo = arbol
+        for parte in campo.split('.'):
+            nodo = nodo.setdefault(parte, {})
+    return _recortar(datos, arbol)
+
+
+def _recortar(datos, arbol):
+    if not arbol:
+        return datos
+    if isinstance(datos, list):
+        return [_recortar(elemento, arbol) for elemento in datos]
+    if isinstance(datos, dict):
+        return {clave: _recortar(valor, arbol[clave]) for clave, valor in datos.items() if clave in arbol}
+    return datos
+
+
+# Nombres que antes se definían aquí -> módulo donde viven ahora
+_EXPORTADORES = {
+    'PDFReportGenerator': 'reportes.exporters.pdf',
+    'ExcelReportGenerator': 'reportes.exporters.excel',
+    'EstilosExcel': 'reportes.exporters.excel',
+    'estilos_excel': 'reportes.exporters.excel',
+}
+
+
+def __getattr__(nombre):
+    """Importa el backend de exportación solo cuando se accede a él."""
+    modulo = _EXPORTADORES.get(nombre)
+    if modulo is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    return getattr(importlib.import_module(modulo), nombre)
@@ -1,14 +1,22 @@
 # reportes/views.py
 
+import copy
+import json
 import logging
 from rest_framework import viewsets, permissions, status
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Count, Sum, Avg, Q, F, Max, Min
+from rest_framework.settings import api_settings
+from django.db.models import Count, Sum, Avg, Q, F, Max, Min, Case, When, Value, CharField, OuterRef, Subquery, Window
+from django.db.models.functions import Coalesce
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from django.utils import timezone
+from django.http import StreamingHttpResponse
 from datetime import timedelta, date
 from decimal import Decimal
+from itertools import islice
 
 # Configurar logger
 logger = logging.getLogger(__name__)
@@ -31,8 +39,71 @@ from .serializers import (
 )
 
 # Importamos las utilidades de exportación
-from .utils import PDFReportGenerator, ExcelReportGenerator, format_currency, format_date
-from .models import BitacoraAccion
+from .utils import MoneyAccumulator, format_currency, format_date, seleccionar_campos
+from . import exporters
+from .models import BitacoraAccion, BitacoraContador, BITACORA_BUSQUEDA_CONFIG, peso_muestreo
+from .query_batch import AggregateBatch, ejecutar_en_paralelo
+from .expressions import saldo_factura, valor_inventario, estado_stock
+from .projection import Columna, Proyeccion, display, nombre_completo
+from .snapshots import servir_snapshot
+from . import bundle
+
+
+# ============================================================================
+# COLUMNAS DE LOS REPORTES TABULARES
+# ============================================================================
+
+PROYECCION_PACIENTES = Proyeccion(
+    Columna('nombre', 'usuario__first_name', 'usuario__last_name', calcular=nombre_completo),
+    Columna('email', 'usuario__email'),
+    Columna('telefono', calcular=lambda telefono: telefono or 'N/A'),
+    Columna('fecha_nacimiento', calcular=format_date),
+    Columna('fecha_registro', 'usuario__date_joined', calcular=format_date),
+    Columna('activo', 'usuario__is_active', calcular=lambda activo: 'Sí' if activo else 'No'),
+    Columna('total_citas', 'resumen_reportes__total_citas', calcular=lambda total: total or 0),
+    Columna('total_gastado', 'resumen_reportes__total_facturado',
+            calcular=lambda monto: format_currency(monto or Decimal('0.00'))),
+    Columna('saldo_pendiente', 'resumen_reportes__saldo_pendiente',
+            calcular=lambda monto: format_currency(monto or Decimal('0.00'))),
+    Columna('ultima_visita', 'resumen_reportes__ultima_visita', calcular=format_date),
+)
+
+PROYECCION_TRATAMIENTOS = Proyeccion(
+    Columna('paciente', 'paciente__usuario__first_name', 'paciente__usuario__last_name', calcular=nombre_completo),
+    Columna('odontologo', 'odontologo__usuario__first_name', 'odontologo__usuario__last_name', calcular=nombre_completo),
+    Columna('fecha_creacion', calcular=format_date),
+    Columna('estado', calcular=display(PlanDeTratamiento._meta.get_field('estado').choices)),
+    Columna('total_items'),
+    Columna('completados'),
+    Columna('progreso', 'completados', 'total_items',
+            calcular=lambda completados, total: f"{(completados / total * 100) if total else 0:.1f}%"),
+    Columna('costo_total', 'precio_total_plan', calcular=format_currency),
+)
+
+PROYECCION_INVENTARIO = Proyeccion(
+    Columna('codigo'),
+    Columna('nombre'),
+    Columna('categoria', 'categoria__nombre'),
+    Columna('stock_actual', calcular=float),
+    Columna('stock_minimo', calcular=float),
+    Columna('estado_stock'),
+    Columna('unidad_medida'),
+    Columna('precio_costo', calcular=format_currency),
+    Columna('precio_venta', calcular=format_currency),
+    Columna('valor_total', calcular=format_currency),
+    Columna('proveedor', calcular=lambda proveedor: proveedor or 'N/A'),
+)
+
+# Columnas de ventana (totales) leídas en la misma consulta del listado
+PROYECCION_INVENTARIO_COMPLETA = Proyeccion(
+    *PROYECCION_INVENTARIO.columnas,
+    Columna('categoria_id'),
+    Columna('items_categoria'),
+    Columna('valor_categoria'),
+    Columna('valor_inventario'),
+    Columna('items_stock_bajo'),
+    Columna('items_agotados'),
+)
 
 
 class ReportesViewSet(viewsets.ViewSet):
@@ -47,7 +118,11 @@ class ReportesViewSet(viewsets.ViewSet):
     - Añadir parámetro ?formato=excel para exportar a Excel
     - Sin parámetro: Devuelve JSON (por defecto)
     
+    Los endpoints con @servir_snapshot devuelven el snapshot nocturno si los
+    datos no cambiaron desde que se generó (?fresco=1 fuerza el cálculo).
+    
     Endpoints disponibles:
+    - GET /api/reportes/dashboard/ - Todos los widgets del dashboard en una respuesta
     - GET /api/reportes/dashboard-kpis/ - KPIs principales
     - GET /api/reportes/tendencia-citas/ - Gráfico de tendencia de citas
     - GET /api/reportes/top-procedimientos/ - Procedimientos más realizados
@@ -57,9 +132,15 @@ class ReportesViewSet(viewsets.ViewSet):
     - GET /api/reportes/reporte-pacientes/ - Reporte detallado de pacientes
     - GET /api/reportes/reporte-tratamientos/ - Reporte de tratamientos
     - GET /api/reportes/reporte-inventario/ - Reporte de estado de inventario
+    - GET /api/reportes/pronostico-inventario/ - Días de stock restante y punto de reorden
+    - GET /api/reportes/paquete/ - Varios reportes en un Excel multi-hoja o un ZIP de PDFs
     - GET /api/reportes/reporte-citas-odontologo/ - Citas por odontólogo
     - GET /api/reportes/reporte-ingresos-diarios/ - Ingresos día a día
     - GET /api/reportes/reporte-servicios-populares/ - Servicios más demandados
+    - GET /api/reportes/antiguedad-saldos/ - Antigüedad de cuentas por cobrar
+    - GET /api/reportes/analitica-ingresos/ - Curva de ingresos, ticket p50/p90, medias móviles
+    - GET /api/reportes/analitica-retencion/ - Retención de pacientes por cohorte
+    - GET /api/reportes/analitica-productividad/ - Productividad por odontólogo
     """
     permission_classes = [permissions.IsAuthenticated]  # Solo usuarios logueados
 
@@ -94,7 +175,7 @@ class ReportesViewSet(viewsets.ViewSet):
             
             if formato == 'pdf':
                 logger.info(f"📄 Generando PDF: {title}")
-                pdf = PDFReportGenerator(title, tenant_name)
+                pdf = exporters.obtener('pdf')(title, tenant_name)
                 pdf.add_header()
                 
                 if metrics:
@@ -113,7 +194,7 @@ class ReportesViewSet(viewsets.ViewSet):
             
             elif formato == 'excel':
                 logger.info(f"📊 Generando Excel: {title}")
-                excel = ExcelReportGenerator(title, tenant_name)
+                excel = exporters.obtener('excel')(title, tenant_name)
                 excel.add_header()
                 
                 if metrics:
@@ -138,7 +219,105 @@ class ReportesViewSet(viewsets.ViewSet):
         
         return None
 
+    # Widgets del dashboard compuesto: nombre -> acción que calcula su payload
+    WIDGETS_DASHBOARD = {
+        'dashboard-kpis': 'dashboard_kpis',
+        'tendencia-citas': 'tendencia_citas',
+        'top-procedimientos': 'top_procedimientos',
+        'ocupacion-odontologos': 'ocupacion_odontologos',
+    }
+    
+    @action(detail=False, methods=['get'], url_path='dashboard')
+    def dashboard(self, request):
+        """
+        Todos los widgets del dashboard en una sola respuesta.
+        
+        GET /api/reportes/dashboard/
+        GET /api/reportes/dashboard/?widgets=dashboard-kpis,tendencia-citas&dias=30
+        GET /api/reportes/dashboard/?fields[dashboard-kpis]=kpis.citas_hoy,kpis.ingresos_mes&fields[tendencia-citas]=fecha,cantidad
+        
+        Parámetros:
+        - widgets: nombres separados por coma (default: todos, ver WIDGETS_DASHBOARD)
+        - fields[<widget>]: campos a devolver de ese widget (rutas con punto)
+        - dias / limite / mes: los mismos parámetros de cada widget individual
+        
+        Respuesta: {"<widget>": <mismo payload que su endpoint>, ...}. Los widgets
+        se calculan en paralelo; si uno falla, su entrada es {"error": "..."} y
+        el resto se devuelve igual.
+        """
+        if request.query_params.get('formato', '').lower() in ('pdf', 'excel'):
+            return Response(
+                {'error': 'El dashboard compuesto solo se devuelve en JSON'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        widgets_param = request.query_params.get('widgets')
+        nombres = (
+            list(dict.fromkeys(nombre.strip() for nombre in widgets_param.split(',') if nombre.strip()))
+            if widgets_param else list(self.WIDGETS_DASHBOARD)
+        )
+        desconocidos = [nombre for nombre in nombres if nombre not in self.WIDGETS_DASHBOARD]
+        if not nombres or desconocidos:
+            return Response(
+                {
+                    'error': f"Widgets inválidos: {', '.join(desconocidos)}" if desconocidos
+                    else 'Indique al menos un widget',
+                    'disponibles': list(self.WIDGETS_DASHBOARD),
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Cada hilo recibe su propio request: el de DRF cachea usuario, datos y
+        # parámetros de forma perezosa y no es seguro compartirlo entre hilos
+        requests_widget = {nombre: self._request_widget(request) for nombre in nombres}
+        resultados = ejecutar_en_paralelo({
+            nombre: (lambda nombre=nombre: self._payload_widget(requests_widget[nombre], nombre))
+            for nombre in nombres
+        })
+        
+        data = {}
+        for nombre in nombres:
+            campos = request.query_params.get(f'fields[{nombre}]')
+            payload = resultados[nombre]
+            if campos and not (isinstance(payload, dict) and 'error' in payload):
+                payload = seleccionar_campos(payload, [campo.strip() for campo in campos.split(',') if campo.strip()])
+            data[nombre] = payload
+        
+        return Response(data)
+    
+    @staticmethod
+    def _request_widget(request):
+        """Copia independiente del request (con el usuario ya autenticado) para un widget."""
+        http_request = copy.copy(request._request)
+        http_request.GET = request._request.GET.copy()
+        copia = Request(
+            http_request,
+            parsers=request.parsers,
+            authenticators=request.authenticators,
+            negotiator=request.negotiator,
+            parser_context=dict(request.parser_context or {}),
+        )
+        copia.user = request.user
+        copia.auth = request.auth
+        return copia
+    
+    def _payload_widget(self, request, nombre):
+        """Ejecuta la acción del widget y devuelve su payload JSON (o {'error': ...})."""
+        try:
+            response = getattr(self, self.WIDGETS_DASHBOARD[nombre])(request)
+        except Exception as e:
+            logger.error(f"❌ Error en widget {nombre} del dashboard: {str(e)}", exc_info=True)
+            return {'error': f'No se pudo calcular {nombre}'}
+        
+        if response.status_code >= 400:
+            return {'error': response.data.get('error', f'No se pudo calcular {nombre}')}
+        if hasattr(response, 'data'):
+            return response.data
+        # Snapshot servido por @servir_snapshot (HttpResponse con el JSON ya renderizado)
+        return json.loads(response.content)
+    
     @action(detail=False, methods=['get'], url_path='dashboard-kpis')
+    @servir_snapshot
     def dashboard_kpis(self, request):
         """
         Devuelve los KPIs principales para el dashboard.
@@ -173,11 +352,11 @@ class ReportesViewSet(viewsets.ViewSet):
         # Inicializar variables con valores por defecto
         total_pacientes = 0
         citas_hoy = 0
-        ingresos_mes = Decimal('0.00')
-        saldo_pendiente = Decimal('0.00')
+        ingresos_mes = MoneyAccumulator()
+        saldo_pendiente = MoneyAccumulator()
         tratamientos_activos = 0
         planes_completados = 0
-        promedio_factura = Decimal('0.00')
+        promedio_factura = MoneyAccumulator()
         facturas_vencidas = 0
         total_procedimientos = 0
         pacientes_nuevos_mes = 0
@@ -199,21 +378,16 @@ class ReportesViewSet(viewsets.ViewSet):
             ).count()
             
             # 3. Ingresos del Mes (Pagos completados este mes)
-            ingresos_mes = Pago.objects.filter(
+            ingresos_mes = MoneyAccumulator(Pago.objects.filter(
                 fecha_pago__year=anio_actual,
                 fecha_pago__month=mes_actual,
                 estado_pago='COMPLETADO'
-            ).aggregate(total=Sum('monto_pagado'))['total'] or Decimal('0.00')
+            ).aggregate(total=Sum('monto_pagado'))['total'])
             
-            # 4. Saldo Pendiente (Total de facturas pendientes)
-            facturas_pendientes = Factura.objects.filter(estado='PENDIENTE')
-            saldo_pendiente = Decimal('0.00')
-            for factura in facturas_pendientes:
-                try:
-                    saldo_pendiente += factura.saldo_pendiente
-                except Exception as e:
-                    # Si una factura tiene problemas, continuar con las demás
-                    continue
+            # 4. Saldo Pendiente (Total de facturas pendientes, calculado en la BD)
+            saldo_pendiente = MoneyAccumulator(Factura.objects.filter(
+                estado='PENDIENTE'
+            ).aggregate(total=Sum(saldo_factura()))['total'])
             
             # 5. Tratamientos Activos (Planes en progreso)
             tratamientos_activos = PlanDeTratamiento.objects.filter(
@@ -232,9 +406,9 @@ class ReportesViewSet(viewsets.ViewSet):
                 fecha_emision__year=anio_actual,
                 fecha_emision__month=mes_actual
             )
-            total_facturado = facturas_mes.aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
+            total_facturado = MoneyAccumulator(facturas_mes.aggregate(total=Sum('monto_total'))['total'])
             num_facturas = facturas_mes.count()
-            promedio_factura = (total_facturado / num_facturas) if num_facturas > 0 else Decimal('0.00')
+            promedio_factura = total_facturado / num_facturas
             
             # 8. Facturas Vencidas (pendientes del mes pasado o anteriores)
             # Como no hay fecha_vencimiento, consideramos facturas PENDIENTES de meses anteriores
@@ -269,11 +443,11 @@ class ReportesViewSet(viewsets.ViewSet):
         data = [
             {"etiqueta": "Pacientes Activos", "valor": total_pacientes},
             {"etiqueta": "Citas Hoy", "valor": citas_hoy},
-            {"etiqueta": "Ingresos Este Mes", "valor": float(ingresos_mes)},
-            {"etiqueta": "Saldo Pendiente", "valor": float(saldo_pendiente)},
+            {"etiqueta": "Ingresos Este Mes", "valor": ingresos_mes.to_json()},
+            {"etiqueta": "Saldo Pendiente", "valor": saldo_pendiente.to_json()},
             {"etiqueta": "Tratamientos Activos", "valor": tratamientos_activos},
             {"etiqueta": "Planes Completados", "valor": planes_completados},
-            {"etiqueta": "Promedio por Factura", "valor": float(promedio_factura)},
+            {"etiqueta": "Promedio por Factura", "valor": promedio_factura.to_json()},
             {"etiqueta": "Facturas Vencidas", "valor": facturas_vencidas},
             {"etiqueta": "Total Procedimientos", "valor": total_procedimientos},
             {"etiqueta": "Pacientes Nuevos Mes", "valor": pacientes_nuevos_mes},
@@ -287,11 +461,11 @@ class ReportesViewSet(viewsets.ViewSet):
             metrics={
                 "Pacientes Activos": total_pacientes,
                 "Citas Hoy": citas_hoy,
-                "Ingresos Este Mes": format_currency(Decimal(str(ingresos_mes))),
-                "Saldo Pendiente": format_currency(Decimal(str(saldo_pendiente))),
+                "Ingresos Este Mes": ingresos_mes,
+                "Saldo Pendiente": saldo_pendiente,
                 "Tratamientos Activos": tratamientos_activos,
                 "Planes Completados": planes_completados,
-                "Promedio por Factura": format_currency(Decimal(str(promedio_factura))),
+                "Promedio por Factura": promedio_factura,
                 "Facturas Vencidas": facturas_vencidas,
                 "Total Procedimientos": total_procedimientos,
                 "Pacientes Nuevos Mes": pacientes_nuevos_mes
@@ -307,11 +481,11 @@ class ReportesViewSet(viewsets.ViewSet):
             'kpis': {  # Objeto plano para acceso directo
                 'total_pacientes': total_pacientes,
                 'citas_hoy': citas_hoy,
-                'ingresos_mes': float(ingresos_mes),
-                'saldo_pendiente': float(saldo_pendiente),
+                'ingresos_mes': ingresos_mes.to_json(),
+                'saldo_pendiente': saldo_pendiente.to_json(),
                 'tratamientos_activos': tratamientos_activos,
                 'planes_completados': planes_completados,
-                'promedio_factura': float(promedio_factura),
+                'promedio_factura': promedio_factura.to_json(),
                 'facturas_vencidas': facturas_vencidas,
                 'total_procedimientos': total_procedimientos,
                 'pacientes_nuevos_mes': pacientes_nuevos_mes
@@ -454,6 +628,7 @@ class ReportesViewSet(viewsets.ViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='estadisticas-generales')
+    @servir_snapshot
     def estadisticas_generales(self, request):
         """
         Estadísticas generales completas del sistema.
@@ -471,113 +646,111 @@ class ReportesViewSet(viewsets.ViewSet):
         anio_actual = hoy.year
         inicio_mes = date(anio_actual, mes_actual, 1)
         
+        # Todas las métricas son independientes: se agrupan por modelo en un
+        # único aggregate() con agregados condicionales y los lotes de cada
+        # modelo se ejecutan en paralelo (17 consultas -> 8 round trips).
+        filtro_mes_cita = Q(fecha_hora__year=anio_actual, fecha_hora__month=mes_actual)
+        filtro_mes_factura = Q(fecha_emision__year=anio_actual, fecha_emision__month=mes_actual)
+        lote = AggregateBatch()
+        
         # ====== ESTADÍSTICAS DE PACIENTES ======
-        total_pacientes_activos = PerfilPaciente.objects.filter(
-            usuario__is_active=True
-        ).count()
+        lote.add(
+            PerfilPaciente.objects.filter(usuario__is_active=True),
+            total_pacientes_activos=Count('pk')
+        )
         
         # Pacientes nuevos del mes (usuarios creados en mes actual que tienen perfil paciente)
-        pacientes_nuevos_mes = Usuario.objects.filter(
-            date_joined__year=anio_actual,
-            date_joined__month=mes_actual,
-            perfil_paciente__isnull=False
-        ).count()
+        lote.add(
+            Usuario.objects.filter(
+                date_joined__year=anio_actual,
+                date_joined__month=mes_actual,
+                perfil_paciente__isnull=False
+            ),
+            pacientes_nuevos_mes=Count('pk', distinct=True)
+        )
         
         # ====== ESTADÍSTICAS DE ODONTÓLOGOS ======
-        total_odontologos = PerfilOdontologo.objects.filter(
-            usuario__is_active=True
-        ).count()
+        lote.add(
+            PerfilOdontologo.objects.filter(usuario__is_active=True),
+            total_odontologos=Count('pk')
+        )
         
         # ====== ESTADÍSTICAS DE CITAS ======
-        # Total de citas del mes (excluyendo canceladas)
-        citas_mes_actual = Cita.objects.filter(
-            fecha_hora__year=anio_actual,
-            fecha_hora__month=mes_actual
-        ).exclude(estado='CANCELADA').count()
-        
-        # Citas completadas del mes
-        citas_completadas = Cita.objects.filter(
-            fecha_hora__year=anio_actual,
-            fecha_hora__month=mes_actual,
-            estado='ATENDIDA'
-        ).count()
-        
-        # Citas pendientes del mes (PENDIENTE o CONFIRMADA)
-        citas_pendientes = Cita.objects.filter(
-            fecha_hora__year=anio_actual,
-            fecha_hora__month=mes_actual,
-            estado__in=['PENDIENTE', 'CONFIRMADA']
-        ).count()
-        
-        # Citas canceladas del mes
-        citas_canceladas = Cita.objects.filter(
-            fecha_hora__year=anio_actual,
-            fecha_hora__month=mes_actual,
-            estado='CANCELADA'
-        ).count()
+        lote.add(
+            Cita.objects.filter(filtro_mes_cita),
+            # Total de citas del mes (excluyendo canceladas)
+            citas_mes_actual=Count('pk', filter=~Q(estado='CANCELADA')),
+            # Citas completadas del mes
+            citas_completadas=Count('pk', filter=Q(estado='ATENDIDA')),
+            # Citas pendientes del mes (PENDIENTE o CONFIRMADA)
+            citas_pendientes=Count('pk', filter=Q(estado__in=['PENDIENTE', 'CONFIRMADA'])),
+            # Citas canceladas del mes
+            citas_canceladas=Count('pk', filter=Q(estado='CANCELADA')),
+            # Base para la tasa de ocupación
+            total_citas_mes=Count('pk'),
+            citas_efectivas=Count('pk', filter=Q(estado__in=['CONFIRMADA', 'ATENDIDA'])),
+        )
         
         # ====== ESTADÍSTICAS DE TRATAMIENTOS ======
-        # Planes completados
-        tratamientos_completados = PlanDeTratamiento.objects.filter(
-            estado='completado'
-        ).count()
-        
-        # Planes activos (en_progreso, propuesto, aprobado)
-        planes_activos = PlanDeTratamiento.objects.filter(
-            estado__in=['en_progreso', 'propuesto', 'aprobado']
-        ).count()
+        lote.add(
+            PlanDeTratamiento.objects.all(),
+            # Planes completados
+            tratamientos_completados=Count('pk', filter=Q(estado='completado')),
+            # Planes activos (en_progreso, propuesto, aprobado)
+            planes_activos=Count('pk', filter=Q(estado__in=['en_progreso', 'propuesto', 'aprobado'])),
+        )
         
         # Total de procedimientos realizados
-        total_procedimientos = ItemPlanTratamiento.objects.filter(
-            estado='COMPLETADO'
-        ).count()
+        lote.add(
+            ItemPlanTratamiento.objects.filter(estado='COMPLETADO'),
+            total_procedimientos=Count('pk')
+        )
         
         # ====== ESTADÍSTICAS FINANCIERAS ======
         # Ingresos del mes (pagos completados)
-        ingresos_mes = Pago.objects.filter(
-            fecha_pago__year=anio_actual,
-            fecha_pago__month=mes_actual,
-            estado_pago='COMPLETADO'
-        ).aggregate(total=Sum('monto_pagado'))['total'] or Decimal('0.00')
-        
-        # Monto pendiente de cobro (facturas emitidas - pagado)
-        facturas_mes = Factura.objects.filter(
-            fecha_emision__year=anio_actual,
-            fecha_emision__month=mes_actual
+        lote.add(
+            Pago.objects.filter(
+                fecha_pago__year=anio_actual,
+                fecha_pago__month=mes_actual,
+                estado_pago='COMPLETADO'
+            ),
+            ingresos_mes=Sum('monto_pagado')
         )
         
-        total_facturado_mes = facturas_mes.aggregate(
-            total=Sum('monto_total')
-        )['total'] or Decimal('0.00')
-        
-        total_pagado_mes = facturas_mes.aggregate(
-            total=Sum('monto_pagado')
-        )['total'] or Decimal('0.00')
-        
-        monto_pendiente = total_facturado_mes - total_pagado_mes
-        
-        # Facturas pendientes (estado PENDIENTE con saldo > 0)
-        facturas_vencidas = Factura.objects.filter(
-            estado='PENDIENTE',
-            monto_pagado__lt=F('monto_total')
-        ).count()
+        lote.add(
+            Factura.objects.all(),
+            # Monto pendiente de cobro (facturas emitidas - pagado)
+            total_facturado_mes=Sum('monto_total', filter=filtro_mes_factura),
+            total_pagado_mes=Sum('monto_pagado', filter=filtro_mes_factura),
+            # Facturas pendientes (estado PENDIENTE con saldo > 0)
+            facturas_vencidas=Count('pk', filter=Q(estado='PENDIENTE', monto_pagado__lt=F('monto_total'))),
+            # Promedio de factura
+            promedio_factura=Avg('monto_total'),
+        )
         
-        # Promedio de factura
-        promedio_factura = Factura.objects.aggregate(
-            promedio=Avg('monto_total')
-        )['promedio'] or Decimal('0.00')
+        resultados = lote.execute()
+        
+        total_pacientes_activos = resultados['total_pacientes_activos']
+        pacientes_nuevos_mes = resultados['pacientes_nuevos_mes']
+        total_odontologos = resultados['total_odontologos']
+        citas_mes_actual = resultados['citas_mes_actual']
+        citas_completadas = resultados['citas_completadas']
+        citas_pendientes = resultados['citas_pendientes']
+        citas_canceladas = resultados['citas_canceladas']
+        tratamientos_completados = resultados['tratamientos_completados']
+        planes_activos = resultados['planes_activos']
+        total_procedimientos = resultados['total_procedimientos']
+        ingresos_mes = MoneyAccumulator(resultados['ingresos_mes'])
+        monto_pendiente = (
+            MoneyAccumulator(resultados['total_facturado_mes'])
+            - resultados['total_pagado_mes']
+        )
+        facturas_vencidas = resultados['facturas_vencidas']
+        promedio_factura = MoneyAccumulator(resultados['promedio_factura'])
         
         # ====== TASA DE OCUPACIÓN ======
-        total_citas_mes = Cita.objects.filter(
-            fecha_hora__year=anio_actual,
-            fecha_hora__month=mes_actual
-        ).count()
-        
-        citas_efectivas = Cita.objects.filter(
-            fecha_hora__year=anio_actual,
-            fecha_hora__month=mes_actual,
-            estado__in=['CONFIRMADA', 'ATENDIDA']
-        ).count()
+        total_citas_mes = resultados['total_citas_mes']
+        citas_efectivas = resultados['citas_efectivas']
         
         tasa_ocupacion = (
             (citas_efectivas / total_citas_mes * 100) 
@@ -605,10 +778,10 @@ class ReportesViewSet(viewsets.ViewSet):
             'total_procedimientos': total_procedimientos,
             
             # Financiero
-            'ingresos_mes_actual': float(ingresos_mes),
-            'monto_pendiente': float(monto_pendiente),
+            'ingresos_mes_actual': ingresos_mes.to_json(),
+            'monto_pendiente': monto_pendiente.to_json(),
             'facturas_vencidas': facturas_vencidas,
-            'promedio_factura': float(promedio_factura),
+            'promedio_factura': promedio_factura.to_json(),
             
             # Ocupación
             'tasa_ocupacion': round(tasa_ocupacion, 2)
@@ -629,17 +802,17 @@ class ReportesViewSet(viewsets.ViewSet):
                 {"Métrica": "Planes Completados", "Valor": tratamientos_completados},
                 {"Métrica": "Planes Activos", "Valor": planes_activos},
                 {"Métrica": "Total Procedimientos", "Valor": total_procedimientos},
-                {"Métrica": "Ingresos Mes Actual", "Valor": format_currency(ingresos_mes)},
-                {"Métrica": "Monto Pendiente", "Valor": format_currency(monto_pendiente)},
+                {"Métrica": "Ingresos Mes Actual", "Valor": ingresos_mes},
+                {"Métrica": "Monto Pendiente", "Valor": monto_pendiente},
                 {"Métrica": "Facturas Vencidas", "Valor": facturas_vencidas},
-                {"Métrica": "Promedio por Factura", "Valor": format_currency(promedio_factura)},
+                {"Métrica": "Promedio por Factura", "Valor": promedio_factura},
                 {"Métrica": "Tasa de Ocupación", "Valor": f"{round(tasa_ocupacion, 2)}%"},
             ],
             metrics={
                 "Pacientes Activos": total_pacientes_activos,
                 "Odontólogos": total_odontologos,
                 "Citas del Mes": citas_mes_actual,
-                "Ingresos Mes": format_currency(ingresos_mes),
+                "Ingresos Mes": ingresos_mes,
                 "Tasa Ocupación": f"{round(tasa_ocupacion, 2)}%"
             }
         )
@@ -649,6 +822,7 @@ class ReportesViewSet(viewsets.ViewSet):
         return Response(data)
 
     @action(detail=False, methods=['get'], url_path='reporte-financiero')
+    @servir_snapshot
     def reporte_financiero(self, request):
         """
         Reporte financiero detallado por período.
@@ -802,19 +976,26 @@ class ReportesViewSet(viewsets.ViewSet):
         return Response(data)
     
     @action(detail=False, methods=['get'], url_path='reporte-pacientes')
+    @servir_snapshot
     def reporte_pacientes(self, request):
         """
         Reporte detallado de pacientes con filtros dinámicos.
         
         GET /api/reportes/reporte-pacientes/?activo=true&desde=2025-01-01&hasta=2025-12-31&formato=excel
+        GET /api/reportes/reporte-pacientes/?ordenar=valor&inactivo_dias=180
         
         Parámetros:
         - activo: true/false (filtrar por estado)
         - desde: Fecha de registro desde (YYYY-MM-DD)
         - hasta: Fecha de registro hasta (YYYY-MM-DD)
+        - ordenar: valor (mayor facturación primero)
+        - inactivo_dias: solo pacientes sin visitas atendidas en los últimos N días
         - formato: json/pdf/excel
+        
+        Las estadísticas por paciente se leen del resumen materializado
+        (ResumenPaciente), por lo que el reporte es un solo recorrido.
         """
-        queryset = PerfilPaciente.objects.select_related('usuario').all()
+        queryset = PerfilPaciente.objects.all()
         
         # Filtros dinámicos
         activo = request.query_params.get('activo')
@@ -829,24 +1010,24 @@ class ReportesViewSet(viewsets.ViewSet):
         if hasta:
             queryset = queryset.filter(usuario__date_joined__lte=hasta)
         
-        # Preparar datos
-        data = []
-        for paciente in queryset:
-            # Calcular estadísticas del paciente
-            total_citas = Cita.objects.filter(paciente=paciente).count()
-            facturas = Factura.objects.filter(paciente=paciente)
-            total_gastado = facturas.aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
-            
-            data.append({
-                'nombre': paciente.usuario.full_name,
-                'email': paciente.usuario.email,
-                'telefono': paciente.telefono or 'N/A',
-                'fecha_nacimiento': format_date(paciente.fecha_nacimiento),
-                'fecha_registro': format_date(paciente.usuario.date_joined),
-                'activo': 'Sí' if paciente.usuario.is_active else 'No',
-                'total_citas': total_citas,
-                'total_gastado': format_currency(total_gastado)
-            })
+        inactivo_dias = request.query_params.get('inactivo_dias')
+        if inactivo_dias:
+            try:
+                limite = timezone.now() - timedelta(days=int(inactivo_dias))
+            except ValueError:
+                return Response({'error': 'inactivo_dias debe ser un número'}, status=400)
+            queryset = queryset.filter(
+                Q(resumen_reportes__ultima_visita__lt=limite) |
+                Q(resumen_reportes__ultima_visita__isnull=True)
+            )
+        
+        if request.query_params.get('ordenar') == 'valor':
+            queryset = queryset.order_by(
+                F('resumen_reportes__total_facturado').desc(nulls_last=True)
+            )
+        
+        # Preparar datos (solo las columnas del reporte, sin instanciar modelos)
+        data = PROYECCION_PACIENTES.filas(queryset)
         
         # Exportar si se solicita
         export_response = self._export_report(
@@ -860,6 +1041,7 @@ class ReportesViewSet(viewsets.ViewSet):
         return Response(data)
     
     @action(detail=False, methods=['get'], url_path='reporte-tratamientos')
+    @servir_snapshot
     def reporte_tratamientos(self, request):
         """
         Reporte de tratamientos con filtros dinámicos.
@@ -872,7 +1054,18 @@ class ReportesViewSet(viewsets.ViewSet):
         - hasta: Fecha hasta (YYYY-MM-DD)
         - formato: json/pdf/excel
         """
-        queryset = PlanDeTratamiento.objects.select_related('paciente__usuario', 'odontologo__usuario').all()
+        items = (
+            ItemPlanTratamiento.objects
+            .filter(plan_tratamiento=OuterRef('pk'))
+            .order_by()
+            .values('plan_tratamiento')
+        )
+        queryset = PlanDeTratamiento.objects.annotate(
+            total_items=Coalesce(Subquery(items.annotate(n=Count('id')).values('n')), 0),
+            completados=Coalesce(
+                Subquery(items.filter(estado='COMPLETADO').annotate(n=Count('id')).values('n')), 0
+            ),
+        )
         
         # Filtros
         estado = request.query_params.get('estado')
@@ -887,24 +1080,8 @@ class ReportesViewSet(viewsets.ViewSet):
         if hasta:
             queryset = queryset.filter(fecha_creacion__lte=hasta)
         
-        # Preparar datos
-        data = []
-        for plan in queryset:
-            items = ItemPlanTratamiento.objects.filter(plan_tratamiento=plan)
-            total_items = items.count()
-            completados = items.filter(estado='COMPLETADO').count()
-            progreso = (completados / total_items * 100) if total_items > 0 else 0
-            
-            data.append({
-                'paciente': plan.paciente.usuario.full_name,
-                'odontologo': plan.odontologo.usuario.full_name,
-                'fecha_creacion': format_date(plan.fecha_creacion),
-                'estado': plan.get_estado_display(),
-                'total_items': total_items,
-                'completados': completados,
-                'progreso': f"{progreso:.1f}%",
-                'costo_total': format_currency(plan.costo_total)
-            })
+        # Preparar datos (conteos de ítems como subconsultas, sin N+1)
+        data = PROYECCION_TRATAMIENTOS.filas(queryset)
         
         export_response = self._export_report(request, "Reporte de Tratamientos", data)
         if export_response:
@@ -913,18 +1090,29 @@ class ReportesViewSet(viewsets.ViewSet):
         return Response(data)
     
     @action(detail=False, methods=['get'], url_path='reporte-inventario')
+    @servir_snapshot
     def reporte_inventario(self, request):
         """
         Reporte del estado actual del inventario.
         
         GET /api/reportes/reporte-inventario/?stock_bajo=true&formato=excel
+        GET /api/reportes/reporte-inventario/?ordenar=valor&resumen=true
         
         Parámetros:
         - stock_bajo: true (solo insumos con stock bajo)
         - categoria: Filtrar por ID de categoría
+        - ordenar: valor (mayor valor en inventario primero)
+        - resumen: true (devuelve {'items': [...], 'resumen': {...}} con totales)
         - formato: json/pdf/excel
+        
+        El estado del stock, la valorización y los totales (por categoría,
+        stock bajo y agotados) se calculan en una sola consulta con
+        anotaciones y funciones de ventana.
         """
-        queryset = Insumo.objects.select_related('categoria').all()
+        queryset = Insumo.objects.annotate(
+            estado_stock=estado_stock(),
+            valor_total=valor_inventario(),
+        )
         
         # Filtros
         stock_bajo = request.query_params.get('stock_bajo')
@@ -935,37 +1123,72 @@ class ReportesViewSet(viewsets.ViewSet):
         if categoria_id:
             queryset = queryset.filter(categoria_id=categoria_id)
         
+        if request.query_params.get('ordenar') == 'valor':
+            queryset = queryset.order_by(F('valor_total').desc(), 'nombre')
+        
+        # Totales sobre el conjunto filtrado (ventanas, sin consultas extra)
+        queryset = queryset.annotate(
+            items_categoria=Window(Count('id'), partition_by=[F('categoria_id')]),
+            valor_categoria=Window(Sum('valor_total'), partition_by=[F('categoria_id')]),
+            valor_inventario=Window(Sum('valor_total')),
+            items_stock_bajo=Window(Sum(Case(When(estado_stock='BAJO', then=1), default=0))),
+            items_agotados=Window(Sum(Case(When(estado_stock='AGOTADO', then=1), default=0))),
+        )
+        
         # Preparar datos
-        data = []
-        for insumo in queryset:
-            estado_stock = 'NORMAL'
-            if insumo.stock_actual == 0:
-                estado_stock = 'AGOTADO'
-            elif insumo.stock_actual <= insumo.stock_minimo:
-                estado_stock = 'BAJO'
-            
-            data.append({
-                'codigo': insumo.codigo,
-                'nombre': insumo.nombre,
-                'categoria': insumo.categoria.nombre,
-                'stock_actual': float(insumo.stock_actual),
-                'stock_minimo': float(insumo.stock_minimo),
-                'estado_stock': estado_stock,
-                'unidad_medida': insumo.unidad_medida,
-                'precio_costo': format_currency(insumo.precio_costo),
-                'precio_venta': format_currency(insumo.precio_venta),
-                'valor_total': format_currency(insumo.stock_actual * insumo.precio_costo),
-                'proveedor': insumo.proveedor or 'N/A'
-            })
+        filas = PROYECCION_INVENTARIO_COMPLETA.filas(queryset)
+        resumen = self._resumen_inventario(filas)
+        columnas = [columna.salida for columna in PROYECCION_INVENTARIO.columnas]
+        data = [{clave: fila[clave] for clave in columnas} for fila in filas]
         
-        export_response = self._export_report(request, "Reporte de Inventario", data)
+        export_response = self._export_report(
+            request,
+            "Reporte de Inventario",
+            data,
+            metrics={
+                "Insumos": resumen['total_items'],
+                "Valor Total": format_currency(resumen['valor_total']),
+                "Stock Bajo": resumen['stock_bajo'],
+                "Agotados": resumen['agotados'],
+            }
+        )
         if export_response:
             return export_response
         
-        return Response(data)
+        if request.query_params.get('resumen', '').lower() == 'true':
+            resumen['valor_total'] = float(resumen['valor_total'])
+            for categoria in resumen['por_categoria']:
+                categoria['valor_total'] = float(categoria['valor_total'])
+            return Response({'items': data, 'resumen': resumen})
         
         return Response(data)
     
+    def _resumen_inventario(self, filas):
+        """Arma los totales a partir de las columnas de ventana de las filas."""
+        if not filas:
+            return {'total_items': 0, 'valor_total': Decimal('0.00'), 'stock_bajo': 0,
+                    'agotados': 0, 'por_categoria': []}
+        
+        por_categoria = {}
+        for fila in filas:
+            por_categoria.setdefault(fila['categoria_id'], {
+                'categoria_id': fila['categoria_id'],
+                'categoria': fila['categoria'],
+                'items': fila['items_categoria'],
+                'valor_total': fila['valor_categoria'] or Decimal('0.00'),
+            })
+        
+        primera = filas[0]
+        return {
+            'total_items': len(filas),
+            'valor_total': primera['valor_inventario'] or Decimal('0.00'),
+            'stock_bajo': primera['items_stock_bajo'] or 0,
+            'agotados': primera['items_agotados'] or 0,
+            'por_categoria': sorted(
+                por_categoria.values(), key=lambda categoria: categoria['valor_total'], reverse=True
+            ),
+        }
+    
     @action(detail=False, methods=['get'], url_path='reporte-citas-odontologo')
     def reporte_citas_odontologo(self, request):
         """
@@ -1126,6 +1349,528 @@ class ReportesViewSet(viewsets.ViewSet):
         
         return Response(data)
 
+    @action(detail=False, methods=['get'], url_path='antiguedad-saldos')
+    @servir_snapshot
+    def antiguedad_saldos(self, request):
+        """
+        Antigüedad de cuentas por cobrar (aging) en una sola consulta agrupada.
+        
+        GET /api/reportes/antiguedad-saldos/?formato=excel
+        
+        Agrupa el saldo pendiente (monto_total - monto_pagado, calculado en la
+        base de datos) de las facturas PENDIENTES por días desde su emisión:
+        0-30, 31-60, 61-90 y 90+.
+        """
+        hoy = timezone.now().date()
+        tramos = [
+            ('0-30', Q(fecha_emision__date__gte=hoy - timedelta(days=30))),
+            ('31-60', Q(fecha_emision__date__gte=hoy - timedelta(days=60))),
+            ('61-90', Q(fecha_emision__date__gte=hoy - timedelta(days=90))),
+        ]
+        
+        agrupado = (
+            Factura.objects
+            .filter(estado='PENDIENTE')
+            .annotate(saldo=saldo_factura())
+            .filter(saldo__gt=0)
+            .annotate(tramo=Case(
+                *[When(condicion, then=Value(nombre)) for nombre, condicion in tramos],
+                default=Value('90+'),
+                output_field=CharField()
+            ))
+            .values('tramo')
+            .annotate(facturas=Count('id'), saldo_total=Sum('saldo'))
+        )
+        por_tramo = {fila['tramo']: fila for fila in agrupado}
+        
+        data = []
+        total = MoneyAccumulator()
+        for nombre in ['0-30', '31-60', '61-90', '90+']:
+            fila = por_tramo.get(nombre, {})
+            saldo = MoneyAccumulator(fila.get('saldo_total'))
+            total += saldo
+            data.append({
+                'tramo': nombre,
+                'facturas': fila.get('facturas', 0),
+                'saldo': saldo.to_json()
+            })
+        
+        export_response = self._export_report(
+            request,
+            "Antigüedad de Saldos",
+            [
+                {'Tramo (días)': item['tramo'], 'Facturas': item['facturas'],
+                 'Saldo': format_currency(item['saldo'])}
+                for item in data
+            ],
+            metrics={
+                'Fecha de Corte': format_date(hoy),
+                'Total por Cobrar': total,
+                'Facturas Pendientes': sum(item['facturas'] for item in data)
+            }
+        )
+        if export_response:
+            return export_response
+        
+        return Response({
+            'fecha_corte': hoy,
+            'total_por_cobrar': total.to_json(),
+            'tramos': data
+        })
+    
+    # ========================================================================
+    # ANALÍTICA VECTORIZADA (rangos largos, requiere NumPy)
+    # ========================================================================
+    
+    def _get_rango_fechas(self, request, dias_default=365):
+        """
+        Lee ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD (default: últimos ``dias_default`` días).
+        
+        Lanza ValueError si el formato es inválido o el rango está invertido.
+        """
+        hasta = request.query_params.get('hasta')
+        desde = request.query_params.get('desde')
+        hasta_date = (
+            timezone.datetime.strptime(hasta, '%Y-%m-%d').date()
+            if hasta else timezone.now().date()
+        )
+        desde_date = (
+            timezone.datetime.strptime(desde, '%Y-%m-%d').date()
+            if desde else hasta_date - timedelta(days=dias_default - 1)
+        )
+        if desde_date > hasta_date:
+            raise ValueError("Rango de fechas invertido")
+        return desde_date, hasta_date
+    
+    def _analitica_no_disponible(self):
+        return Response(
+            {'error': 'El motor analítico requiere NumPy instalado en el servidor'},
+            status=status.HTTP_501_NOT_IMPLEMENTED
+        )
+    
+    # La serie diaria reserva un valor por día del rango (5 años)
+    MAX_DIAS_ANALITICA = 1830
+    
+    @action(detail=False, methods=['get'], url_path='analitica-ingresos')
+    def analitica_ingresos(self, request):
+        """
+        Curva de ingresos de rango largo con medias móviles y tamaño de ticket.
+        
+        GET /api/reportes/analitica-ingresos/?desde=2023-01-01&hasta=2025-12-31&formato=excel
+        
+        Parámetros:
+        - desde / hasta: YYYY-MM-DD (default: últimos 365 días, máximo MAX_DIAS_ANALITICA)
+        - formato: json/pdf/excel
+        
+        Retorna ingresos diarios con media móvil de 7 y 30 días, totales
+        mensuales y percentiles p50/p90 del monto por factura.
+        """
+        from . import analytics  # numpy: solo al usar la analítica
+        
+        if not analytics.disponible():
+            return self._analitica_no_disponible()
+        try:
+            desde_date, hasta_date = self._get_rango_fechas(request)
+            if (hasta_date - desde_date).days + 1 > self.MAX_DIAS_ANALITICA:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': f'Rango inválido: use desde/hasta YYYY-MM-DD con a lo sumo {self.MAX_DIAS_ANALITICA} días'},
+                status=400
+            )
+        
+        # Una sola extracción columnar por tabla
+        dias, centavos = analytics.extraer_pagos(desde_date, hasta_date)
+        tickets = analytics.extraer_facturas(desde_date, hasta_date)
+        
+        fechas, totales, conteos = analytics.serie_diaria(dias, centavos, desde_date, hasta_date)
+        media_7 = analytics.media_movil(totales, 7)
+        media_30 = analytics.media_movil(totales, 30)
+        meses, totales_mes, pagos_mes = analytics.agrupar_por_mes(dias, centavos)
+        ticket = {k: round(v / 100, 2) for k, v in analytics.percentiles(tickets).items()}
+        
+        total_ingresos = MoneyAccumulator.from_centavos(int(centavos.sum()))
+        ticket_promedio = MoneyAccumulator.from_centavos(int(tickets.sum())) / len(tickets)
+        
+        diario = [
+            {
+                'fecha': str(fecha),
+                'ingresos': round(total / 100, 2),
+                'num_pagos': int(conteo),
+                'media_movil_7': round(m7 / 100, 2),
+                'media_movil_30': round(m30 / 100, 2),
+            }
+            for fecha, total, conteo, m7, m30 in zip(fechas, totales, conteos, media_7, media_30)
+        ]
+        mensual = [
+            {'mes': str(mes), 'ingresos': round(total / 100, 2), 'num_pagos': int(conteo)}
+            for mes, total, conteo in zip(meses, totales_mes, pagos_mes)
+        ]
+        
+        export_response = self._export_report(
+            request,
+            "Analítica de Ingresos",
+            diario,
+            metrics={
+                'Período': f"{format_date(desde_date)} - {format_date(hasta_date)}",
+                'Total Ingresos': total_ingresos,
+                'Número de Pagos': int(len(centavos)),
+                'Ticket p50': format_currency(ticket['p50']),
+                'Ticket p90': format_currency(ticket['p90']),
+                'Ticket Promedio': ticket_promedio,
+            }
+        )
+        if export_response:
+            return export_response
+        
+        return Response({
+            'desde': desde_date,
+            'hasta': hasta_date,
+            'total_ingresos': total_ingresos.to_json(),
+            'num_pagos': int(len(centavos)),
+            'ticket': {
+                'p50': ticket['p50'],
+                'p90': ticket['p90'],
+                'promedio': ticket_promedio.to_json(),
+                'num_facturas': int(len(tickets)),
+            },
+            'mensual': mensual,
+            'diario': diario,
+        })
+    
+    # La matriz de retención tiene cohortes x meses celdas
+    MAX_MESES_RETENCION = 36
+    
+    @action(detail=False, methods=['get'], url_path='analitica-retencion')
+    def analitica_retencion(self, request):
+        """
+        Retención de pacientes por cohorte de primera visita.
+        
+        GET /api/reportes/analitica-retencion/?desde=2024-01-01&meses=6
+        
+        Parámetros:
+        - desde / hasta: rango de cohortes (mes de primera cita atendida)
+        - meses: meses de seguimiento por cohorte, de 1 a MAX_MESES_RETENCION (default: 6)
+        - formato: json/pdf/excel
+        """
+        from . import analytics  # numpy: solo al usar la analítica
+        
+        if not analytics.disponible():
+            return self._analitica_no_disponible()
+        try:
+            desde_date, hasta_date = self._get_rango_fechas(request)
+            max_meses = int(request.query_params.get('meses', 6))
+            if not 1 <= max_meses <= self.MAX_MESES_RETENCION:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': f'Parámetros inválidos: desde/hasta YYYY-MM-DD y meses entre 1 y {self.MAX_MESES_RETENCION}'},
+                status=400
+            )
+        
+        # Se necesita todo el historial previo para conocer la primera visita real
+        pacientes, _, dias, _ = analytics.extraer_citas(hasta_date, estados=['ATENDIDA'])
+        cohortes, tamanos, matriz = analytics.retencion_por_cohorte(pacientes, dias, max_meses)
+        
+        desde_mes = analytics.np.datetime64(desde_date, 'M')
+        data = []
+        for cohorte, tamano, fila in zip(cohortes, tamanos, matriz):
+            if cohorte < desde_mes:
+                continue
+            data.append({
+                'cohorte': str(cohorte),
+                'pacientes': int(tamano),
+                'retencion': [round(float(v) / float(tamano) * 100, 2) for v in fila],
+            })
+        
+        export_data = [
+            {'Cohorte': item['cohorte'], 'Pacientes': item['pacientes'],
+             **{f'Mes {k}': f"{v}%" for k, v in enumerate(item['retencion'])}}
+            for item in data
+        ]
+        export_response = self._export_report(request, "Retención de Pacientes por Cohorte", export_data)
+        if export_response:
+            return export_response
+        
+        return Response(data)
+    
+    @action(detail=False, methods=['get'], url_path='analitica-productividad')
+    def analitica_productividad(self, request):
+        """
+        Productividad por odontólogo en rangos largos.
+        
+        GET /api/reportes/analitica-productividad/?desde=2025-01-01&hasta=2025-12-31
+        
+        Retorna por odontólogo: citas, atendidas, canceladas, pacientes únicos,
+        días trabajados y percentiles p50/p90 de citas atendidas por día.
+        El rango admite a lo sumo MAX_DIAS_ANALITICA días.
+        """
+        from . import analytics  # numpy: solo al usar la analítica
+        
+        if not analytics.disponible():
+            return self._analitica_no_disponible()
+        try:
+            desde_date, hasta_date = self._get_rango_fechas(request)
+            if (hasta_date - desde_date).days + 1 > self.MAX_DIAS_ANALITICA:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': f'Rango inválido: use desde/hasta YYYY-MM-DD con a lo sumo {self.MAX_DIAS_ANALITICA} días'},
+                status=400
+            )
+        
+        pacientes, odontologos, dias, estados = analytics.extraer_citas(hasta_date, desde=desde_date)
+        data = analytics.productividad_por_odontologo(odontologos, pacientes, dias, estados)
+        
+        nombres = {
+            odontologo.id: odontologo.usuario.full_name
+            for odontologo in PerfilOdontologo.objects.filter(
+                id__in=[item['odontologo_id'] for item in data]
+            ).select_related('usuario')
+        }
+        for item in data:
+            item['nombre_completo'] = nombres.get(item['odontologo_id'], 'Sin asignar')
+        data.sort(key=lambda item: item['citas_atendidas'], reverse=True)
+        
+        export_data = [
+            {
+                'Odontólogo': item['nombre_completo'],
+                'Total Citas': item['total_citas'],
+                'Atendidas': item['citas_atendidas'],
+                'Canceladas': item['citas_canceladas'],
+                'Pacientes Únicos': item['pacientes_unicos'],
+                'Días Trabajados': item['dias_trabajados'],
+                'Tasa Atención': f"{item['tasa_atencion']}%",
+                'Atendidas/Día p50': item['atendidas_por_dia']['p50'],
+                'Atendidas/Día p90': item['atendidas_por_dia']['p90'],
+            }
+            for item in data
+        ]
+        export_response = self._export_report(request, "Productividad por Odontólogo", export_data)
+        if export_response:
+            return export_response
+        
+        return Response(data)
+    
+    @action(detail=False, methods=['get'], url_path='pronostico-inventario')
+    def pronostico_inventario(self, request):
+        """
+        Pronóstico de consumo de insumos y punto de reorden.
+        
+        GET /api/reportes/pronostico-inventario/?ventana=30&dias_entrega=7&solo_riesgo=true
+        
+        Parámetros:
+        - ventana: días de historial para la tasa de consumo (default: 30)
+        - dias_entrega: tiempo de reposición del proveedor en días (default: 7)
+        - categoria: Filtrar por ID de categoría
+        - solo_riesgo: true (solo insumos en o bajo su punto de reorden)
+        - formato: json/pdf/excel
+        
+        La tasa de consumo sale de los ajustes de stock de la bitácora y el
+        cálculo se hace vectorizado para todos los insumos a la vez.
+        """
+        from . import analytics  # numpy: solo al usar la analítica
+        
+        if not analytics.disponible():
+            return self._analitica_no_disponible()
+        try:
+            ventana = int(request.query_params.get('ventana', 30))
+            dias_entrega = int(request.query_params.get('dias_entrega', 7))
+            if ventana <= 0 or dias_entrega < 0:
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'ventana y dias_entrega deben ser números positivos'}, status=400)
+        
+        insumos = Insumo.objects.order_by('id')
+        categoria_id = request.query_params.get('categoria')
+        if categoria_id:
+            insumos = insumos.filter(categoria_id=categoria_id)
+        filas = list(insumos.values_list(
+            'id', 'codigo', 'nombre', 'categoria__nombre', 'unidad_medida', 'stock_actual', 'stock_minimo'
+        ))
+        if not filas:
+            return Response([])
+        
+        np = analytics.np
+        ids, codigos, nombres, categorias, unidades, stock, minimo = zip(*filas)
+        ids = np.array(ids, dtype=np.int64)
+        stock = np.array(stock, dtype=np.float64)
+        minimo = np.array(minimo, dtype=np.float64)
+        
+        hasta_date = timezone.now().date()
+        desde_date = hasta_date - timedelta(days=ventana - 1)
+        consumo_ids, consumos = analytics.extraer_consumos(desde_date, hasta_date)
+        pronostico = analytics.pronostico_stock(ids, stock, minimo, consumo_ids, consumos, ventana, dias_entrega)
+        
+        solo_riesgo = request.query_params.get('solo_riesgo', '').lower() == 'true'
+        data = []
+        for i in range(len(ids)):
+            en_riesgo = bool(pronostico['en_riesgo'][i])
+            if solo_riesgo and not en_riesgo:
+                continue
+            dias = pronostico['dias_restantes'][i]
+            data.append({
+                'insumo_id': int(ids[i]),
+                'codigo': codigos[i],
+                'nombre': nombres[i],
+                'categoria': categorias[i],
+                'unidad_medida': unidades[i],
+                'stock_actual': float(stock[i]),
+                'stock_minimo': float(minimo[i]),
+                'consumo_ventana': round(float(pronostico['consumo'][i]), 2),
+                'consumo_diario': round(float(pronostico['tasa_diaria'][i]), 3),
+                'dias_restantes': round(float(dias), 1) if np.isfinite(dias) else None,
+                'punto_reorden': round(float(pronostico['punto_reorden'][i]), 2),
+                'cantidad_sugerida': int(pronostico['cantidad_sugerida'][i]),
+                'en_riesgo': en_riesgo,
+            })
+        
+        # Primero los que se agotan antes (sin consumo al final)
+        data.sort(key=lambda item: (
+            not item['en_riesgo'],
+            item['dias_restantes'] if item['dias_restantes'] is not None else float('inf')
+        ))
+        
+        export_response = self._export_report(
+            request,
+            "Pronóstico de Inventario",
+            data,
+            metrics={
+                'Ventana': f"{ventana} días",
+                'Tiempo de Entrega': f"{dias_entrega} días",
+                'Insumos en Riesgo': int(pronostico['en_riesgo'].sum()),
+            }
+        )
+        if export_response:
+            return export_response
+        
+        return Response(data)
+    
+    # ========================================================================
+    # PAQUETES DE REPORTES
+    # ========================================================================
+    
+    # Cada reporte del paquete agrega todo el rango: se acota para no
+    # disparar varias agregaciones de años de historia en un solo request
+    MAX_DIAS_PAQUETE = 730
+    
+    @action(detail=False, methods=['get'], url_path='paquete')
+    def paquete(self, request):
+        """
+        Varios reportes sobre un mismo rango en una sola descarga.
+        
+        GET /api/reportes/paquete/?reportes=tendencia-citas,ocupacion-odontologos&desde=2025-11-01&hasta=2025-11-30&formato=excel
+        
+        Parámetros:
+        - reportes: nombres separados por coma (ver bundle.REPORTES)
+        - desde / hasta: rango común YYYY-MM-DD (default: últimos 30 días,
+          máximo MAX_DIAS_PAQUETE)
+        - formato: json / excel (una hoja por reporte) / pdf (ZIP con un PDF por reporte)
+        
+        Los reportes que comparten datos (p. ej. el agregado de citas del rango)
+        los calculan una sola vez y los intermedios se consultan en paralelo.
+        """
+        nombres = list(dict.fromkeys(
+            nombre.strip() for nombre in request.query_params.get('reportes', '').split(',') if nombre.strip()
+        ))
+        desconocidos = [nombre for nombre in nombres if nombre not in bundle.REPORTES]
+        if not nombres or desconocidos:
+            return Response(
+                {
+                    'error': f"Reportes inválidos: {', '.join(desconocidos)}" if desconocidos
+                    else 'Indique al menos un reporte en ?reportes=',
+                    'disponibles': list(bundle.REPORTES),
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            desde_date, hasta_date = self._get_rango_fechas(request, dias_default=30)
+        except ValueError:
+            return Response(
+                {'error': 'Rango inválido. Use desde/hasta con formato YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (hasta_date - desde_date).days + 1 > self.MAX_DIAS_PAQUETE:
+            return Response(
+                {'error': f'El rango del paquete no puede superar {self.MAX_DIAS_PAQUETE} días'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        paquete = bundle.ejecutar(nombres, desde_date, hasta_date)
+        consultas = paquete['consultas']
+        logger.info(
+            f"📦 Paquete de {len(nombres)} reportes: {consultas['ejecutadas']} consultas "
+            f"en lugar de {consultas['solicitadas']}"
+        )
+        
+        formato = request.query_params.get('formato', '').lower()
+        tenant_name = self._get_tenant_name(request)
+        
+        if formato == 'excel':
+            return bundle.a_excel(paquete, tenant_name)
+        
+        if formato == 'pdf':
+            response = StreamingHttpResponse(
+                bundle.pdfs_en_zip(paquete, tenant_name),
+                content_type='application/zip'
+            )
+            filename = f"Paquete_Reportes_{timezone.now().strftime('%Y%m%d_%H%M%S')}.zip"
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+        
+        return Response({'desde': desde_date, 'hasta': hasta_date, **bundle.a_json(paquete)})
+
+
+class _RegistrosConArchivo:
+    """
+    Secuencia paginable: registros activos (queryset) seguidos de archivados.
+    
+    Solo serializa las filas del slice solicitado por el paginador, y del
+    archivo solo lee hasta el final de ese slice (archive.buscar es un generador).
+    """
+    
+    def __init__(self, queryset, filtros_archivo, serializar):
+        self.queryset = queryset
+        self.filtros_archivo = filtros_archivo
+        self.serializar = serializar
+        self._activos = None
+        self._archivados = None
+    
+    def _total_activos(self):
+        if self._activos is None:
+            self._activos = self.queryset.count()
+        return self._activos
+    
+    def _total_archivados(self):
+        from . import archive
+        
+        if self._archivados is None:
+            self._archivados = archive.contar(**self.filtros_archivo)
+        return self._archivados
+    
+    def __len__(self):
+        return self._total_activos() + self._total_archivados()
+    
+    def count(self):
+        return len(self)
+    
+    def __getitem__(self, indice):
+        if not isinstance(indice, slice):
+            return self[indice:indice + 1][0]
+        inicio, fin, _ = indice.indices(len(self))
+        activos = self._total_activos()
+        filas = []
+        if inicio < activos:
+            filas.extend(self.serializar(self.queryset[inicio:min(fin, activos)]))
+        if fin > activos:
+            from . import archive
+            
+            filas.extend(islice(
+                archive.buscar(**self.filtros_archivo), max(inicio - activos, 0), fin - activos
+            ))
+        return filas
+
 
 class BitacoraViewSet(viewsets.ModelViewSet):
     """
@@ -1144,8 +1889,11 @@ class BitacoraViewSet(viewsets.ModelViewSet):
     - modelo: Nombre del modelo (ej: 'paciente', 'cita', 'factura')
     - ip: Dirección IP
     - descripcion: Búsqueda en descripción
+    - busqueda: Búsqueda de texto completo con ranking (ver _aplicar_busqueda)
+    - modo: palabras (default) / frase / simple
     """
-    queryset = BitacoraAccion.objects.select_related('usuario', 'content_type').all()
+    # Los datos de usuario y modelo se leen de las columnas snapshot: sin joins
+    queryset = BitacoraAccion.objects.defer('busqueda').all()
     serializer_class = BitacoraSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = PageNumberPagination  # Paginación solo para bitácora
@@ -1170,7 +1918,7 @@ class BitacoraViewSet(viewsets.ModelViewSet):
         # Filtro por modelo
         modelo = self.request.query_params.get('modelo')
         if modelo:
-            queryset = queryset.filter(content_type__model=modelo.lower())
+            queryset = queryset.filter(modelo=modelo.lower())
         
         # Filtro por IP
         ip = self.request.query_params.get('ip')
@@ -1182,44 +1930,177 @@ class BitacoraViewSet(viewsets.ModelViewSet):
         if descripcion:
             queryset = queryset.filter(descripcion__icontains=descripcion)
         
+        # Búsqueda de texto completo
+        busqueda = self.request.query_params.get('busqueda')
+        if busqueda:
+            queryset = self._aplicar_busqueda(
+                queryset, busqueda, self.request.query_params.get('modo', 'palabras')
+            )
+        
         return queryset
     
+    def list(self, request, *args, **kwargs):
+        """
+        Lista la bitácora incluyendo de forma transparente los registros
+        archivados (ver reportes/archive.py) cuando el rango pedido llega a
+        fechas archivadas: sin ?desde= o con ?desde= no posterior al último
+        día archivado (según el índice del archivo).
+        
+        ?busqueda= y un ?ordering= distinto de -fecha_hora no se pueden
+        aplicar al archivo: en ese caso se listan solo los registros activos
+        y la respuesta lo indica en ``archivo_omitido`` y en el encabezado
+        X-Bitacora-Archivo-Omitido.
+        """
+        from . import archive
+        
+        params = request.query_params
+        ultima_archivada = archive.ultima_fecha_archivada()
+        desde = params.get('desde')
+        if ultima_archivada is None or (desde and desde > ultima_archivada):
+            return super().list(request, *args, **kwargs)
+        
+        omitidos = [parametro for parametro in ('busqueda',) if params.get(parametro)]
+        ordering = params.get(api_settings.ORDERING_PARAM)
+        if ordering and ordering != '-fecha_hora':
+            omitidos.append(api_settings.ORDERING_PARAM)
+        if omitidos:
+            # El archivo no tiene vector de búsqueda ni otro orden que -fecha_hora
+            response = super().list(request, *args, **kwargs)
+            response['X-Bitacora-Archivo-Omitido'] = ','.join(omitidos)
+            if isinstance(response.data, dict):
+                response.data['archivo_omitido'] = omitidos
+            return response
+        
+        filtros_archivo = {
+            'desde': desde,
+            'hasta': params.get('hasta'),
+            'usuario': params.get('usuario'),
+            'accion': params.get('accion'),
+            'modelo': params.get('modelo'),
+            'ip': params.get('ip'),
+            'descripcion': params.get('descripcion'),
+            'texto': params.get(api_settings.SEARCH_PARAM),
+        }
+        # Los registros archivados son siempre más antiguos que los activos,
+        # así que el orden -fecha_hora es: activos y luego archivados.
+        registros = _RegistrosConArchivo(
+            self.filter_queryset(self.get_queryset()),
+            filtros_archivo,
+            lambda filas: self.get_serializer(filas, many=True).data
+        )
+        page = self.paginate_queryset(registros)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(registros[:])
+    
+    # Modo de búsqueda -> search_type de SearchQuery
+    MODOS_BUSQUEDA = {
+        'palabras': 'websearch',  # términos, "frases entre comillas", -exclusiones, OR
+        'frase': 'phrase',
+        'simple': 'plain',
+    }
+    
+    def _aplicar_busqueda(self, queryset, texto, modo):
+        """
+        Búsqueda de texto completo en la descripción.
+        
+        Usa el tsvector indexado (GIN) y ordena por relevancia.
+        """
+        search_type = self.MODOS_BUSQUEDA.get(modo, 'websearch')
+        consulta = SearchQuery(texto, config=BITACORA_BUSQUEDA_CONFIG, search_type=search_type)
+        return (
+            queryset
+            .filter(busqueda=consulta)
+            .annotate(rango=SearchRank(F('busqueda'), consulta))
+            .order_by('-rango', '-fecha_hora')
+        )
+    
+    # Filtros de listado que los contadores no cubren
+    FILTROS_SIN_CONTADOR = ['usuario', 'accion', 'desde', 'hasta', 'modelo', 'ip', 'descripcion', 'busqueda']
+    
     @action(detail=False, methods=['get'], url_path='estadisticas')
     def estadisticas(self, request):
         """
         Estadísticas de la bitácora.
         
         GET /api/bitacora/estadisticas/?dias=7
+        
+        Se sirven desde los contadores diarios (BitacoraContador), sumando a lo
+        sumo dias x acciones x usuarios filas pequeñas. La ventana se cuenta en
+        días completos: ``dias=7`` son hoy y los seis días anteriores. Si se combinan otros filtros del listado se calcula
+        sobre la bitácora completa. Las acciones muestreadas por la auditoría
+        automática se cuentan con su peso 1/tasa (totales estimados).
         """
         dias = int(request.query_params.get('dias', 7))
-        fecha_desde = timezone.now() - timedelta(days=dias)
         
-        queryset = self.get_queryset().filter(fecha_hora__gte=fecha_desde)
+        if any(request.query_params.get(filtro) for filtro in self.FILTROS_SIN_CONTADOR):
+            return self._estadisticas_desde_bitacora(dias)
+        
+        contadores = BitacoraContador.objects.filter(fecha__gte=self._inicio_ventana(dias))
+        
+        # Acciones por tipo
+        acciones_por_tipo = list(
+            contadores.values('accion')
+            .annotate(total=Sum('total'))
+            .order_by('-total')
+        )
+        
+        # Usuarios más activos
+        usuarios_activos = list(
+            contadores.values('usuario__first_name', 'usuario__last_name')
+            .annotate(total=Sum('total'))
+            .order_by('-total')[:10]
+        )
+        
+        # Actividad por día
+        actividad_diaria = [
+            {'fecha_hora__date': fila['fecha'], 'total': fila['total']}
+            for fila in contadores.values('fecha').annotate(total=Sum('total')).order_by('fecha')
+        ]
+        
+        return Response({
+            'periodo': f'Últimos {dias} días',
+            'total_acciones': sum(fila['total'] for fila in acciones_por_tipo),
+            'acciones_por_tipo': acciones_por_tipo,
+            'usuarios_mas_activos': usuarios_activos,
+            'actividad_diaria': actividad_diaria
+        })
+    
+    @staticmethod
+    def _inicio_ventana(dias):
+        """Primer día (local) de una ventana de ``dias`` días completos que termina hoy."""
+        return timezone.localdate() - timedelta(days=dias - 1)
+    
+    def _estadisticas_desde_bitacora(self, dias):
+        """Estadísticas agrupando directamente la bitácora (con filtros arbitrarios)."""
+        queryset = self.get_queryset().filter(fecha_hora__date__gte=self._inicio_ventana(dias))
+        # Las acciones muestreadas cuentan 1/tasa, como en BitacoraContador
+        peso = peso_muestreo()
         
         # Acciones por tipo
         acciones_por_tipo = list(
             queryset.values('accion')
-            .annotate(total=Count('id'))
+            .annotate(total=Sum(peso))
             .order_by('-total')
         )
         
         # Usuarios más activos
         usuarios_activos = list(
             queryset.values('usuario__first_name', 'usuario__last_name')
-            .annotate(total=Count('id'))
+            .annotate(total=Sum(peso))
             .order_by('-total')[:10]
         )
         
         # Actividad por día
         actividad_diaria = list(
             queryset.values('fecha_hora__date')
-            .annotate(total=Count('id'))
+            .annotate(total=Sum(peso))
             .order_by('fecha_hora__date')
         )
         
         return Response({
             'periodo': f'Últimos {dias} días',
-            'total_acciones': queryset.count(),
+            'total_acciones': sum(fila['total'] for fila in acciones_por_tipo),
             'acciones_por_tipo': acciones_por_tipo,
             'usuarios_mas_activos': usuarios_activos,
             'actividad_diaria': actividad_diaria
@@ -1240,7 +2121,7 @@ class BitacoraViewSet(viewsets.ModelViewSet):
         for registro in queryset[:1000]:  # Limitar a 1000 registros
             data.append({
                 'fecha_hora': format_date(registro.fecha_hora),
-                'usuario': registro.usuario.full_name if registro.usuario else 'Sistema',
+                'usuario': registro.usuario_nombre or (registro.usuario.full_name if registro.usuario else 'Sistema'),
                 'accion': registro.get_accion_display(),
                 'descripcion': registro.descripcion,
                 'ip': registro.ip_address or 'N/A'
@@ -1249,7 +2130,7 @@ class BitacoraViewSet(viewsets.ModelViewSet):
         tenant_name = getattr(request.tenant, 'nombre', 'Clínica Dental')
         
         if formato == 'pdf':
-            pdf = PDFReportGenerator("Bitácora de Auditoría", tenant_name)
+            pdf = exporters.obtener('pdf')("Bitácora de Auditoría", tenant_name)
             pdf.add_header()
             
             if data:
@@ -1260,7 +2141,7 @@ class BitacoraViewSet(viewsets.ModelViewSet):
             return pdf.generate()
         
         else:  # Excel
-            excel = ExcelReportGenerator("Bitácora de Auditoría", tenant_name)
+            excel = exporters.obtener('excel')("Bitácora de Auditoría", tenant_name)
             excel.add_header()
             
             if data:
@@ -10,6 +10,13 @@ from django.utils import timezone
 from datetime import datetime
 
 from .nlp.voice_parser import parse_voice_command
+from .nlp.matcher import interpretar_consultas
+from .nlp import nombres
+from . import exporters
+from .utils import MoneyAccumulator
+from .expressions import saldo_factura
+from .projection import Columna, Proyeccion, display, nombre_completo
+from .query_batch import ejecutar_en_paralelo
 from agenda.models import Cita
 from facturacion.models import Factura, Pago
 from tratamientos.models import PlanDeTratamiento
@@ -19,6 +26,116 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Filas de la respuesta JSON; las exportaciones (formato=pdf|excel|csv) no tienen límite
+LIMITE_FILAS = 100
+
+
+def _formato_fecha(patron):
+    return lambda valor: valor.strftime(patron) if valor else 'N/A'
+
+
+def _nombre_o_na(nombre, apellido):
+    return nombre_completo(nombre, apellido) or 'N/A'
+
+
+def _numero_factura(factura_id):
+    return f"FAC-{factura_id:06d}" if factura_id else 'N/A'
+
+
+PROYECCION_CITAS = Proyeccion(
+    Columna('id'),
+    Columna('fecha', 'fecha_hora', calcular=_formato_fecha('%d/%m/%Y')),
+    Columna('hora', 'fecha_hora', calcular=_formato_fecha('%H:%M')),
+    Columna('paciente', 'paciente__usuario__first_name', 'paciente__usuario__last_name', calcular=_nombre_o_na),
+    Columna('odontologo', 'odontologo__usuario__first_name', 'odontologo__usuario__last_name', calcular=_nombre_o_na),
+    Columna('motivo', calcular=lambda motivo: motivo or 'N/A'),
+    Columna('motivo_tipo', calcular=display(Cita._meta.get_field('motivo_tipo').choices)),
+    Columna('estado', calcular=display(Cita._meta.get_field('estado').choices)),
+)
+
+PROYECCION_FACTURAS = Proyeccion(
+    Columna('id'),
+    Columna('numero', 'id', calcular=_numero_factura),
+    Columna('fecha', 'fecha_emision', calcular=_formato_fecha('%d/%m/%Y')),
+    Columna('paciente', 'paciente__usuario__first_name', 'paciente__usuario__last_name', calcular=_nombre_o_na),
+    Columna('monto_total', calcular=float),
+    Columna('monto_pagado', calcular=float),
+    Columna('saldo', calcular=float),
+    Columna('estado', calcular=display(Factura._meta.get_field('estado').choices)),
+)
+
+PROYECCION_TRATAMIENTOS = Proyeccion(
+    Columna('id'),
+    Columna('fecha', 'fecha_creacion', calcular=_formato_fecha('%d/%m/%Y')),
+    Columna('paciente', 'paciente__usuario__first_name', 'paciente__usuario__last_name', calcular=_nombre_o_na),
+    Columna('odontologo', 'odontologo__usuario__first_name', 'odontologo__usuario__last_name', calcular=_nombre_o_na),
+    Columna('titulo'),
+    Columna('estado', calcular=display(PlanDeTratamiento._meta.get_field('estado').choices)),
+    Columna('total', 'precio_total_plan', calcular=float),
+)
+
+PROYECCION_PACIENTES = Proyeccion(
+    Columna('id'),
+    Columna('nombre', 'first_name', 'last_name', calcular=nombre_completo),
+    Columna('email'),
+    Columna('telefono', calcular=lambda telefono: telefono or 'N/A'),
+    Columna('ci', calcular=lambda ci: ci or 'N/A'),
+    Columna('fecha_registro', 'date_joined', calcular=_formato_fecha('%d/%m/%Y')),
+    Columna('activo', 'is_active'),
+)
+
+PROYECCION_INGRESOS = Proyeccion(
+    Columna('id'),
+    Columna('fecha', 'fecha_pago', calcular=_formato_fecha('%d/%m/%Y %H:%M')),
+    Columna('monto', 'monto_pagado', calcular=float),
+    Columna('metodo_pago', calcular=display(Pago._meta.get_field('metodo_pago').choices)),
+    Columna('factura', 'factura_id', calcular=_numero_factura),
+    Columna('paciente', 'factura__paciente__usuario__first_name', 'factura__paciente__usuario__last_name',
+            calcular=_nombre_o_na),
+)
+
+
+def _filtrar_por_nombres(queryset, filtros, paciente='paciente_id', odontologo='odontologo_id'):
+    """
+    Filtra por los nombres dictados resolviéndolos primero con el índice en
+    memoria (nlp.nombres): la consulta queda como ``<campo>__in`` sobre ids.
+    Un nombre sin coincidencias deja el queryset vacío.
+    """
+    if paciente and filtros.get('paciente_nombre'):
+        ids = [persona.id for persona in nombres.buscar_pacientes(filtros['paciente_nombre'])]
+        queryset = queryset.filter(**{f'{paciente}__in': ids})
+    if odontologo and filtros.get('odontologo_nombre'):
+        ids = [persona.id for persona in nombres.buscar_odontologos(filtros['odontologo_nombre'])]
+        queryset = queryset.filter(**{f'{odontologo}__in': ids})
+    return queryset
+
+
+def _comparar(resumenes):
+    """
+    Alinea las métricas numéricas de los resúmenes (una lista por métrica, en
+    el orden dictado) con la diferencia de cada consulta respecto de la
+    anterior. Una métrica ausente en un resumen (sin datos) cuenta como 0.
+    """
+    campos = []
+    for resumen in resumenes:
+        for campo, valor in resumen.items():
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool) and campo not in campos:
+                campos.append(campo)
+    
+    metricas = {}
+    for campo in campos:
+        valores = [resumen.get(campo, 0) for resumen in resumenes]
+        deltas, porcentajes = [], []
+        for anterior, actual in zip(valores, valores[1:]):
+            deltas.append(round(actual - anterior, 2))
+            porcentajes.append(round((actual - anterior) / anterior * 100, 1) if anterior else None)
+        metricas[campo] = {'valores': valores, 'deltas': deltas, 'porcentajes': porcentajes}
+    
+    return {
+        'periodos': [resumen.get('periodo') for resumen in resumenes],
+        'metricas': metricas,
+    }
+
 
 class VoiceReportQueryView(APIView):
     """
@@ -47,6 +164,21 @@ class VoiceReportQueryView(APIView):
             "periodo": "01/09/2025 - 05/09/2025"
         }
     }
+    
+    Con "formato": "pdf" | "excel" | "csv" (en el body o como query param)
+    se descarga el archivo con todas las filas, sin el límite de 100 de la
+    respuesta JSON ("exporta las facturas pendientes del año").
+    
+    Con varias consultas ("compara ingresos de septiembre y octubre", "citas
+    y facturas de esta semana") se ejecutan en paralelo y se responde:
+    {
+        "interpretacion": {"texto_original": ..., "comparacion": true, "interpretacion": "... vs ..."},
+        "consultas": [{"interpretacion": {...}, "datos": [...], "resumen": {...}}, ...],
+        "comparacion": {
+            "periodos": ["01/09/2025 - 30/09/2025", "01/10/2025 - 31/10/2025"],
+            "metricas": {"total_ingresos": {"valores": [...], "deltas": [...], "porcentajes": [...]}, ...}
+        }
+    }
     """
     
     permission_classes = [IsAuthenticated]
@@ -60,11 +192,28 @@ class VoiceReportQueryView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        formato = str(request.data.get('formato') or request.query_params.get('formato', '')).lower()
+        if formato and formato not in exporters.formatos(filas=True):
+            return Response(
+                {'error': f'Formato no soportado. Use uno de: {", ".join(exporters.formatos(filas=True))}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         try:
-            # 1. Parsear el comando de voz
-            interpretacion = parse_voice_command(texto)
-            
+            # 1. Parsear el comando de voz (intérprete compilado; si no reconoce
+            #    el tipo de reporte, el parser original)
             logger.info(f"👤 Usuario {request.user.email} solicitó: {texto}")
+            resultado = interpretar_consultas(texto)
+            if len(resultado['consultas']) == 1 and resultado['consultas'][0]['tipo_reporte'] is None:
+                resultado['consultas'] = [parse_voice_command(texto)]
+            
+            if formato:
+                return self._exportar(request, resultado, formato)
+            
+            if len(resultado['consultas']) > 1:
+                return Response(self._responder_consultas(resultado, request.user), status=status.HTTP_200_OK)
+            
+            interpretacion = resultado['consultas'][0]
             logger.info(f"🧠 Interpretación: {interpretacion['interpretacion']}")
             
             # 2. Obtener datos según el tipo de reporte
@@ -86,8 +235,80 @@ class VoiceReportQueryView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    def _exportar(self, request, resultado, formato):
+        """
+        Exporta el queryset completo de cada consulta (sin LIMITE_FILAS). Las
+        filas se leen con ``Proyeccion.iterar`` a medida que el exportador las
+        escribe: CSV sale en streaming y Excel se arma en disco (ver exporters).
+        """
+        consultas = [consulta for consulta in resultado['consultas'] if consulta['tipo_reporte']]
+        if not consultas:
+            return Response(
+                {'error': 'No se reconoció el tipo de reporte', 'interpretacion': resultado['consultas'][0]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        tipos = list(dict.fromkeys(consulta['tipo_reporte'] for consulta in consultas))
+        titulo = f"Reporte de {' y '.join(tipos)}"
+        tenant_name = getattr(request.tenant, 'nombre', 'Clínica Dental')
+        logger.info(f"📤 Exportando comando de voz a {formato}: {resultado['texto_original']}")
+        
+        generador = exporters.obtener(formato, filas=True)(titulo, tenant_name)
+        generador.add_header()
+        generador.add_key_metrics({
+            'Comando': resultado['texto_original'],
+            'Interpretación': ' | '.join(consulta['interpretacion'] for consulta in consultas),
+        })
+        for consulta in consultas:
+            proyeccion, queryset = self._consulta(consulta)
+            generador.add_rows(proyeccion.encabezados, proyeccion.iterar(queryset), title=consulta['interpretacion'])
+        return generador.generate()
+    
+    def _responder_consultas(self, resultado, user):
+        """
+        Varias consultas en un mismo comando: se ejecutan en paralelo (un hilo
+        y una conexión por consulta) y, si es una comparación, se agregan las
+        diferencias entre cada consulta y la anterior.
+        """
+        consultas = resultado['consultas']
+        for consulta in consultas:
+            logger.info(f"🧠 Interpretación: {consulta['interpretacion']}")
+        
+        datos = ejecutar_en_paralelo({
+            indice: (lambda consulta=consulta: self._obtener_datos(consulta, user))
+            for indice, consulta in enumerate(consultas)
+        })
+        resultados = [
+            {
+                'interpretacion': consulta,
+                'datos': datos[indice],
+                'resumen': self._generar_resumen(consulta, datos[indice]),
+            }
+            for indice, consulta in enumerate(consultas)
+        ]
+        
+        conector = ' vs ' if resultado['comparacion'] else ' + '
+        respuesta = {
+            'interpretacion': {
+                'texto_original': resultado['texto_original'],
+                'comparacion': resultado['comparacion'],
+                'interpretacion': conector.join(consulta['interpretacion'] for consulta in consultas),
+            },
+            'consultas': resultados,
+        }
+        if resultado['comparacion']:
+            respuesta['comparacion'] = _comparar([r['resumen'] for r in resultados])
+        return respuesta
+    
     def _obtener_datos(self, interpretacion, user):
-        """Obtiene los datos según el tipo de reporte y filtros."""
+        """Obtiene los datos según el tipo de reporte y filtros (hasta LIMITE_FILAS)."""
+        proyeccion, queryset = self._consulta(interpretacion)
+        if proyeccion is None:
+            return []
+        return proyeccion.filas(queryset, limite=LIMITE_FILAS)
+    
+    def _consulta(self, interpretacion):
+        """``(proyección, queryset)`` del reporte interpretado, sin límite de filas."""
         tipo_reporte = interpretacion['tipo_reporte']
         fecha_inicio = interpretacion['fecha_inicio']
         fecha_fin = interpretacion['fecha_fin']
@@ -100,20 +321,20 @@ class VoiceReportQueryView(APIView):
             fecha_fin = datetime.fromisoformat(fecha_fin).date()
         
         if tipo_reporte == 'citas':
-            return self._obtener_citas(fecha_inicio, fecha_fin, filtros)
+            return self._consulta_citas(fecha_inicio, fecha_fin, filtros)
         elif tipo_reporte == 'facturas':
-            return self._obtener_facturas(fecha_inicio, fecha_fin, filtros)
+            return self._consulta_facturas(fecha_inicio, fecha_fin, filtros)
         elif tipo_reporte == 'tratamientos':
-            return self._obtener_tratamientos(fecha_inicio, fecha_fin, filtros)
+            return self._consulta_tratamientos(fecha_inicio, fecha_fin, filtros)
         elif tipo_reporte == 'pacientes':
-            return self._obtener_pacientes(fecha_inicio, fecha_fin, filtros)
+            return self._consulta_pacientes(fecha_inicio, fecha_fin, filtros)
         elif tipo_reporte == 'ingresos':
-            return self._obtener_ingresos(fecha_inicio, fecha_fin, filtros)
+            return self._consulta_ingresos(fecha_inicio, fecha_fin, filtros)
         else:
-            return []
+            return None, None
     
-    def _obtener_citas(self, fecha_inicio, fecha_fin, filtros):
-        """Obtiene citas filtradas."""
+    def _consulta_citas(self, fecha_inicio, fecha_fin, filtros):
+        """Citas filtradas."""
         queryset = Cita.objects.all()
         
         if fecha_inicio and fecha_fin:
@@ -129,26 +350,14 @@ class VoiceReportQueryView(APIView):
         if filtros.get('estado'):
             queryset = queryset.filter(estado=filtros['estado'].upper())
         
-        if filtros.get('paciente_nombre'):
-            queryset = queryset.filter(
-                paciente__usuario__nombre__icontains=filtros['paciente_nombre']
-            )
+        queryset = _filtrar_por_nombres(queryset, filtros)
+        
+        citas = queryset.order_by('fecha_hora')
         
-        citas = queryset.select_related('paciente__usuario', 'odontologo__usuario').order_by('fecha_hora')
-        
-        return [{
-            'id': cita.id,
-            'fecha': cita.fecha_hora.strftime('%d/%m/%Y'),
-            'hora': cita.fecha_hora.strftime('%H:%M'),
-            'paciente': cita.paciente.usuario.full_name if cita.paciente else 'N/A',
-            'odontologo': cita.odontologo.usuario.full_name if cita.odontologo else 'N/A',
-            'motivo': cita.motivo or 'N/A',
-            'motivo_tipo': cita.get_motivo_tipo_display(),
-            'estado': cita.get_estado_display()
-        } for cita in citas[:100]]  # Limitar a 100 resultados
+        return PROYECCION_CITAS, citas
     
-    def _obtener_facturas(self, fecha_inicio, fecha_fin, filtros):
-        """Obtiene facturas filtradas."""
+    def _consulta_facturas(self, fecha_inicio, fecha_fin, filtros):
+        """Facturas filtradas."""
         queryset = Factura.objects.all()
         
         if fecha_inicio and fecha_fin:
@@ -166,21 +375,14 @@ class VoiceReportQueryView(APIView):
         if filtros.get('monto_maximo'):
             queryset = queryset.filter(monto_total__lte=filtros['monto_maximo'])
         
-        facturas = queryset.select_related('paciente__usuario').order_by('-fecha_emision')
-        
-        return [{
-            'id': factura.id,
-            'numero': f"FAC-{factura.id:06d}",
-            'fecha': factura.fecha_emision.strftime('%d/%m/%Y'),
-            'paciente': factura.paciente.usuario.full_name if factura.paciente else 'N/A',
-            'monto_total': float(factura.monto_total),
-            'monto_pagado': float(factura.monto_pagado),
-            'saldo': float(factura.saldo_pendiente),
-            'estado': factura.get_estado_display()
-        } for factura in facturas[:100]]
+        queryset = _filtrar_por_nombres(queryset, filtros, odontologo=None)
+        
+        facturas = queryset.annotate(saldo=saldo_factura()).order_by('-fecha_emision')
+        
+        return PROYECCION_FACTURAS, facturas
     
-    def _obtener_tratamientos(self, fecha_inicio, fecha_fin, filtros):
-        """Obtiene planes de tratamiento filtrados."""
+    def _consulta_tratamientos(self, fecha_inicio, fecha_fin, filtros):
+        """Planes de tratamiento filtrados."""
         queryset = PlanDeTratamiento.objects.all()
         
         if fecha_inicio and fecha_fin:
@@ -192,20 +394,14 @@ class VoiceReportQueryView(APIView):
         if filtros.get('estado'):
             queryset = queryset.filter(estado=filtros['estado'])
         
-        planes = queryset.select_related('paciente__usuario', 'odontologo__usuario').order_by('-fecha_creacion')
-        
-        return [{
-            'id': plan.id,
-            'fecha': plan.fecha_creacion.strftime('%d/%m/%Y'),
-            'paciente': plan.paciente.usuario.full_name if plan.paciente else 'N/A',
-            'odontologo': plan.odontologo.usuario.full_name if plan.odontologo else 'N/A',
-            'titulo': plan.titulo,
-            'estado': plan.get_estado_display(),
-            'total': float(plan.precio_total_plan)
-        } for plan in planes[:100]]
+        queryset = _filtrar_por_nombres(queryset, filtros)
+        
+        planes = queryset.order_by('-fecha_creacion')
+        
+        return PROYECCION_TRATAMIENTOS, planes
     
-    def _obtener_pacientes(self, fecha_inicio, fecha_fin, filtros):
-        """Obtiene pacientes registrados."""
+    def _consulta_pacientes(self, fecha_inicio, fecha_fin, filtros):
+        """Pacientes registrados."""
         queryset = Usuario.objects.filter(tipo_usuario='PACIENTE')
         
         if fecha_inicio and fecha_fin:
@@ -214,20 +410,17 @@ class VoiceReportQueryView(APIView):
                 date_joined__date__lte=fecha_fin
             )
         
+        if filtros.get('paciente_nombre'):
+            queryset = queryset.filter(pk__in=[
+                persona.usuario_id for persona in nombres.buscar_pacientes(filtros['paciente_nombre'])
+            ])
+        
         pacientes = queryset.order_by('-date_joined')
         
-        return [{
-            'id': paciente.id,
-            'nombre': paciente.full_name,
-            'email': paciente.email,
-            'telefono': paciente.telefono or 'N/A',
-            'ci': paciente.ci or 'N/A',
-            'fecha_registro': paciente.date_joined.strftime('%d/%m/%Y'),
-            'activo': paciente.is_active
-        } for paciente in pacientes[:100]]
+        return PROYECCION_PACIENTES, pacientes
     
-    def _obtener_ingresos(self, fecha_inicio, fecha_fin, filtros):
-        """Obtiene resumen de ingresos."""
+    def _consulta_ingresos(self, fecha_inicio, fecha_fin, filtros):
+        """Pagos completados."""
         queryset = Pago.objects.filter(estado_pago='COMPLETADO')
         
         if fecha_inicio and fecha_fin:
@@ -236,16 +429,11 @@ class VoiceReportQueryView(APIView):
                 fecha_pago__date__lte=fecha_fin
             )
         
-        pagos = queryset.select_related('factura__paciente__usuario').order_by('-fecha_pago')
+        queryset = _filtrar_por_nombres(queryset, filtros, paciente='factura__paciente_id', odontologo=None)
+        
+        pagos = queryset.order_by('-fecha_pago')
         
-        return [{
-            'id': pago.id,
-            'fecha': pago.fecha_pago.strftime('%d/%m/%Y %H:%M'),
-            'monto': float(pago.monto_pagado),
-            'metodo_pago': pago.get_metodo_pago_display(),
-            'factura': f"FAC-{pago.factura.id:06d}" if pago.factura else 'N/A',
-            'paciente': pago.factura.paciente.usuario.full_name if pago.factura and pago.factura.paciente else 'N/A'
-        } for pago in pagos[:100]]
+        return PROYECCION_INGRESOS, pagos
     
     def _generar_resumen(self, interpretacion, datos):
         """Genera un resumen del reporte."""
@@ -264,16 +452,17 @@ class VoiceReportQueryView(APIView):
             resumen['periodo'] = f"{fi} - {ff}"
         
         # Agregar estadísticas específicas por tipo
+        # Los totales se acumulan en centavos enteros para evitar deriva de float
         if tipo_reporte == 'ingresos' and datos:
-            total_ingresos = sum(d['monto'] for d in datos)
-            resumen['total_ingresos'] = round(total_ingresos, 2)
-            resumen['promedio'] = round(total_ingresos / len(datos), 2)
+            total_ingresos = MoneyAccumulator.sumar(d['monto'] for d in datos)
+            resumen['total_ingresos'] = total_ingresos.to_json()
+            resumen['promedio'] = (total_ingresos / len(datos)).to_json()
         
         if tipo_reporte == 'facturas' and datos:
-            total_monto = sum(d['monto_total'] for d in datos)
-            total_pagado = sum(d['monto_pagado'] for d in datos)
-            resumen['total_facturado'] = round(total_monto, 2)
-            resumen['total_cobrado'] = round(total_pagado, 2)
-            resumen['saldo_pendiente'] = round(total_monto - total_pagado, 2)
+            total_monto = MoneyAccumulator.sumar(d['monto_total'] for d in datos)
+            total_pagado = MoneyAccumulator.sumar(d['monto_pagado'] for d in datos)
+            resumen['total_facturado'] = total_monto.to_json()
+            resumen['total_cobrado'] = total_pagado.to_json()
+            resumen['saldo_pendiente'] = (total_monto - total_pagado).to_json()
         
         return resumen